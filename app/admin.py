@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, UserCurrentRecipes, UserGroceryList
+from .models import User, UserCurrentRecipes, GroceryItem, Recipe, RecipeIngredient, CachedRecipeImage, GenerationJob, RecipePlan, RecipePlanEntry
 
 # Register the User model
 @admin.register(User)
@@ -14,8 +14,45 @@ class UserCurrentRecipesAdmin(admin.ModelAdmin):
     list_display = ('user', 'updated_at')
     search_fields = ('user__username',)
 
-# Register the UserGroceryList model
-@admin.register(UserGroceryList)
-class UserGroceryListAdmin(admin.ModelAdmin):
-    list_display = ('user', 'updated_at')
+# Register the GroceryItem model
+@admin.register(GroceryItem)
+class GroceryItemAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'quantity', 'unit', 'category')
+    search_fields = ('name', 'user__username')
+    list_filter = ('category',)
+
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    extra = 0
+
+# Register the Recipe catalog model
+@admin.register(Recipe)
+class RecipeAdmin(admin.ModelAdmin):
+    list_display = ('title', 'times_served', 'updated_at')
+    search_fields = ('title', 'normalized_title')
+    inlines = [RecipeIngredientInline]
+
+# Register the CachedRecipeImage model
+@admin.register(CachedRecipeImage)
+class CachedRecipeImageAdmin(admin.ModelAdmin):
+    list_display = ('normalized_title', 'hits', 'size_bytes', 'last_used_at')
+    search_fields = ('normalized_title',)
+
+# Register the GenerationJob model
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'worker', 'created_at', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('user__username',)
+
+class RecipePlanEntryInline(admin.TabularInline):
+    model = RecipePlanEntry
+    extra = 0
+    raw_id_fields = ('snapshot',)
+
+# Register the RecipePlan model
+@admin.register(RecipePlan)
+class RecipePlanAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'created_at')
     search_fields = ('user__username',)
+    inlines = [RecipePlanEntryInline]
@@ -0,0 +1,84 @@
+"""
+Conditional GET for per-user views: answer 304 Not Modified from cheap
+validators (ETag and Last-Modified) before the view loads or renders
+anything heavy.
+
+Like django.views.decorators.http.condition, except that one function
+computes both validators, so they can come from the same query, and for
+async views it runs in a thread instead of querying on the event loop.
+"""
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from inspect import iscoroutinefunction
+from typing import Any, Callable, Optional, Tuple
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+Validators = Tuple[Optional[str], Optional[datetime]]
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    A weak ETag from the values a response is built from. Weak, since the
+    same data can render to slightly different bytes (e.g. asset URLs).
+    """
+    digest = hashlib.sha256(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def latest(*timestamps: Optional[datetime]) -> Optional[datetime]:
+    """The most recent of the timestamps that are set."""
+    return max((t for t in timestamps if t is not None), default=None)
+
+
+def conditional(validators: Callable[..., Validators]):
+    """
+    Decorator for GET views whose response is fully determined by the
+    (etag, last_modified) validators(request, *args, **kwargs) returns.
+    Either may be None. Responses are marked private and no-cache, so
+    browsers keep them but revalidate on each use.
+    """
+
+    def check(request, etag: Optional[str], last_modified: Optional[datetime]):
+        if last_modified is not None:
+            if not timezone.is_aware(last_modified):
+                last_modified = timezone.make_aware(last_modified, dt_timezone.utc)
+            last_modified = int(last_modified.timestamp())
+        return get_conditional_response(request, etag=etag, last_modified=last_modified), last_modified
+
+    def finish(request, response, etag: Optional[str], last_modified: Optional[int]):
+        if request.method in ('GET', 'HEAD'):
+            # Only the view's real content (or the 304 standing in for it)
+            # is described by the validators; an error page must not be
+            # revalidated into a 304 later on
+            if 200 <= response.status_code < 300 or response.status_code == 304:
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                etag, last_modified = await sync_to_async(validators)(request, *args, **kwargs)
+                response, last_modified = check(request, etag, last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return finish(request, response, etag, last_modified)
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                etag, last_modified = validators(request, *args, **kwargs)
+                response, last_modified = check(request, etag, last_modified)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                return finish(request, response, etag, last_modified)
+        return inner
+
+    return decorator
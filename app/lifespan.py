@@ -0,0 +1,56 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LifespanMiddleware:
+    """
+    ASGI middleware that handles lifespan events, which Django's ASGI handler
+    rejects, and manages per-worker resources around them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "lifespan":
+            return await self.app(scope, receive, send)
+
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.error(f"Error during startup: {str(e)}", exc_info=True)
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    await self.shutdown()
+                except Exception as e:
+                    logger.error(f"Error during shutdown: {str(e)}", exc_info=True)
+                    await send({"type": "lifespan.shutdown.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self):
+        from app.services.http_pool import HTTPPool
+        from app.services.metrics import Metrics
+
+        await HTTPPool.startup()
+        await Metrics.startup()
+
+    async def shutdown(self):
+        from app.services.db_writer import DBWriter
+        from app.services.generation_job_service import GenerationJobService
+        from app.services.metrics import Metrics
+        from app.services.recipe_service import RecipeService
+
+        await GenerationJobService.shutdown()
+        # After the jobs, which record how they finished through it
+        await DBWriter.shutdown()
+        await RecipeService.cleanup()
+        await Metrics.shutdown()
@@ -0,0 +1,176 @@
+"""
+Logging that stays off the request path.
+
+- BackgroundHandler puts records on a bounded queue; a thread formats and
+  writes them with the wrapped handlers. When the queue is full, records
+  are dropped and counted instead of blocking the event loop.
+- Structured fields go in extra=log_fields(...) and are rendered as
+  key=value by KeyValueFormatter, in the writer thread. Values other than
+  scalars are turned into text when the record is queued, since the caller
+  may change them before it is written.
+- Payload wraps a large value (recipes, grocery lists) so it is only
+  serialized for records PayloadSampler keeps, which are a share of the
+  records that carry one, and truncated to the limit for its logger.
+
+Imported by the LOGGING setting, so this module must not touch Django.
+"""
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from importlib import import_module
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MAX_FIELD_LENGTH = 1000
+
+
+def log_fields(**fields) -> Dict[str, Any]:
+    """extra= for a structured record: logger.info("Loaded", extra=log_fields(user=1, recipes=7))."""
+    return {'fields': fields}
+
+
+class Payload:
+    """A value serialized as compact JSON only if its record is kept."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(self.value, separators=(',', ':'), default=str)
+
+
+def _limit_for(name: str, limits: Dict[str, Any], default):
+    """The setting for the most specific logger prefix of name in limits."""
+    best = None
+    for prefix in limits:
+        if (name == prefix or name.startswith(prefix + '.')) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return limits[best] if best is not None else default
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Appends a record's fields as key=value, quoting and truncating long values."""
+
+    def __init__(
+        self,
+        fmt: Optional[str] = None,
+        datefmt: Optional[str] = None,
+        style: str = '%',
+        max_field_length: int = DEFAULT_MAX_FIELD_LENGTH,
+        logger_limits: Optional[Dict[str, int]] = None
+    ):
+        super().__init__(fmt, datefmt, style)
+        self.max_field_length = max_field_length
+        self.logger_limits = logger_limits or {}
+
+    def _render(self, value: Any, limit: int) -> str:
+        text = str(value)
+        if len(text) > limit:
+            text = f"{text[:limit]}...(+{len(text) - limit} chars)"
+        if not text or any(c in text for c in ' "=\n'):
+            text = json.dumps(text)
+        return text
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            limit = _limit_for(record.name, self.logger_limits, self.max_field_length)
+            line += ' ' + ' '.join(f"{key}={self._render(value, limit)}" for key, value in fields.items())
+        return line
+
+
+class PayloadSampler(logging.Filter):
+    """
+    Keep only a share of the records that carry a Payload, per logger
+    prefix, e.g. rates={'app.views': 0.05}. Records without one pass.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate: float = 1.0):
+        super().__init__()
+        self.rates = rates or {}
+        self.default_rate = default_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        fields = getattr(record, 'fields', None)
+        if not fields or not any(isinstance(value, Payload) for value in fields.values()):
+            return True
+        rate = _limit_for(record.name, self.rates, self.default_rate)
+        return rate >= 1 or random.random() < rate
+
+
+def _snapshot(value: Any) -> Any:
+    """A field value as it will be rendered, immune to later changes of the value."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _build_handler(spec: Dict[str, Any]) -> logging.Handler:
+    spec = dict(spec)
+    module, _, name = spec.pop('class').rpartition('.')
+    level = spec.pop('level', None)
+    handler = getattr(import_module(module), name)(**spec)
+    if level is not None:
+        handler.setLevel(level)
+    return handler
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """
+    Queue records for a writer thread that passes them to the handlers
+    built from the handlers specs ({'class': ..., **kwargs}). The
+    formatter set on this handler is used by all of them.
+    """
+
+    def __init__(self, handlers: List[Dict[str, Any]], queue_size: int = 10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.targets = [_build_handler(spec) for spec in handlers]
+        self.dropped = 0
+        self.listener = logging.handlers.QueueListener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        for target in self.targets:
+            target.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler formats here, on the caller's thread; leave that to the
+        # writer, but take the values it needs before the caller changes them
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        fields = getattr(record, 'fields', None)
+        if fields:
+            record.fields = {key: _snapshot(value) for key, value in fields.items()}
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            # Drains the queue before returning
+            self.listener.stop()
+            self.listener = None
+            if self.dropped:
+                # The writer thread is gone, hand the warning to the targets directly
+                record = logging.LogRecord(
+                    __name__, logging.WARNING, __file__, 0,
+                    f"Dropped {self.dropped} log records while the log queue was full", None, None
+                )
+                for target in self.targets:
+                    target.handle(record)
+            for target in self.targets:
+                target.close()
+        super().close()
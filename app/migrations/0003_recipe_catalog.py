@@ -0,0 +1,69 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0002_usercurrentrecipes_usergrocerylist"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Recipe",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("title", models.CharField(max_length=255)),
+                ("normalized_title", models.CharField(max_length=255, unique=True)),
+                ("description", models.TextField(blank=True)),
+                ("visual_description", models.TextField(blank=True)),
+                ("instructions", models.JSONField(blank=True, default=list)),
+                ("times_served", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "recipes",
+            },
+        ),
+        migrations.CreateModel(
+            name="RecipeIngredient",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("position", models.PositiveIntegerField(default=0)),
+                ("name", models.CharField(max_length=255)),
+                ("quantity", models.CharField(blank=True, max_length=64)),
+                ("unit", models.CharField(blank=True, max_length=64)),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ingredients",
+                        to="app.recipe",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "recipe_ingredients",
+                "ordering": ["position"],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:40
+
+from django.db import migrations
+
+
+def move_inline_images(apps, schema_editor):
+    from app.services.image_store import ImageStore
+
+    UserCurrentRecipes = apps.get_model("app", "UserCurrentRecipes")
+    for row in UserCurrentRecipes.objects.all().iterator():
+        changed = False
+        for recipe in row.recipes or []:
+            image = recipe.pop("image", None)
+            if image is None:
+                continue
+            changed = True
+            if image and not recipe.get("image_hash"):
+                recipe["image_hash"] = ImageStore.save_base64(image)
+        if changed:
+            UserCurrentRecipes.objects.filter(pk=row.pk).update(recipes=row.recipes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0003_recipe_catalog"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_inline_images, migrations.RunPython.noop),
+    ]
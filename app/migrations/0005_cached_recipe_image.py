@@ -0,0 +1,44 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0004_move_inline_images_to_store"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CachedRecipeImage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("normalized_title", models.CharField(max_length=255)),
+                ("description_hash", models.CharField(max_length=64)),
+                ("image_hash", models.CharField(max_length=64)),
+                ("image_variants", models.JSONField(blank=True, default=dict)),
+                ("size_bytes", models.PositiveIntegerField(default=0)),
+                ("hits", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("last_used_at", models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                "db_table": "cached_recipe_images",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("normalized_title", "description_hash"),
+                        name="unique_cached_recipe_image",
+                    )
+                ],
+            },
+        ),
+    ]
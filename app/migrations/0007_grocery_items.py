@@ -0,0 +1,99 @@
+# Generated by Django 5.1.15 on 2026-10-17 23:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def split_grocery_lists(apps, schema_editor):
+    UserGroceryList = apps.get_model("app", "UserGroceryList")
+    GroceryItem = apps.get_model("app", "GroceryItem")
+    for row in UserGroceryList.objects.all().iterator():
+        GroceryItem.objects.bulk_create([
+            GroceryItem(
+                user_id=row.user_id,
+                position=position,
+                name=str(item.get("name", ""))[:255],
+                quantity=str(item.get("quantity", ""))[:64],
+                unit=str(item.get("unit", ""))[:64],
+                category=str(item.get("category", ""))[:64],
+                notes=str(item.get("notes", "")),
+            )
+            for position, item in enumerate(row.items or [])
+            if isinstance(item, dict)
+        ])
+
+
+def join_grocery_lists(apps, schema_editor):
+    UserGroceryList = apps.get_model("app", "UserGroceryList")
+    GroceryItem = apps.get_model("app", "GroceryItem")
+    lists = {}
+    for item in GroceryItem.objects.order_by("user_id", "position").iterator():
+        lists.setdefault(item.user_id, []).append({
+            "name": item.name,
+            "quantity": item.quantity,
+            "unit": item.unit,
+            "category": item.category,
+            "notes": item.notes,
+        })
+    UserGroceryList.objects.bulk_create([
+        UserGroceryList(user_id=user_id, items=items) for user_id, items in lists.items()
+    ])
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0006_generation_jobs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GroceryItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("position", models.PositiveIntegerField(default=0)),
+                ("name", models.CharField(max_length=255)),
+                ("quantity", models.CharField(blank=True, max_length=64)),
+                ("unit", models.CharField(blank=True, max_length=64)),
+                ("category", models.CharField(blank=True, max_length=64)),
+                ("notes", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="grocery_items",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "grocery_items",
+                "ordering": ["position"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="groceryitem",
+            index=models.Index(fields=["user", "name"], name="grocery_item_user_name"),
+        ),
+        migrations.AddIndex(
+            model_name="groceryitem",
+            index=models.Index(
+                fields=["user", "category"], name="grocery_item_user_category"
+            ),
+        ),
+        migrations.RunPython(split_grocery_lists, join_grocery_lists),
+        migrations.DeleteModel(
+            name="UserGroceryList",
+        ),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 5.1.15 on 2026-10-17 23:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_plan_history(apps, schema_editor):
+    from app.services.plan_history_service import PlanHistoryService
+
+    UserCurrentRecipes = apps.get_model("app", "UserCurrentRecipes")
+    RecipeSnapshot = apps.get_model("app", "RecipeSnapshot")
+    RecipePlan = apps.get_model("app", "RecipePlan")
+    RecipePlanEntry = apps.get_model("app", "RecipePlanEntry")
+    snapshot_ids = {}
+    for row in UserCurrentRecipes.objects.all().iterator():
+        if not row.recipes:
+            continue
+        plan = RecipePlan.objects.create(user_id=row.user_id)
+        for position, recipe in enumerate(row.recipes):
+            content_hash = PlanHistoryService.content_hash(recipe)
+            if content_hash not in snapshot_ids:
+                snapshot_ids[content_hash] = RecipeSnapshot.objects.create(
+                    content_hash=content_hash,
+                    data={key: value for key, value in recipe.items() if key != "id"},
+                ).id
+            RecipePlanEntry.objects.create(
+                plan=plan, snapshot_id=snapshot_ids[content_hash], position=position
+            )
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0007_grocery_items"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("content_hash", models.CharField(max_length=64, unique=True)),
+                ("data", models.JSONField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "recipe_snapshots",
+            },
+        ),
+        migrations.CreateModel(
+            name="RecipePlan",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recipe_plans",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "recipe_plans",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="RecipePlanEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("position", models.PositiveIntegerField(default=0)),
+                (
+                    "plan",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="entries",
+                        to="app.recipeplan",
+                    ),
+                ),
+                (
+                    "snapshot",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="plan_entries",
+                        to="app.recipesnapshot",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "recipe_plan_entries",
+                "ordering": ["position"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="recipeplan",
+            index=models.Index(
+                fields=["user", "created_at"], name="recipe_plan_user_created"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="recipeplanentry",
+            constraint=models.UniqueConstraint(
+                fields=("plan", "position"), name="unique_recipe_plan_position"
+            ),
+        ),
+        migrations.RunPython(seed_plan_history, migrations.RunPython.noop),
+    ]
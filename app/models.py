@@ -1,3 +1,4 @@
+import uuid
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
@@ -31,10 +32,156 @@ class UserCurrentRecipes(models.Model):
     class Meta:
         db_table = 'user_current_recipes'
 
-class UserGroceryList(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='grocery_list')
-    items = models.JSONField(default=list, blank=True)
+class RecipeSnapshot(models.Model):
+    """
+    A saved recipe, stored once per distinct content and shared by every
+    plan (of any user) that contains it.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'recipe_snapshots'
+
+class RecipePlan(models.Model):
+    """One of a user's past recipe plans, as references to recipe snapshots."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipe_plans')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'recipe_plans'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='recipe_plan_user_created'),
+        ]
+
+class RecipePlanEntry(models.Model):
+    plan = models.ForeignKey(RecipePlan, on_delete=models.CASCADE, related_name='entries')
+    snapshot = models.ForeignKey(RecipeSnapshot, on_delete=models.PROTECT, related_name='plan_entries')
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'recipe_plan_entries'
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['plan', 'position'], name='unique_recipe_plan_position')
+        ]
+
+class GroceryItem(models.Model):
+    """One line of a user's grocery list, so an item can be read or removed on its own."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grocery_items')
+    position = models.PositiveIntegerField(default=0)
+    name = models.CharField(max_length=255)
+    quantity = models.CharField(max_length=64, blank=True)
+    unit = models.CharField(max_length=64, blank=True)
+    category = models.CharField(max_length=64, blank=True)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'grocery_items'
+        ordering = ['position']
+        indexes = [
+            models.Index(fields=['user', 'name'], name='grocery_item_user_name'),
+            models.Index(fields=['user', 'category'], name='grocery_item_user_category'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+class Recipe(models.Model):
+    """Shared catalog of generated recipes, reused across users by title."""
+    title = models.CharField(max_length=255)
+    normalized_title = models.CharField(max_length=255, unique=True)
+    description = models.TextField(blank=True)
+    visual_description = models.TextField(blank=True)
+    instructions = models.JSONField(default=list, blank=True)
+    times_served = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        db_table = 'user_grocery_lists'
+        db_table = 'recipes'
+
+    def __str__(self):
+        return self.title
+
+class RecipeIngredient(models.Model):
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='ingredients')
+    position = models.PositiveIntegerField(default=0)
+    name = models.CharField(max_length=255)
+    quantity = models.CharField(max_length=64, blank=True)
+    unit = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        db_table = 'recipe_ingredients'
+        ordering = ['position']
+
+class CachedRecipeImage(models.Model):
+    """Generated recipe images reused across users for the same dish."""
+    normalized_title = models.CharField(max_length=255)
+    description_hash = models.CharField(max_length=64)
+    image_hash = models.CharField(max_length=64)
+    image_variants = models.JSONField(default=dict, blank=True)
+    size_bytes = models.PositiveIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        db_table = 'cached_recipe_images'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['normalized_title', 'description_hash'],
+                name='unique_cached_recipe_image'
+            )
+        ]
+
+class GenerationJob(models.Model):
+    """A recipe plan generation that runs independently of any one HTTP response."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETE = 'complete'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generation_jobs')
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            (STATUS_PENDING, 'Pending'),
+            (STATUS_RUNNING, 'Running'),
+            (STATUS_COMPLETE, 'Complete'),
+            (STATUS_FAILED, 'Failed'),
+            (STATUS_CANCELLED, 'Cancelled'),
+        ],
+        default=STATUS_PENDING
+    )
+    worker = models.CharField(max_length=255, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    subscriber_seen_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'generation_jobs'
+        indexes = [
+            models.Index(fields=['user', 'status'], name='generation_job_user_status'),
+        ]
+
+class GenerationEvent(models.Model):
+    """Append-only log of the events a generation job has emitted."""
+    job = models.ForeignKey(GenerationJob, on_delete=models.CASCADE, related_name='events')
+    seq = models.PositiveIntegerField()
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'generation_events'
+        ordering = ['seq']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'seq'], name='unique_generation_event_seq')
+        ]
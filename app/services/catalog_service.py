@@ -0,0 +1,84 @@
+import re
+import logging
+from typing import Dict, Any, Optional
+from django.db import transaction
+from django.db.models import F
+from app.models import Recipe, RecipeIngredient
+
+logger = logging.getLogger(__name__)
+
+class CatalogService:
+    """Service for the shared recipe catalog."""
+
+    @staticmethod
+    def normalize_title(title: str) -> str:
+        """Normalize a recipe title so trivially different spellings share a row."""
+        title = re.sub(r'[^a-z0-9\s]', ' ', (title or '').lower())
+        return ' '.join(title.split())
+
+    @classmethod
+    def get_recipe_details(cls, title: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up stored ingredients and instructions for a recipe title.
+        Returns None when the catalog has no usable entry. Only reads; count
+        a hit with mark_served, through DBWriter.
+        """
+        normalized = cls.normalize_title(title)
+        if not normalized:
+            return None
+
+        recipe = (
+            Recipe.objects
+            .filter(normalized_title=normalized)
+            .prefetch_related('ingredients')
+            .first()
+        )
+        if recipe is None or not recipe.instructions:
+            return None
+        return {
+            'ingredients': [
+                {'name': i.name, 'quantity': i.quantity, 'unit': i.unit}
+                for i in recipe.ingredients.all()
+            ],
+            'instructions': recipe.instructions,
+        }
+
+    @classmethod
+    def mark_served(cls, title: str):
+        """Count a catalog hit for a recipe title."""
+        Recipe.objects.filter(normalized_title=cls.normalize_title(title)).update(
+            times_served=F('times_served') + 1
+        )
+
+    @classmethod
+    def store_recipe(cls, recipe: Dict[str, Any]) -> Optional[Recipe]:
+        """Add or refresh a generated recipe in the catalog."""
+        normalized = cls.normalize_title(recipe.get('title'))
+        if not normalized or not recipe.get('instructions'):
+            return None
+
+        with transaction.atomic():
+            catalog_recipe, created = Recipe.objects.update_or_create(
+                normalized_title=normalized,
+                defaults={
+                    'title': recipe['title'],
+                    'description': recipe.get('description', ''),
+                    'visual_description': recipe.get('visual_description', ''),
+                    'instructions': recipe['instructions'],
+                }
+            )
+            if not created:
+                catalog_recipe.ingredients.all().delete()
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=catalog_recipe,
+                    position=position,
+                    name=str(ingredient.get('name', ''))[:255],
+                    quantity=str(ingredient.get('quantity', ''))[:64],
+                    unit=str(ingredient.get('unit', ''))[:64],
+                )
+                for position, ingredient in enumerate(recipe.get('ingredients', []))
+            ])
+
+        logger.info(f"{'Added' if created else 'Refreshed'} catalog recipe: {catalog_recipe.title}")
+        return catalog_recipe
@@ -0,0 +1,104 @@
+import queue
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, List, Optional, Tuple
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class DBWriter:
+    """
+    Runs this worker's database writes one at a time on a dedicated thread.
+
+    SQLite allows one writer per file, so writes from concurrent generations
+    would otherwise wait on each other's locks (or fail with "database is
+    locked"). Writes that queue up while one runs are committed together in
+    a single transaction, each in its own savepoint so one failing write
+    doesn't undo the others. The thread keeps its connection open for the
+    life of the worker, unlike request threads.
+    """
+
+    _queue: Optional[queue.Queue] = None
+    _thread: Optional[threading.Thread] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _ensure_started(cls):
+        with cls._lock:
+            if cls._thread is None or not cls._thread.is_alive():
+                cls._queue = queue.Queue()
+                cls._thread = threading.Thread(target=cls._work, name='db-writer', daemon=True)
+                cls._thread.start()
+
+    @classmethod
+    async def run(cls, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run func(*args, **kwargs) on the writer thread and return its result once committed."""
+        cls._ensure_started()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        cls._queue.put((func, args, kwargs, loop, future))
+        return await future
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Any, error: Optional[BaseException]):
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @classmethod
+    def _work(cls):
+        batch_size = getattr(settings, 'DB_WRITE_BATCH_SIZE', 50)
+        stopping = False
+        while not stopping:
+            item = cls._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < batch_size:
+                try:
+                    item = cls._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            cls._write(batch)
+        connection.close()
+
+    @classmethod
+    def _write(cls, batch: List[Tuple]):
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+        outcomes = []
+        try:
+            with transaction.atomic():
+                for func, args, kwargs, loop, future in batch:
+                    try:
+                        with transaction.atomic():
+                            outcomes.append((loop, future, func(*args, **kwargs), None))
+                    except Exception as e:
+                        outcomes.append((loop, future, None, e))
+        except Exception as e:
+            # The commit itself failed, none of the batch was written
+            logger.error(f"Error committing {len(batch)} database writes: {str(e)}")
+            outcomes = [(loop, future, None, e) for _, _, _, loop, future in batch]
+
+        for loop, future, result, error in outcomes:
+            loop.call_soon_threadsafe(cls._resolve, future, result, error)
+
+    @classmethod
+    async def shutdown(cls):
+        """Finish the queued writes and stop the thread."""
+        with cls._lock:
+            thread, cls._thread = cls._thread, None
+        if thread is not None and thread.is_alive():
+            cls._queue.put(None)
+            await asyncio.to_thread(thread.join)
@@ -0,0 +1,44 @@
+import time
+import logging
+from typing import Any, Callable
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+
+logger = logging.getLogger(__name__)
+
+class FragmentCache:
+    """
+    Rendered HTML fragments per user, shared by all workers through the
+    "template_fragments" cache. Fragment keys include a per-user version,
+    and invalidating a user just moves to a new version: fragments rendered
+    from data read before the change can only land under the old one, as
+    long as the version is read before the data.
+
+    Templates cache with the same keys through the {% cache %} tag by
+    varying on the user id and fragment_version, see recipe_page.html; the
+    view must read the version before querying what the fragments show.
+    """
+
+    @staticmethod
+    def _version_key(user_id) -> str:
+        return f"fragments.version.{user_id}"
+
+    @classmethod
+    def version(cls, user_id) -> int:
+        return cache.get_or_set(cls._version_key(user_id), time.time_ns, timeout=None)
+
+    @classmethod
+    def invalidate(cls, user_id):
+        """Drop every cached fragment of the user, e.g. after their plan is saved."""
+        cache.set(cls._version_key(user_id), time.time_ns(), timeout=None)
+
+    @classmethod
+    def get_or_render(cls, name: str, user_id, render: Callable[[], str], *vary_on: Any) -> str:
+        fragments = caches['template_fragments']
+        key = make_template_fragment_key(name, [user_id, cls.version(user_id), *vary_on])
+        html = fragments.get(key)
+        if html is None:
+            html = render()
+            fragments.set(key, html, settings.FRAGMENT_CACHE_TIMEOUT)
+        return html
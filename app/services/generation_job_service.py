@@ -0,0 +1,269 @@
+import os
+import asyncio
+import logging
+import contextvars
+import socket
+import traceback
+from datetime import timedelta
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from app.models import GenerationJob, GenerationEvent
+from .db_writer import DBWriter
+from .generation_service import GenerationService
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Event types after which a job emits nothing more
+TERMINAL_EVENTS = ('complete', 'error')
+
+class GenerationJobService:
+    """
+    Runs plan generation as persisted background jobs.
+
+    The runner appends every event to GenerationEvent. SSE subscribers replay
+    the log from their Last-Event-ID and then tail it, so a reconnect can be
+    served by any worker that shares the database.
+
+    Runners are tasks on the worker's event loop that outlive the request
+    starting them, so this needs an ASGI server with one loop per worker
+    (uvicorn, see the Dockerfile). Under runserver or WSGI each async request
+    gets its own loop, and the runner dies with it.
+    """
+
+    # Runner tasks in this worker, by job id
+    _runners: Dict[str, asyncio.Task] = {}
+    # Wakes up local subscribers as soon as an event is appended
+    _signals: Dict[str, asyncio.Event] = {}
+
+    @staticmethod
+    def _setting(name: str, default):
+        return getattr(settings, name, default)
+
+    @staticmethod
+    def parse_event_id(last_event_id: str) -> Tuple[Optional[str], int]:
+        """Split a "<job id>:<seq>" SSE event id."""
+        job_id, _, seq = (last_event_id or '').partition(':')
+        try:
+            return job_id or None, int(seq)
+        except ValueError:
+            return None, 0
+
+    @staticmethod
+    def _get_resumable_job(user, job_id: Optional[str]) -> Optional[GenerationJob]:
+        if job_id:
+            try:
+                return GenerationJob.objects.get(id=job_id, user=user)
+            except (GenerationJob.DoesNotExist, ValidationError):
+                return None
+        return (
+            GenerationJob.objects
+            .filter(user=user, status__in=GenerationJob.ACTIVE_STATUSES)
+            .order_by('-created_at')
+            .first()
+        )
+
+    @classmethod
+    def _is_stale(cls, status: str, heartbeat_at) -> bool:
+        """Whether a job is still marked active although its worker stopped beating."""
+        stale_before = timezone.now() - timedelta(seconds=cls._setting('GENERATION_JOB_STALE_AFTER', 30))
+        return status in GenerationJob.ACTIVE_STATUSES and heartbeat_at is not None and heartbeat_at < stale_before
+
+    @classmethod
+    async def _interrupt(cls, job_id):
+        """Give up on a job whose worker died, so its subscribers get a terminal event."""
+        logger.warning(f"Generation job {job_id} lost its worker, marking it failed")
+        await DBWriter.run(cls._finish, job_id, GenerationJob.STATUS_FAILED, "Generation was interrupted")
+
+    @classmethod
+    async def start_or_resume(
+        cls, user, last_event_id: str = '', resume_job_id: str = ''
+    ) -> Tuple[Optional[GenerationJob], int]:
+        """
+        Resolve the job a subscriber should follow and the sequence number to
+        replay from. A resume, named by Last-Event-ID or by resume_job_id
+        when the page picks up a running job, only ever follows that job:
+        None if the user has no such job. Otherwise the user's active job is
+        reused rather than starting a second one, and only then is a new
+        generation started.
+        """
+        resuming = bool(last_event_id or resume_job_id)
+        job_id, after_seq = cls.parse_event_id(last_event_id)
+        if not last_event_id:
+            job_id = resume_job_id or None
+        if resuming and not job_id:
+            return None, 0
+
+        job = await sync_to_async(cls._get_resumable_job)(user, job_id)
+        if job is not None and cls._is_stale(job.status, job.heartbeat_at):
+            # The worker running it died, don't leave clients waiting forever.
+            # A subscriber following it by id replays the error event
+            await cls._interrupt(job.id)
+            if not job_id:
+                job = None
+        if job is not None:
+            logger.info(f"Resuming generation job {job.id} after event {after_seq}")
+            return job, after_seq if job_id else 0
+        if resuming:
+            logger.info(f"No generation job {job_id} to resume for user {user.id}")
+            return None, 0
+
+        job = await DBWriter.run(
+            GenerationJob.objects.create,
+            user=user,
+            worker=WORKER_ID,
+            heartbeat_at=timezone.now(),
+            subscriber_seen_at=timezone.now()
+        )
+        # Start the runner outside this request's context, otherwise its
+        # sync_to_async calls go to the request's executor, which is torn
+        # down as soon as the response finishes. The task itself lives on the
+        # worker's loop, which is why this needs ASGI (see the class docstring)
+        cls._runners[str(job.id)] = contextvars.Context().run(asyncio.create_task, cls._run(job, user))
+        logger.info(f"Started generation job {job.id}")
+        return job, 0
+
+    @classmethod
+    async def _append(cls, job_id, seq: int, payload: Dict[str, Any]):
+        await DBWriter.run(GenerationEvent.objects.create, job_id=job_id, seq=seq, payload=payload)
+        signal = cls._signals.get(str(job_id))
+        if signal:
+            signal.set()
+
+    @classmethod
+    def _finish(cls, job_id, status: str, error: Optional[str] = None):
+        """
+        Mark a job finished, appending a terminal error event if it didn't
+        complete. A job that already finished is left alone. Run it through
+        DBWriter, so it is serialized with the runner's appends. Old jobs
+        are pruned on the way.
+        """
+        finished = GenerationJob.objects.filter(
+            id=job_id, status__in=GenerationJob.ACTIVE_STATUSES
+        ).update(status=status, updated_at=timezone.now())
+        if finished and error:
+            last = GenerationEvent.objects.filter(job_id=job_id).order_by('-seq').first()
+            GenerationEvent.objects.create(
+                job_id=job_id,
+                seq=(last.seq if last else 0) + 1,
+                payload={'type': 'error', 'error': error}
+            )
+        cls.prune()
+
+    @classmethod
+    def prune(cls) -> int:
+        """
+        Delete jobs that finished more than GENERATION_JOB_RETENTION ago,
+        or whose worker died that long ago without anyone resuming them,
+        with their events.
+        """
+        cutoff = timezone.now() - timedelta(seconds=cls._setting('GENERATION_JOB_RETENTION', 24 * 3600))
+        finished = Q(updated_at__lt=cutoff) & ~Q(status__in=GenerationJob.ACTIVE_STATUSES)
+        _, by_model = GenerationJob.objects.filter(finished | Q(heartbeat_at__lt=cutoff)).delete()
+        jobs = by_model.get(GenerationJob._meta.label, 0)
+        if jobs:
+            logger.info(f"Pruned {jobs} old generation jobs")
+        return jobs
+
+    @classmethod
+    async def _watchdog(cls, job: GenerationJob, runner: asyncio.Task):
+        """Keep the job's heartbeat fresh and cancel it once nobody is listening."""
+        interval = cls._setting('GENERATION_JOB_HEARTBEAT', 5)
+        orphan_timeout = timedelta(seconds=cls._setting('GENERATION_JOB_ORPHAN_TIMEOUT', 60))
+        while not runner.done():
+            await asyncio.sleep(interval)
+            now = timezone.now()
+            await DBWriter.run(GenerationJob.objects.filter(id=job.id).update, heartbeat_at=now)
+            seen_at = await sync_to_async(
+                lambda: GenerationJob.objects.values_list('subscriber_seen_at', flat=True).get(id=job.id)
+            )()
+            if seen_at and now - seen_at > orphan_timeout:
+                logger.info(f"No subscribers for generation job {job.id}, cancelling it")
+                runner.cancel()
+                return
+
+    @classmethod
+    async def _run(cls, job: GenerationJob, user):
+        job_id = str(job.id)
+        seq = 0
+        status = GenerationJob.STATUS_COMPLETE
+        error = None
+        watchdog = asyncio.create_task(cls._watchdog(job, asyncio.current_task()))
+        try:
+            await DBWriter.run(GenerationJob.objects.filter(id=job.id).update, status=GenerationJob.STATUS_RUNNING)
+            async for payload in GenerationService.generate_plan(user):
+                seq += 1
+                await cls._append(job.id, seq, payload)
+        except asyncio.CancelledError:
+            status, error = GenerationJob.STATUS_CANCELLED, "Generation was cancelled"
+        except Exception as e:
+            logger.error(f"Error in generation job {job_id}: {str(e)}\n{traceback.format_exc()}")
+            status, error = GenerationJob.STATUS_FAILED, str(e)
+        finally:
+            watchdog.cancel()
+            await DBWriter.run(cls._finish, job.id, status, error)
+            signal = cls._signals.get(job_id)
+            if signal:
+                signal.set()
+            cls._runners.pop(job_id, None)
+            logger.info(f"Generation job {job_id} finished: {status}")
+
+    @classmethod
+    async def subscribe(cls, job: GenerationJob, after_seq: int = 0) -> AsyncIterator[GenerationEvent]:
+        """Replay a job's events after after_seq, then tail new ones until the job ends."""
+        job_id = str(job.id)
+        poll_interval = cls._setting('GENERATION_EVENT_POLL_INTERVAL', 0.5)
+        signal = cls._signals.setdefault(job_id, asyncio.Event())
+        last_seen_update = None
+        try:
+            while True:
+                signal.clear()
+                events = await sync_to_async(list)(
+                    GenerationEvent.objects.filter(job_id=job.id, seq__gt=after_seq).order_by('seq')
+                )
+                for event in events:
+                    after_seq = event.seq
+                    yield event
+                    if event.payload.get('type') in TERMINAL_EVENTS:
+                        return
+
+                now = timezone.now()
+                if last_seen_update is None or (now - last_seen_update).total_seconds() > 5:
+                    await DBWriter.run(GenerationJob.objects.filter(id=job.id).update, subscriber_seen_at=now)
+                    last_seen_update = now
+
+                if not events:
+                    status, heartbeat_at = await sync_to_async(
+                        lambda: GenerationJob.objects.values_list('status', 'heartbeat_at').get(id=job.id)
+                    )()
+                    if cls._is_stale(status, heartbeat_at):
+                        # Its worker died mid-run; the error event ends this loop next time round
+                        await cls._interrupt(job.id)
+                        continue
+                    if status not in GenerationJob.ACTIVE_STATUSES and not await sync_to_async(
+                        GenerationEvent.objects.filter(job_id=job.id, seq__gt=after_seq).exists
+                    )():
+                        return
+
+                # Local runners wake us up immediately, other workers are picked up by polling
+                try:
+                    await asyncio.wait_for(signal.wait(), poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if job_id not in cls._runners:
+                cls._signals.pop(job_id, None)
+
+    @classmethod
+    async def shutdown(cls):
+        """Cancel the jobs running in this worker so they are marked finished."""
+        runners = list(cls._runners.values())
+        for runner in runners:
+            runner.cancel()
+        if runners:
+            await asyncio.gather(*runners, return_exceptions=True)
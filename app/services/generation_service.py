@@ -0,0 +1,252 @@
+import logging
+from typing import Any, AsyncIterator, Dict
+from django.conf import settings
+from django.db import transaction
+from app.models import UserCurrentRecipes
+from .recipe_service import RecipeService
+from .grocery_consolidator import GroceryConsolidator
+from .grocery_service import GroceryService
+from .plan_history_service import PlanHistoryService
+from .fragment_cache import FragmentCache
+from .db_writer import DBWriter
+from .pipeline import PipelineScheduler
+from .sse_protocol import RecipePatcher
+
+logger = logging.getLogger(__name__)
+
+class GenerationService:
+    """Service for running the recipe plan generation pipeline."""
+
+    @classmethod
+    async def generate_plan(cls, user) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate a week's plan for a user, yielding frontend events as the
+        pipeline progresses. Closing the iterator cancels outstanding work.
+
+        In "staged" mode templates come from one LLM call and each recipe's
+        details from another. In "single_call" mode the whole plan is streamed
+        from one call and each recipe enters the pipeline as it is parsed.
+        """
+        timeouts = settings.GENERATION_STAGE_TIMEOUTS
+        single_call = getattr(settings, 'GENERATION_MODE', 'staged') == 'single_call'
+        scheduler = PipelineScheduler()
+        recipes_by_id = {}
+        completed_details = []
+        # Running grocery aggregate, updated as each recipe's details land
+        grocery = GroceryConsolidator()
+        grocery_list = []
+        # Recipes whose details arrived, and whether the grocery list was built;
+        # a plan missing either is not saved over the user's previous one
+        detailed_ids = set()
+        grocery_built = False
+        # What the client has been sent, so updates only carry changed fields
+        patcher = RecipePatcher()
+        detail_stages = []
+        image_stages = []
+
+        def new_recipe(template):
+            return {
+                **template,
+                'image_hash': None,
+                'image_variants': {},
+                'image_loading': True,
+                'ingredients': [],
+                'instructions': []
+            }
+
+        async def resolved(value):
+            return value
+
+        async def build_grocery_list():
+            return await RecipeService.generate_grocery_list(completed_details, consolidator=grocery)
+
+        async def save_plan():
+            # Stages run even when their dependencies failed, so check what actually arrived
+            missing = [recipe_id for recipe_id in recipes_by_id if recipe_id not in detailed_ids]
+            if not recipes_by_id or missing or not grocery_built:
+                raise ValueError(
+                    f"Plan incomplete, keeping the saved one (recipes without details: {missing}, "
+                    f"grocery list built: {grocery_built})"
+                )
+
+            # Images live in the image store, only their hashes are saved
+            recipes_to_save = [{
+                'id': recipe['id'],
+                'title': recipe['title'],
+                'description': recipe['description'],
+                'visual_description': recipe['visual_description'],
+                'ingredients': recipe['ingredients'],
+                'instructions': recipe['instructions'],
+                'image_hash': recipe['image_hash'],
+                'image_variants': recipe['image_variants']
+            } for recipe in recipes_by_id.values()]
+
+            def write_plan():
+                UserCurrentRecipes.objects.update_or_create(user=user, defaults={'recipes': recipes_to_save})
+                saved_items = GroceryService.replace_items(user, grocery_list)
+                PlanHistoryService.record_plan(user, recipes_to_save)
+                # Pages rendered from here on show the new plan
+                transaction.on_commit(lambda: FragmentCache.invalidate(user.id))
+                return saved_items
+
+            # Through the write queue, recipes and grocery list commit together
+            logger.info("Saving recipes and grocery list to database")
+            saved_items = await DBWriter.run(write_plan)
+            logger.info("Saved recipes and grocery list to database")
+            return saved_items
+
+        def add_final_stages():
+            """Add the stages that need every recipe: the grocery list and saving the plan."""
+            scheduler.add('grocery_list', build_grocery_list, depends_on=detail_stages, timeout=timeouts['grocery_list'])
+            scheduler.add('persist', save_plan, depends_on=['grocery_list', *image_stages], timeout=timeouts['persist'])
+
+        def plan_recipe_stages(recipe_templates):
+            """Add the per-recipe stages and everything that depends on them."""
+            for template in recipe_templates:
+                image_stage = scheduler.add(
+                    ('image', template['id']),
+                    lambda template=template: RecipeService.get_recipe_image(template),
+                    timeout=timeouts['image']
+                )
+                detail_stage = scheduler.add(
+                    ('details', template['id']),
+                    lambda template=template: RecipeService.get_recipe_details(template),
+                    timeout=timeouts['details']
+                )
+                image_stages.append(image_stage.name)
+                detail_stages.append(detail_stage.name)
+            add_final_stages()
+
+        async def stream_plan():
+            """Add each recipe's stages as soon as the streamed plan reaches it."""
+            async for kind, recipe in RecipeService.stream_recipe_plan():
+                template_stage = ('template', recipe['id'])
+                if kind == 'template':
+                    # Register the recipe, then start its image straight away
+                    scheduler.add(template_stage, lambda recipe=recipe: resolved(recipe))
+                    image_stages.append(scheduler.add(
+                        ('image', recipe['id']),
+                        lambda recipe=recipe: RecipeService.get_recipe_image(recipe),
+                        depends_on=[template_stage],
+                        timeout=timeouts['image']
+                    ).name)
+                else:
+                    detail_stages.append(scheduler.add(
+                        ('details', recipe['id']),
+                        lambda recipe=recipe: resolved(recipe),
+                        depends_on=[template_stage]
+                    ).name)
+            return len(detail_stages)
+
+        try:
+            if single_call:
+                logger.info("Starting single-call recipe plan generation")
+                scheduler.add('plan', stream_plan, timeout=timeouts['plan'])
+            else:
+                logger.info("Starting recipe template generation")
+                scheduler.add('templates', RecipeService.get_recipe_templates, timeout=timeouts['templates'])
+
+            async for completed in scheduler.run():
+                # Keyed by recipe id so a recipe updated twice in a batch is sent once
+                updates = {}
+                for stage, result, error in completed:
+                    kind, recipe_id = stage if isinstance(stage, tuple) else (stage, None)
+
+                    if kind == 'templates':
+                        if error:
+                            raise error
+                        logger.info(f"Generated {len(result)} recipe templates")
+                        # Ids the model writes aren't guaranteed unique (or present),
+                        # and they name pipeline stages, so number by position
+                        for index, template in enumerate(result):
+                            template['id'] = index + 1
+                        for template in result:
+                            recipes_by_id[template['id']] = new_recipe(template)
+                        # Send initial templates to frontend
+                        patcher.mark_sent(recipes_by_id.values())
+                        yield {
+                            "type": "templates",
+                            "recipes": list(recipes_by_id.values())
+                        }
+                        plan_recipe_stages(result)
+
+                    elif kind == 'plan':
+                        if error and not recipes_by_id:
+                            raise error
+                        if error:
+                            # Keep the recipes that made it before the stream broke off
+                            logger.error(f"Recipe plan stream failed after {len(recipes_by_id)} recipes: {str(error)}")
+                        else:
+                            logger.info(f"Streamed {result} recipes in a single call")
+                        add_final_stages()
+
+                    elif kind == 'template':
+                        recipes_by_id[recipe_id] = new_recipe(result)
+                        updates[recipe_id] = recipes_by_id[recipe_id]
+
+                    elif kind == 'image':
+                        recipe = recipes_by_id[recipe_id]
+                        if result:
+                            recipe.update(result)
+                        recipe['image_loading'] = False
+                        updates[recipe_id] = recipe
+                        logger.info(f"Generated image for recipe {recipe_id}")
+
+                    elif kind == 'details':
+                        if error or not result:
+                            continue
+                        recipe = recipes_by_id[recipe_id]
+                        recipe.update({
+                            'ingredients': result['ingredients'],
+                            'instructions': result['instructions']
+                        })
+                        updates[recipe_id] = recipe
+                        completed_details.append(result)
+                        detailed_ids.add(recipe_id)
+                        grocery.add_ingredients(result['ingredients'])
+                        logger.info(f"Generated details for recipe {recipe_id}")
+
+                    elif kind == 'grocery_list':
+                        if error:
+                            logger.error(f"Error generating grocery list: {str(error)}")
+                            continue
+                        grocery_list[:] = result
+                        grocery_built = True
+                        logger.info(f"Generated grocery list with {len(grocery_list)} items")
+                        yield {
+                            "type": "grocery_list",
+                            "grocery_list": grocery_list
+                        }
+
+                    elif kind == 'persist':
+                        if error:
+                            logger.error(f"Error saving recipes and grocery list: {str(error)}")
+                            continue
+                        # The streamed items had no ids yet; the saved ones can be
+                        # opened and removed
+                        yield {
+                            "type": "grocery_list",
+                            "grocery_list": result
+                        }
+
+                # Send the fields that changed; a recipe the client hasn't seen goes in full
+                patches = patcher.patches(updates.values())
+                if patches:
+                    yield {
+                        "type": "patch",
+                        "recipes": patches
+                    }
+
+                # Send only the grocery items that changed
+                grocery_delta = grocery.pop_delta()
+                if grocery_delta['items'] or grocery_delta['removed']:
+                    yield {
+                        "type": "grocery_delta",
+                        **grocery_delta
+                    }
+
+            # Send completion message
+            logger.info("Recipe generation complete")
+            yield {"type": "complete"}
+        finally:
+            await scheduler.cancel()
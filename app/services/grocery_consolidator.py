@@ -0,0 +1,338 @@
+import re
+import logging
+from fractions import Fraction
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+UNICODE_FRACTIONS = {
+    '½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4',
+    '⅕': '1/5', '⅖': '2/5', '⅗': '3/5', '⅘': '4/5', '⅙': '1/6',
+    '⅚': '5/6', '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8',
+}
+
+WORD_NUMBERS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'twelve': 12,
+    'half': 0.5,
+}
+
+# Canonical unit -> (dimension, size in the dimension's base unit)
+# Volume is measured in millilitres and weight in grams
+UNITS = {
+    'tsp': ('volume', 4.92892),
+    'tbsp': ('volume', 14.7868),
+    'fl oz': ('volume', 29.5735),
+    'cup': ('volume', 236.588),
+    'pint': ('volume', 473.176),
+    'quart': ('volume', 946.353),
+    'gallon': ('volume', 3785.41),
+    'ml': ('volume', 1.0),
+    'l': ('volume', 1000.0),
+    'g': ('weight', 1.0),
+    'kg': ('weight', 1000.0),
+    'oz': ('weight', 28.3495),
+    'lb': ('weight', 453.592),
+}
+
+UNIT_ALIASES = {
+    'teaspoon': 'tsp', 'teaspoons': 'tsp', 'tsp': 'tsp', 'tsps': 'tsp',
+    'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'tbsp': 'tbsp', 'tbsps': 'tbsp', 'tbs': 'tbsp', 'tbl': 'tbsp',
+    'fluid ounce': 'fl oz', 'fluid ounces': 'fl oz', 'fl oz': 'fl oz', 'fl. oz': 'fl oz',
+    'cup': 'cup', 'cups': 'cup', 'c': 'cup',
+    'pint': 'pint', 'pints': 'pint', 'pt': 'pint',
+    'quart': 'quart', 'quarts': 'quart', 'qt': 'quart',
+    'gallon': 'gallon', 'gallons': 'gallon', 'gal': 'gallon',
+    'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml', 'ml': 'ml',
+    'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l', 'l': 'l',
+    'gram': 'g', 'grams': 'g', 'g': 'g', 'gr': 'g',
+    'kilogram': 'kg', 'kilograms': 'kg', 'kg': 'kg', 'kgs': 'kg',
+    'ounce': 'oz', 'ounces': 'oz', 'oz': 'oz',
+    'pound': 'lb', 'pounds': 'lb', 'lb': 'lb', 'lbs': 'lb',
+    # Count units are kept as their own dimension
+    'piece': 'piece', 'pieces': 'piece', 'pc': 'piece', 'pcs': 'piece',
+    'whole': '', 'each': '', 'item': '', 'items': '', 'unit': '', 'units': '',
+    'large': '', 'medium': '', 'small': '',
+    'clove': 'clove', 'cloves': 'clove',
+    'can': 'can', 'cans': 'can',
+    'slice': 'slice', 'slices': 'slice',
+    'bunch': 'bunch', 'bunches': 'bunch',
+    'sprig': 'sprig', 'sprigs': 'sprig',
+    'stalk': 'stalk', 'stalks': 'stalk',
+    'head': 'head', 'heads': 'head',
+    'package': 'package', 'packages': 'package', 'pkg': 'package',
+    'jar': 'jar', 'jars': 'jar',
+    'bottle': 'bottle', 'bottles': 'bottle',
+    'bag': 'bag', 'bags': 'bag',
+    'pinch': 'pinch', 'pinches': 'pinch',
+    'dash': 'dash', 'dashes': 'dash',
+}
+
+# Abbreviations told apart by case, matched before units are lowercased
+CASE_SENSITIVE_UNITS = {'t': 'tsp', 'T': 'tbsp', 'Tb': 'tbsp', 'Tbs': 'tbsp'}
+
+# Units preferred for display, largest first, per dimension
+DISPLAY_UNITS = {
+    'volume': ['gallon', 'quart', 'cup', 'tbsp', 'tsp'],
+    'weight': ['lb', 'oz'],
+}
+
+# Words describing preparation rather than what to buy
+DESCRIPTORS = {
+    'fresh', 'freshly', 'chopped', 'diced', 'minced', 'sliced', 'grated', 'shredded',
+    'crushed', 'peeled', 'finely', 'roughly', 'thinly', 'large', 'medium',
+    'small', 'boneless', 'skinless', 'cooked', 'uncooked', 'raw', 'dried', 'frozen',
+    'to', 'taste', 'optional', 'divided', 'halved', 'quartered', 'cubed', 'packed',
+    'rinsed', 'drained', 'softened', 'melted', 'beaten', 'organic', 'extra', 'about',
+}
+
+NAME_SYNONYMS = {
+    'scallion': 'green onion',
+    'spring onion': 'green onion',
+    'coriander leaf': 'cilantro',
+    'garbanzo bean': 'chickpea',
+    'capsicum': 'bell pepper',
+    'courgette': 'zucchini',
+    'aubergine': 'eggplant',
+    'virgin olive oil': 'olive oil',
+    'kosher salt': 'salt',
+    'sea salt': 'salt',
+}
+
+# Plural endings that shouldn't be stripped
+SINGULAR_EXCEPTIONS = {'asparagus', 'hummus', 'couscous', 'molasses', 'swiss', 'grass', 'citrus', 'bass', 'lemongrass'}
+
+# Plurals the suffix rules get wrong
+IRREGULAR_PLURALS = {
+    'leaves': 'leaf', 'loaves': 'loaf', 'halves': 'half', 'knives': 'knife',
+    'chilies': 'chili', 'chillies': 'chilli', 'chiles': 'chile',
+    'cookies': 'cookie', 'brownies': 'brownie', 'veggies': 'veggie', 'pies': 'pie',
+    'pierogies': 'pierogi',
+}
+
+NICE_FRACTIONS = [
+    Fraction(1, 8), Fraction(1, 4), Fraction(1, 3), Fraction(3, 8), Fraction(1, 2),
+    Fraction(5, 8), Fraction(2, 3), Fraction(3, 4), Fraction(7, 8),
+]
+
+
+def parse_quantity(quantity: Any) -> Optional[float]:
+    """
+    Parse a quantity such as "2", "1.5", "1/2", "1 1/2", "1-1/2", "½" or "two".
+    Ranges like "2-3" or "2 to 3" resolve to the upper bound, which is
+    what a shopper needs to buy. Returns None for "to taste" and the like.
+    """
+    if isinstance(quantity, (int, float)):
+        return float(quantity)
+    text = str(quantity or '').strip().lower()
+    if not text:
+        return None
+    for symbol, fraction in UNICODE_FRACTIONS.items():
+        text = text.replace(symbol, f' {fraction}')
+
+    text = re.sub(r'\ban? half\b', '1/2', text)
+    # "1-1/2" is one and a half, not the range 1 to 1/2
+    text = re.sub(r'(?<![\d/.])(\d+)\s*-\s*(\d+/\d+)', r'\1 \2', text)
+    range_parts = re.split(r'\s*(?:-|–|\bto\b|\bor\b)\s*', text)
+    if len(range_parts) > 1:
+        values = [v for v in (parse_quantity(part) for part in range_parts) if v is not None]
+        return max(values) if values else None
+
+    total = 0.0
+    found = False
+    for token in text.split():
+        if re.fullmatch(r'\d+/\d+', token):
+            numerator, denominator = token.split('/')
+            if int(denominator) == 0:
+                return None
+            total += int(numerator) / int(denominator)
+            found = True
+        elif re.fullmatch(r'\d+(?:\.\d+)?', token):
+            total += float(token)
+            found = True
+        elif token == 'dozen':
+            total = total * 12 if found else 12
+            found = True
+        elif token in ('a', 'an'):
+            if not found:
+                total, found = 1.0, True
+        elif token in WORD_NUMBERS:
+            total += WORD_NUMBERS[token]
+            found = True
+    return total if found else None
+
+
+def normalize_unit(unit: Any) -> str:
+    """Map a unit to its canonical short name. Unknown units are returned lowercased."""
+    text = str(unit or '').strip().rstrip('.')
+    if text in CASE_SENSITIVE_UNITS:
+        return CASE_SENSITIVE_UNITS[text]
+    text = text.lower()
+    return UNIT_ALIASES.get(text, text)
+
+
+def canonical_name(name: Any) -> str:
+    """Reduce an ingredient name to a canonical key for merging duplicates."""
+    text = str(name or '').lower()
+    text = re.sub(r'\(.*?\)', ' ', text)  # drop parentheticals
+    text = text.split(',')[0]  # drop trailing preparation notes
+    text = re.sub(r'[^a-z\s-]', ' ', text)
+    words = [w for w in text.replace('-', ' ').split() if w not in DESCRIPTORS]
+    if len(words) > 1 and words[-1] in UNIT_ALIASES and words[-1] not in UNITS:
+        # "garlic cloves" -> "garlic"; the unit belongs in the unit field
+        words.pop()
+    if words:
+        words[-1] = _singularize(words[-1])
+    text = ' '.join(words)
+    return NAME_SYNONYMS.get(text, text)
+
+
+def _singularize(word: str) -> str:
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if word in SINGULAR_EXCEPTIONS or len(word) <= 3:
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith(('ches', 'shes', 'sses', 'xes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def format_quantity(value: float) -> str:
+    """Format a number as a shopper-friendly string, e.g. 1.5 -> "1 1/2"."""
+    whole = int(value)
+    remainder = value - whole
+    if remainder < 0.04:
+        return str(whole)
+    if remainder > 0.96:
+        return str(whole + 1)
+    nearest = min(NICE_FRACTIONS, key=lambda f: abs(float(f) - remainder))
+    if abs(float(nearest) - remainder) < 0.04:
+        return f"{whole} {nearest}" if whole else str(nearest)
+    return f"{value:.2f}".rstrip('0').rstrip('.')
+
+
+class GroceryConsolidator:
+    """
+    Merges recipe ingredients into a consolidated grocery list.
+
+    Ingredients can be added one recipe at a time; add_ingredients returns
+    the keys of the items that changed so callers can stream updates.
+    """
+
+    def __init__(self):
+        # (canonical name, dimension) -> aggregate
+        self._items: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # Item key -> displayed item, as of the last pop_delta call
+        self._emitted: Dict[str, Dict[str, str]] = {}
+
+    @staticmethod
+    def _dimension(unit: str) -> str:
+        if unit in UNITS:
+            return UNITS[unit][0]
+        return f"count:{unit}"
+
+    def add_ingredients(self, ingredients: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """Add a recipe's ingredients and return the keys of the changed items."""
+        changed = []
+        for ingredient in ingredients or []:
+            name = canonical_name(ingredient.get('name'))
+            if not name:
+                continue
+            unit = normalize_unit(ingredient.get('unit'))
+            dimension = self._dimension(unit)
+            key = (name, dimension)
+            item = self._items.setdefault(key, {
+                'name': name,
+                'amount': 0.0,
+                'units': [],
+                'unparsed': None,
+            })
+
+            quantity = parse_quantity(ingredient.get('quantity'))
+            if quantity is None:
+                # Keep the first free-text quantity ("to taste") in case nothing numeric shows up
+                if item['unparsed'] is None:
+                    item['unparsed'] = str(ingredient.get('quantity') or '').strip()
+            else:
+                scale = UNITS[unit][1] if unit in UNITS else 1.0
+                item['amount'] += quantity * scale
+            if unit not in item['units']:
+                item['units'].append(unit)
+            if key not in changed:
+                changed.append(key)
+        return changed
+
+    def _display(self, key: Tuple[str, str]) -> Dict[str, str]:
+        item = self._items[key]
+        dimension = key[1]
+        name = item['name'][:1].upper() + item['name'][1:]
+
+        if not item['amount']:
+            unit = item['units'][0] if item['units'] else ''
+            return {'name': name, 'quantity': item['unparsed'] or '', 'unit': unit}
+
+        if dimension in DISPLAY_UNITS:
+            seen = [u for u in item['units'] if u in UNITS]
+            # Show the amount in the largest unit the recipes used, or a
+            # preferred unit if that would be a tiny fraction
+            unit = max(seen, key=lambda u: UNITS[u][1])
+            if item['amount'] / UNITS[unit][1] < 0.25:
+                unit = next(
+                    (u for u in DISPLAY_UNITS[dimension] if item['amount'] / UNITS[u][1] >= 1),
+                    DISPLAY_UNITS[dimension][-1]
+                )
+            return {'name': name, 'quantity': format_quantity(item['amount'] / UNITS[unit][1]), 'unit': unit}
+
+        return {'name': name, 'quantity': format_quantity(item['amount']), 'unit': item['units'][0]}
+
+    def item(self, key: Tuple[str, str]) -> Dict[str, str]:
+        return self._display(key)
+
+    def keys(self) -> List[Tuple[str, str]]:
+        """
+        Keys of the items to list. A free-text entry such as "salt, to taste"
+        is dropped when the same ingredient also has a measured quantity.
+        """
+        measured = {name for (name, _), item in self._items.items() if item['amount']}
+        return [
+            key for key in sorted(self._items)
+            if self._items[key]['amount'] or key[0] not in measured
+        ]
+
+    @staticmethod
+    def item_key(key: Tuple[str, str]) -> str:
+        """Stable string key for an item, used by the frontend to patch the list."""
+        return f"{key[0]}|{key[1]}"
+
+    def pop_delta(self) -> Dict[str, List[Any]]:
+        """
+        Return the items added or changed since the last call, plus the keys of
+        items that no longer appear in the list.
+        """
+        current = {self.item_key(key): self._display(key) for key in self.keys()}
+        changed = [
+            {'key': item_key, **item}
+            for item_key, item in current.items()
+            if self._emitted.get(item_key) != item
+        ]
+        removed = [item_key for item_key in self._emitted if item_key not in current]
+        self._emitted = current
+        return {'items': changed, 'removed': removed}
+
+    def items(self) -> List[Dict[str, str]]:
+        """Return the consolidated list as {name, quantity, unit} dicts."""
+        return [self._display(key) for key in self.keys()]
+
+    @classmethod
+    def consolidate(cls, recipes: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Consolidate the ingredients of all recipes in one go."""
+        consolidator = cls()
+        for recipe in recipes:
+            consolidator.add_ingredients(recipe.get('ingredients', []))
+        return consolidator.items()
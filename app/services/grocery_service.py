@@ -1,28 +1,71 @@
+from typing import Any, Dict, List, Optional
+from asgiref.sync import async_to_sync
+from django.db import transaction
+from django.utils import timezone
+from app.models import GroceryItem, UserCurrentRecipes
+from .db_writer import DBWriter
+from .fragment_cache import FragmentCache
+
+ITEM_FIELDS = ('id', 'name', 'quantity', 'unit', 'category', 'notes')
+
+
 class GroceryService:
     @staticmethod
-    def get_item_details(item_id):
+    def get_items(user, by_category: bool = False) -> List[Dict[str, Any]]:
         """
-        Get details for a specific grocery item.
-        In the future, this should fetch from a real database.
+        The user's grocery list in order, as dicts. by_category sorts it for
+        templates that regroup items under category headings.
         """
-        # Temporary mock data
-        item_details = {
-            'id': item_id,
-            'name': 'Sample Item',
-            'quantity': '2',
-            'unit': 'pieces',
-            'category': 'Produce',
-            'notes': 'Fresh and organic preferred'
-        }
-        return item_details
-    
+        items = GroceryItem.objects.filter(user=user)
+        if by_category:
+            items = items.order_by('category', 'position')
+        return list(items.values(*ITEM_FIELDS))
+
     @staticmethod
-    def remove_item(item_id, user):
+    def get_item_details(item_id, user) -> Optional[Dict[str, Any]]:
+        """Get one of the user's grocery items, or None if they have no such item."""
+        return GroceryItem.objects.filter(id=item_id, user=user).values(*ITEM_FIELDS).first()
+
+    @staticmethod
+    def _delete_item(item_id, user) -> int:
+        with transaction.atomic():
+            deleted, _ = GroceryItem.objects.filter(id=item_id, user=user).delete()
+            if deleted:
+                # The plan's updated_at validates cached copies of the list (see app.conditional)
+                UserCurrentRecipes.objects.filter(user=user).update(updated_at=timezone.now())
+        return deleted
+
+    @classmethod
+    def remove_item(cls, item_id, user) -> bool:
+        """
+        Remove one of the user's grocery items. False if they have no such
+        item. Written through DBWriter, so call it from sync code.
+        """
+        deleted = async_to_sync(DBWriter.run)(cls._delete_item, item_id, user)
+        if deleted:
+            # Only once committed, or a render in between caches the old list anew
+            FragmentCache.invalidate(user.id)
+        return deleted > 0
+
+    @staticmethod
+    def replace_items(user, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Remove a grocery item.
-        In the future, this should interact with a real database.
+        Replace the user's grocery list with items ({name, quantity, unit,
+        optionally category and notes}), one bulk delete and one bulk insert.
+        Call inside a transaction so the list is never seen half replaced.
+        Returns the saved list, with the ids items are addressed by.
         """
-        # TODO: Replace with actual database query
-        # item = GroceryItem.objects.get(id=item_id, user=user)
-        # item.delete()
-        return True 
\ No newline at end of file
+        GroceryItem.objects.filter(user=user).delete()
+        GroceryItem.objects.bulk_create([
+            GroceryItem(
+                user=user,
+                position=position,
+                name=str(item.get('name', ''))[:255],
+                quantity=str(item.get('quantity', ''))[:64],
+                unit=str(item.get('unit', ''))[:64],
+                category=str(item.get('category', ''))[:64],
+                notes=str(item.get('notes', ''))
+            )
+            for position, item in enumerate(items)
+        ])
+        return GroceryService.get_items(user)
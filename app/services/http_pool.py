@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import aiohttp
+import httpx
+from typing import Optional, Set
+from django.conf import settings
+from .rate_limiter import ProviderRateLimiter
+
+logger = logging.getLogger(__name__)
+
+class HTTPPool:
+    """
+    Per-worker connection pool for outbound provider calls.
+
+    GetImg requests go through the aiohttp session. The OpenAI and Anthropic
+    SDKs are built on httpx, so they share a single httpx client instead.
+    Both are opened and closed by the ASGI lifespan handler.
+    """
+
+    _session: Optional[aiohttp.ClientSession] = None
+    _httpx_client: Optional[httpx.AsyncClient] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _exit_guards: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _setting(name: str, default):
+        return getattr(settings, name, default)
+
+    @classmethod
+    def _ensure_current_loop(cls):
+        """
+        Clients are bound to the loop that created them. Outside uvicorn
+        (e.g. runserver) each async request may get its own loop, so start
+        fresh clients when the loop has changed, and close the previous ones
+        on their own loop, the only one their connections can close on.
+        """
+        loop = asyncio.get_running_loop()
+        if cls._loop is not loop:
+            if cls._loop is not None and not cls._loop.is_closed():
+                try:
+                    asyncio.run_coroutine_threadsafe(cls._close(cls._session, cls._httpx_client), cls._loop)
+                except RuntimeError:
+                    pass  # closed in the meantime
+            cls._session = None
+            cls._httpx_client = None
+            cls._loop = loop
+            # A loop that ends before anyone switches away from it closes its
+            # clients on the way out
+            guard = loop.create_task(cls._close_on_exit(loop))
+            cls._exit_guards.add(guard)
+            guard.add_done_callback(cls._exit_guards.discard)
+
+    @classmethod
+    async def _close_on_exit(cls, loop: asyncio.AbstractEventLoop):
+        """
+        Wait until the loop cancels its leftover tasks as it shuts down
+        (asyncio.run and asgiref's async_to_sync both do), then close the
+        clients still bound to it.
+        """
+        try:
+            await loop.create_future()
+        except asyncio.CancelledError:
+            if cls._loop is loop:
+                await cls._close(cls._session, cls._httpx_client)
+                cls._session = None
+                cls._httpx_client = None
+                cls._loop = None
+            raise
+
+    @staticmethod
+    async def _close(session: Optional[aiohttp.ClientSession], httpx_client: Optional[httpx.AsyncClient]):
+        if session is not None and not session.closed:
+            await session.close()
+        if httpx_client is not None and not httpx_client.is_closed:
+            await httpx_client.aclose()
+
+    @classmethod
+    def get_session(cls) -> aiohttp.ClientSession:
+        """Get the pooled aiohttp session, creating it if needed."""
+        cls._ensure_current_loop()
+        if cls._session is None or cls._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=cls._setting('HTTP_POOL_MAX_CONNECTIONS', 100),
+                limit_per_host=cls._setting('HTTP_POOL_MAX_PER_HOST', 20),
+                keepalive_timeout=cls._setting('HTTP_POOL_KEEPALIVE', 30),
+                ttl_dns_cache=cls._setting('HTTP_POOL_DNS_TTL', 300),
+                use_dns_cache=True,
+            )
+            cls._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=cls._setting('HTTP_TIMEOUT', 60),
+                    connect=cls._setting('HTTP_CONNECT_TIMEOUT', 5),
+                ),
+            )
+        return cls._session
+
+    @classmethod
+    def get_httpx_client(cls) -> httpx.AsyncClient:
+        """Get the pooled httpx client shared by the LLM provider SDKs."""
+        cls._ensure_current_loop()
+        if cls._httpx_client is None or cls._httpx_client.is_closed:
+            cls._httpx_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=cls._setting('HTTP_POOL_MAX_CONNECTIONS', 100),
+                    max_keepalive_connections=cls._setting('HTTP_POOL_MAX_PER_HOST', 20),
+                    keepalive_expiry=cls._setting('HTTP_POOL_KEEPALIVE', 30),
+                ),
+                timeout=httpx.Timeout(
+                    cls._setting('HTTP_TIMEOUT', 60),
+                    connect=cls._setting('HTTP_CONNECT_TIMEOUT', 5),
+                ),
+                # Feed provider rate limit headers to the shared limiter
+                event_hooks={'response': [ProviderRateLimiter.observe_httpx_response]},
+            )
+        return cls._httpx_client
+
+    @classmethod
+    async def startup(cls):
+        """Open the pools eagerly so the first request doesn't pay for it."""
+        cls.get_session()
+        cls.get_httpx_client()
+        logger.info("HTTP connection pool started")
+
+    @classmethod
+    async def shutdown(cls):
+        """Close the pools and their keep-alive connections."""
+        await cls._close(cls._session, cls._httpx_client)
+        cls._session = None
+        cls._httpx_client = None
+        cls._loop = None
+        ProviderRateLimiter.reset()
+        logger.info("HTTP connection pool closed")
@@ -0,0 +1,103 @@
+import re
+import hashlib
+import logging
+from typing import Dict, Any, Optional
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+from app.models import CachedRecipeImage
+from .catalog_service import CatalogService
+from .image_store import ImageStore
+
+logger = logging.getLogger(__name__)
+
+# Words that don't change what a dish looks like
+DESCRIPTION_STOPWORDS = {
+    'a', 'an', 'and', 'the', 'of', 'with', 'on', 'in', 'to', 'is', 'are', 'it',
+    'its', 'for', 'by', 'at', 'as', 'from', 'that', 'this', 'some', 'served',
+}
+
+class ImageCacheService:
+    """Service for reusing generated recipe images across users."""
+
+    @staticmethod
+    def description_hash(visual_description: str) -> str:
+        """
+        Hash a visual description after normalizing case, punctuation, word
+        order and filler words, so near-identical descriptions share a key.
+        """
+        words = re.sub(r'[^a-z0-9\s]', ' ', (visual_description or '').lower()).split()
+        normalized = ' '.join(sorted(set(words) - DESCRIPTION_STOPWORDS))
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def _entries(cls, title: str, visual_description: str):
+        return CachedRecipeImage.objects.filter(
+            normalized_title=CatalogService.normalize_title(title),
+            description_hash=cls.description_hash(visual_description)
+        )
+
+    @classmethod
+    def lookup(cls, title: str, visual_description: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached image hashes for a dish, or None on a miss. Only
+        reads; count a hit with record_hit, through DBWriter.
+        """
+        entry = cls._entries(title, visual_description).first()
+        if entry is None:
+            return None
+        if not ImageStore.exists(entry.image_hash):
+            # The file was removed from the store behind our back; the image
+            # generated instead replaces the entry when it is stored
+            return None
+        return {
+            'image_hash': entry.image_hash,
+            'image_variants': entry.image_variants,
+        }
+
+    @classmethod
+    def record_hit(cls, title: str, visual_description: str):
+        cls._entries(title, visual_description).update(hits=F('hits') + 1, last_used_at=timezone.now())
+
+    @classmethod
+    def store(cls, title: str, visual_description: str, image: Dict[str, Any]) -> None:
+        """Remember a generated image for this dish and enforce the size bound."""
+        if not image.get('image_hash'):
+            return
+        variants = image.get('image_variants', {})
+        size_bytes = sum(
+            ImageStore.size(image_hash)
+            for image_hash in [image['image_hash'], *variants.values()]
+        )
+        CachedRecipeImage.objects.update_or_create(
+            normalized_title=CatalogService.normalize_title(title),
+            description_hash=cls.description_hash(visual_description),
+            defaults={
+                'image_hash': image['image_hash'],
+                'image_variants': variants,
+                'size_bytes': size_bytes,
+            }
+        )
+        cls.evict()
+
+    @classmethod
+    def evict(cls) -> int:
+        """
+        Drop least recently used entries until the cache fits IMAGE_CACHE_MAX_BYTES.
+        Only the cache entries go; the image files stay in the store because
+        saved recipes may still reference them.
+        """
+        max_bytes = getattr(settings, 'IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        total = CachedRecipeImage.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+        if total <= max_bytes:
+            return 0
+
+        evicted = []
+        for pk, size_bytes in CachedRecipeImage.objects.order_by('last_used_at').values_list('pk', 'size_bytes').iterator():
+            if total <= max_bytes:
+                break
+            evicted.append(pk)
+            total -= size_bytes
+        CachedRecipeImage.objects.filter(pk__in=evicted).delete()
+        logger.info(f"Evicted {len(evicted)} cached recipe images")
+        return len(evicted)
@@ -0,0 +1,133 @@
+import time
+import base64
+import asyncio
+import logging
+from io import BytesIO
+from weakref import WeakKeyDictionary
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterable, Optional
+from PIL import Image, features
+from django.conf import settings
+from .metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Shown blurred under a recipe card's photo while the photo loads
+THUMBNAIL_SIZE = (96, 96)
+
+DEFAULT_VARIANTS = ('jpeg', 'webp', 'thumbnail')
+
+
+def avif_supported() -> bool:
+    """Whether this Pillow build can encode AVIF."""
+    try:
+        return bool(features.check('avif'))
+    except ValueError:
+        # Older Pillow versions don't know the feature at all
+        return False
+
+
+def _encode(img: Image.Image, variant: str) -> bytes:
+    output = BytesIO()
+    if variant == 'jpeg':
+        img.save(output, format='JPEG', quality=85, optimize=True)
+    elif variant == 'webp':
+        img.save(output, format='WEBP', quality=80, method=4)
+    elif variant == 'avif':
+        img.save(output, format='AVIF', quality=60, speed=8)
+    elif variant == 'thumbnail':
+        thumb = img.copy()
+        thumb.thumbnail(THUMBNAIL_SIZE)
+        thumb.save(output, format='WEBP', quality=75)
+    else:
+        raise ValueError(f"Unknown image variant: {variant}")
+    return output.getvalue()
+
+
+def process_image(base64_string: str, variants: Iterable[str] = DEFAULT_VARIANTS) -> Dict[str, Any]:
+    """
+    Decode a base64 image and encode each requested variant.
+    Runs in a worker process, so it must not touch Django state.
+
+    Returns:
+        {'variants': {name: bytes}, 'timings': {stage: milliseconds}}
+    """
+    timings = {}
+    encoded = {}
+    if not base64_string:
+        return {'variants': encoded, 'timings': timings}
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    image_data = base64.b64decode(base64_string)
+    with Image.open(BytesIO(image_data)) as img:
+        # Convert to RGB if necessary
+        if img.mode in ('RGBA', 'P'):
+            img = img.convert('RGB')
+        img.load()
+        timings['decode'] = (time.perf_counter() - start) * 1000
+
+        for variant in variants:
+            stage_start = time.perf_counter()
+            encoded[variant] = _encode(img, variant)
+            timings[variant] = (time.perf_counter() - stage_start) * 1000
+
+    timings['cpu'] = (time.process_time() - cpu_start) * 1000
+    return {'variants': encoded, 'timings': timings}
+
+
+class ImagePipeline:
+    """Bounded process pool that keeps image work off the event loop."""
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _semaphores: 'WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = WeakKeyDictionary()
+
+    @classmethod
+    def variants(cls) -> tuple:
+        variants = DEFAULT_VARIANTS
+        if getattr(settings, 'IMAGE_PIPELINE_AVIF', False) and avif_supported():
+            variants = variants + ('avif',)
+        return variants
+
+    @classmethod
+    def _get_executor(cls) -> ProcessPoolExecutor:
+        if cls._executor is None:
+            workers = getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2)
+            cls._executor = ProcessPoolExecutor(max_workers=workers)
+        return cls._executor
+
+    @classmethod
+    def _get_semaphore(cls) -> asyncio.Semaphore:
+        # Semaphores are bound to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        semaphore = cls._semaphores.get(loop)
+        if semaphore is None:
+            limit = getattr(settings, 'IMAGE_PIPELINE_MAX_CONCURRENCY', 4)
+            semaphore = cls._semaphores[loop] = asyncio.Semaphore(limit)
+        return semaphore
+
+    @classmethod
+    async def process(cls, base64_string: str) -> Dict[str, Any]:
+        """Process an image in the pool and return its variants and per-stage timings."""
+        loop = asyncio.get_running_loop()
+        queued_at = time.perf_counter()
+        async with cls._get_semaphore():
+            started_at = time.perf_counter()
+            result = await loop.run_in_executor(
+                cls._get_executor(), process_image, base64_string, cls.variants()
+            )
+        timings = result['timings']
+        Metrics.IMAGE_CPU_SECONDS.observe(timings['cpu'] / 1000)
+        timings['queue'] = (started_at - queued_at) * 1000
+        timings['total'] = (time.perf_counter() - queued_at) * 1000
+        logger.info(
+            "Processed image: " + ", ".join(f"{stage}={ms:.1f}ms" for stage, ms in timings.items())
+        )
+        return result
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+        cls._semaphores.clear()
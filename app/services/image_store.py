@@ -0,0 +1,84 @@
+import os
+import re
+import base64
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+class ImageStore:
+    """Content-addressed on-disk storage for recipe images."""
+
+    @staticmethod
+    def root() -> Path:
+        return Path(settings.IMAGE_STORE_ROOT)
+
+    @staticmethod
+    def is_valid_hash(image_hash: str) -> bool:
+        return bool(image_hash) and bool(HASH_RE.match(image_hash))
+
+    @classmethod
+    def path_for(cls, image_hash: str) -> Path:
+        """Return the file path for a hash, sharded by its first two characters."""
+        if not cls.is_valid_hash(image_hash):
+            raise ValueError(f"Invalid image hash: {image_hash!r}")
+        return cls.root() / image_hash[:2] / image_hash
+
+    @classmethod
+    def save(cls, data: bytes) -> str:
+        """Store image bytes once and return their SHA-256 hash."""
+        if not data:
+            return ''
+        image_hash = hashlib.sha256(data).hexdigest()
+        path = cls.path_for(image_hash)
+        if path.exists():
+            return image_hash
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so concurrent workers never see a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        logger.info(f"Stored image {image_hash} ({len(data)} bytes)")
+        return image_hash
+
+    @classmethod
+    def save_base64(cls, base64_string: str) -> str:
+        if not base64_string:
+            return ''
+        return cls.save(base64.b64decode(base64_string))
+
+    @classmethod
+    def exists(cls, image_hash: str) -> bool:
+        return cls.is_valid_hash(image_hash) and cls.path_for(image_hash).exists()
+
+    @classmethod
+    def size(cls, image_hash: str) -> int:
+        try:
+            return cls.path_for(image_hash).stat().st_size
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def content_type(header: bytes) -> str:
+        """Detect the image type from its leading bytes."""
+        if header.startswith(b'\xff\xd8\xff'):
+            return 'image/jpeg'
+        if header.startswith(b'\x89PNG\r\n\x1a\n'):
+            return 'image/png'
+        if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+            return 'image/webp'
+        if header[4:12] in (b'ftypavif', b'ftypavis'):
+            return 'image/avif'
+        return 'application/octet-stream'
@@ -0,0 +1,242 @@
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """Base class for LLM response cache storage."""
+
+    # Backends that do file or network I/O are run off the event loop
+    blocking = False
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """The stored values of those keys that have one."""
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """
+    Per-process cache with TTL expiry and LRU eviction. Values are kept as
+    JSON, like the SQLite backend, so a caller that edits a response it got
+    doesn't change what the next caller is served.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        value = json.dumps(value)
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """SQLite file cache that every worker process on the host can share."""
+
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not thread-safe, keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < now:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        conn = self._connect()
+        now = time.time()
+        placeholders = ','.join('?' * len(keys))
+        rows = conn.execute(
+            f"SELECT key, value, expires_at FROM llm_cache WHERE key IN ({placeholders})", keys
+        ).fetchall()
+        found = {key: json.loads(value) for key, value, expires_at in rows if expires_at >= now}
+        if len(found) < len(rows):
+            conn.execute(
+                f"DELETE FROM llm_cache WHERE key IN ({placeholders}) AND expires_at < ?", (*keys, now)
+            )
+        if found:
+            conn.execute(
+                f"UPDATE llm_cache SET last_access = ? WHERE key IN ({','.join('?' * len(found))})",
+                (now, *found)
+            )
+        return found
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl, now)
+        )
+        self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired rows, then the least recently used rows over the limit."""
+        conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                """DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?
+                )""",
+                (overflow,)
+            )
+
+    def delete(self, key: str) -> None:
+        self._connect().execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM llm_cache")
+
+
+class LLMResponseCache:
+    """Caches parsed LLM responses keyed on everything that shapes the output."""
+
+    def __init__(self, backend: CacheBackend, ttl: float = 3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(
+        model: str,
+        system_prompt: str,
+        prompt: str,
+        schema: Optional[Dict[str, Any]],
+        tool_name: str
+    ) -> str:
+        """Build a stable cache key from the request parameters."""
+        payload = json.dumps(
+            [model, system_prompt, prompt, schema, tool_name],
+            sort_keys=True,
+            separators=(',', ':')
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def _call(self, func, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return (await self.get_many([key])).get(key)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        The cached values of those keys that have one, in a single backend
+        round trip. Counted as one lookup: a hit if any key was found.
+        """
+        try:
+            found = await self._call(self.backend.get_many, keys)
+        except Exception as e:
+            # A broken cache must never take down generation
+            logger.warning(f"LLM cache read failed: {str(e)}")
+            found = {}
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    async def set(self, key: str, value: Any) -> None:
+        try:
+            await self._call(self.backend.set, key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process."""
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,296 @@
+import os
+import re
+import json
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Union
+from django.conf import settings
+from openai import AsyncOpenAI
+from anthropic import AsyncAnthropic
+from .http_pool import HTTPPool
+from .metrics import Metrics
+from .rate_limiter import ProviderRateLimiter
+
+logger = logging.getLogger(__name__)
+
+Output = Union[Dict[str, Any], List[Any]]
+
+# Models that wrap their JSON in a markdown code fence despite being asked not to
+CODE_FENCE = re.compile(r'^\s*```(?:json)?\s*(.*?)\s*```\s*$', re.DOTALL)
+
+
+class LLMProvider:
+    """
+    A model behind one provider API. Subclasses send a structured-output
+    request and return the parsed JSON; LLMService normalizes and validates it.
+    """
+
+    # Rate limit bucket, see ProviderRateLimiter
+    provider = ''
+    api_key_env = ''
+    supports_streaming = False
+    # Whether the model is given the schema, making an example in the prompt redundant
+    receives_schema = False
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.model}>"
+
+    def available(self) -> bool:
+        """Whether the provider is configured and its SDK is installed."""
+        return bool(os.getenv(self.api_key_env))
+
+    async def complete(
+        self,
+        prompt: str,
+        schema: Optional[Dict[str, Any]],
+        tool_name: str,
+        tool_description: str,
+        system_prompt: str
+    ) -> Output:
+        raise NotImplementedError
+
+    def stream(
+        self,
+        prompt: str,
+        schema: Optional[Dict[str, Any]],
+        tool_name: str,
+        tool_description: str,
+        system_prompt: str,
+        max_tokens: int
+    ) -> AsyncIterator[str]:
+        """Stream the raw JSON text of a completion."""
+        raise NotImplementedError
+
+    def cleanup(self):
+        """Drop clients; the shared HTTP pool owns the connections."""
+
+    def _record_usage(self, tool_name: str, input_tokens: Optional[int], output_tokens: Optional[int]):
+        if input_tokens:
+            Metrics.LLM_TOKENS.inc(input_tokens, model=self.model, tool=tool_name, direction='input')
+        if output_tokens:
+            Metrics.LLM_TOKENS.inc(output_tokens, model=self.model, tool=tool_name, direction='output')
+
+
+class OpenAIProvider(LLMProvider):
+    provider = 'openai'
+    api_key_env = 'OPENAI_API_KEY'
+    supports_streaming = True
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        self._client = None
+        self._http_client = None
+
+    def _get_client(self) -> AsyncOpenAI:
+        """
+        Get the OpenAI client, bound to the shared HTTP connection pool.
+        SDK retries are off, ProviderRateLimiter schedules them instead.
+        """
+        http_client = HTTPPool.get_httpx_client()
+        if self._client is None or self._http_client is not http_client:
+            api_key = os.getenv(self.api_key_env)
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY environment variable is not set")
+            self._client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=getattr(settings, 'OPENAI_BASE_URL', None),
+                http_client=http_client,
+                max_retries=0
+            )
+            self._http_client = http_client
+        return self._client
+
+    def _create(self, prompt: str, system_prompt: str, **kwargs):
+        client = self._get_client()
+        return ProviderRateLimiter.run(self.provider, lambda: client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            response_format={"type": "json_object"},
+            **kwargs
+        ))
+
+    async def complete(self, prompt, schema, tool_name, tool_description, system_prompt) -> Output:
+        response = await self._create(prompt, system_prompt)
+        if response.usage:
+            self._record_usage(tool_name, response.usage.prompt_tokens, response.usage.completion_tokens)
+        return json.loads(response.choices[0].message.content)
+
+    async def stream(self, prompt, schema, tool_name, tool_description, system_prompt, max_tokens):
+        stream = await self._create(
+            prompt, system_prompt, max_tokens=max_tokens, stream=True, stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.usage:
+                # Sent in a last chunk without choices
+                self._record_usage(tool_name, chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+
+    def cleanup(self):
+        self._client = None
+        self._http_client = None
+
+
+class AnthropicProvider(LLMProvider):
+    provider = 'anthropic'
+    api_key_env = 'ANTHROPIC_API_KEY'
+    supports_streaming = True
+    receives_schema = True
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        self._client = None
+        self._http_client = None
+
+    def _get_client(self) -> AsyncAnthropic:
+        """Get the Anthropic client, bound to the shared HTTP connection pool."""
+        http_client = HTTPPool.get_httpx_client()
+        if self._client is None or self._http_client is not http_client:
+            api_key = os.getenv(self.api_key_env)
+            if not api_key:
+                raise ValueError("ANTHROPIC_API_KEY environment variable is not set")
+            self._client = AsyncAnthropic(
+                api_key=api_key,
+                base_url=getattr(settings, 'ANTHROPIC_BASE_URL', None),
+                http_client=http_client,
+                max_retries=0
+            )
+            self._http_client = http_client
+        return self._client
+
+    def _create(self, prompt, schema, tool_name, tool_description, system_prompt, max_tokens, **kwargs):
+        if not schema:
+            raise ValueError("Schema is required for Anthropic model")
+        client = self._get_client()
+        return ProviderRateLimiter.run(self.provider, lambda: client.messages.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            system=system_prompt,
+            tools=[
+                {
+                    "name": tool_name,
+                    "description": tool_description,
+                    "input_schema": schema,
+                }
+            ],
+            tool_choice={"type": "tool", "name": tool_name},
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            **kwargs
+        ))
+
+    async def complete(self, prompt, schema, tool_name, tool_description, system_prompt) -> Output:
+        response = await self._create(prompt, schema, tool_name, tool_description, system_prompt, 2048)
+        self._record_usage(tool_name, response.usage.input_tokens, response.usage.output_tokens)
+        return response.content[0].input
+
+    async def stream(self, prompt, schema, tool_name, tool_description, system_prompt, max_tokens):
+        stream = await self._create(
+            prompt, schema, tool_name, tool_description, system_prompt, max_tokens, stream=True
+        )
+        # The tool input arrives as input_json_delta fragments
+        async for event in stream:
+            if event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                yield event.delta.partial_json
+            elif event.type == "message_start":
+                self._record_usage(tool_name, event.message.usage.input_tokens, None)
+            elif event.type == "message_delta":
+                self._record_usage(tool_name, None, event.usage.output_tokens)
+
+    def cleanup(self):
+        self._client = None
+        self._http_client = None
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini through google-generativeai. The SDK talks gRPC rather than
+    going through the shared HTTP pool, and has no tool-forced output, so
+    the schema is put in the prompt and the reply parsed as JSON.
+    """
+
+    provider = 'google'
+    api_key_env = 'GOOGLE_API_KEY'
+    receives_schema = True
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        self._configured = False
+
+    def available(self) -> bool:
+        if not super().available():
+            return False
+        try:
+            import google.generativeai  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _get_model(self):
+        import google.generativeai as genai
+        if not self._configured:
+            genai.configure(api_key=os.getenv(self.api_key_env))
+            self._configured = True
+        return genai.GenerativeModel(self.model)
+
+    async def complete(self, prompt, schema, tool_name, tool_description, system_prompt) -> Output:
+        model = self._get_model()
+        parts = [system_prompt, prompt]
+        if schema:
+            parts.append(f"The JSON object must match this JSON schema: {json.dumps(schema)}")
+        response = await ProviderRateLimiter.run(self.provider, lambda: model.generate_content_async(
+            "\n\n".join(parts),
+            generation_config={"temperature": 0.7}
+        ))
+        usage = getattr(response, 'usage_metadata', None)
+        if usage:
+            self._record_usage(tool_name, usage.prompt_token_count, usage.candidates_token_count)
+        text = response.text
+        match = CODE_FENCE.match(text)
+        return json.loads(match.group(1) if match else text)
+
+
+# Provider classes by model name prefix
+PROVIDER_CLASSES = (
+    ('gpt-', OpenAIProvider),
+    ('claude-', AnthropicProvider),
+    ('gemini-', GeminiProvider),
+)
+
+
+def provider_for_model(model: str) -> LLMProvider:
+    for prefix, provider_class in PROVIDER_CLASSES:
+        if model.startswith(prefix):
+            return provider_class(model)
+    raise ValueError(f"Unknown LLM model: {model}")
+
+
+class LatencyTracker:
+    """Recent successful call latencies per (model, tool), for picking hedge delays."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[tuple, Deque[float]] = {}
+
+    def record(self, model: str, tool_name: str, seconds: float):
+        key = (model, tool_name)
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def quantile(self, model: str, tool_name: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """The q-quantile of recent latencies, or None with fewer than min_samples."""
+        samples = self._samples.get((model, tool_name))
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
@@ -1,104 +1,389 @@
-import os
 import json
+import time
+import asyncio
 import logging
-from openai import AsyncOpenAI
-from anthropic import AsyncAnthropic
-from typing import Dict, List, Any, Literal, Optional, Union
+from django.conf import settings
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Any, Optional, Tuple, Union
+from .llm_cache import LLMResponseCache, InMemoryCacheBackend, SQLiteCacheBackend
+from .llm_providers import LLMProvider, LatencyTracker, provider_for_model
+from .metrics import Metrics
+from .partial_json import IncrementalJSONParser
+from .prompts import Prompt, count_tokens
 
 logger = logging.getLogger(__name__)
 
 class LLMService:
     """Service for handling all LLM-related functionality."""
     
-    _openai_client = None
-    _anthropic_client = None
-    
-    # Model selection: either "gpt-4o-mini" or "claude-3.5-haiku"
-    SELECTED_MODEL: Literal["gpt-4o-mini", "claude-3-5-haiku-20241022"] = "claude-3-5-haiku-20241022"
-    
+    _providers: Optional[List[LLMProvider]] = None
+    _response_cache = None
+    _latencies = LatencyTracker()
+
+    @staticmethod
+    def _setting(name: str, default):
+        return getattr(settings, name, default)
+
     @classmethod
-    async def _get_openai_client(cls) -> AsyncOpenAI:
-        """Get a new OpenAI client instance for each request."""
-        if cls._openai_client is None:
-            api_key = os.getenv('OPENAI_API_KEY')
-            if not api_key:
-                raise ValueError("OPENAI_API_KEY environment variable is not set")
-            cls._openai_client = AsyncOpenAI(api_key=api_key)
-        return cls._openai_client
+    def get_providers(cls) -> List[LLMProvider]:
+        """
+        Providers for LLM_MODELS that are configured, in preference order.
+        The first is the primary; the next one is raced against it when hedging.
+        """
+        if cls._providers is None:
+            providers = [provider_for_model(model) for model in cls._setting('LLM_MODELS', ["claude-3-5-haiku-20241022"])]
+            cls._providers = [provider for provider in providers if provider.available()]
+            skipped = [provider.model for provider in providers if provider not in cls._providers]
+            if skipped:
+                logger.info(f"LLM models without credentials or SDK: {', '.join(skipped)}")
+        if not cls._providers:
+            raise ValueError("No LLM provider is configured, check LLM_MODELS and the provider API keys")
+        return cls._providers
+
+    @classmethod
+    def _streaming_provider(cls) -> LLMProvider:
+        provider = next((p for p in cls.get_providers() if p.supports_streaming), None)
+        if provider is None:
+            raise ValueError("No configured LLM provider supports streaming")
+        return provider
 
     @classmethod
-    async def _get_anthropic_client(cls) -> AsyncAnthropic:
-        """Get a new Anthropic client instance for each request."""
-        if cls._anthropic_client is None:
-            api_key = os.getenv('ANTHROPIC_API_KEY')
-            if not api_key:
-                raise ValueError("ANTHROPIC_API_KEY environment variable is not set")
-            cls._anthropic_client = AsyncAnthropic(api_key=api_key)
-        return cls._anthropic_client
+    def _get_response_cache(cls) -> Optional[LLMResponseCache]:
+        """Get the configured response cache, or None if caching is disabled."""
+        if cls._response_cache is None:
+            backend_name = getattr(settings, 'LLM_CACHE_BACKEND', 'memory')
+            max_entries = getattr(settings, 'LLM_CACHE_MAX_ENTRIES', 1024)
+            if backend_name == 'off':
+                return None
+            elif backend_name == 'sqlite':
+                backend = SQLiteCacheBackend(settings.LLM_CACHE_PATH, max_entries=max_entries)
+            elif backend_name == 'memory':
+                backend = InMemoryCacheBackend(max_entries=max_entries)
+            else:
+                raise ValueError(f"Unknown LLM_CACHE_BACKEND: {backend_name}")
+            cls._response_cache = LLMResponseCache(backend, ttl=getattr(settings, 'LLM_CACHE_TTL', 3600))
+        return cls._response_cache
+
+    @classmethod
+    def cache_stats(cls) -> Dict[str, Any]:
+        """Hit/miss counters of the response cache in this worker."""
+        cache = cls._get_response_cache()
+        return cache.stats() if cache else {'backend': None, 'hits': 0, 'misses': 0, 'hit_rate': 0.0}
 
     @classmethod
     async def get_completion(
         cls,
-        prompt: str,
+        prompt: Union[str, Prompt],
         schema: Optional[Dict[str, Any]] = None,
         tool_name: str = "process_input",
         tool_description: str = "Process the input and generate structured output.",
-        system_prompt: str = "You are a helpful assistant that always responds with a valid JSON object only."
+        system_prompt: str = "You are a helpful assistant that always responds with a valid JSON object only.",
+        use_cache: bool = True
     ) -> Union[Dict[str, Any], List[Any]]:
         """
         Get completion from selected model.
         
         Args:
-            prompt: The prompt to send to the model
+            prompt: The prompt to send to the model, rendered per provider if a Prompt
             schema: Optional JSON schema for structured output (required for Anthropic)
             tool_name: Name of the tool for Anthropic's structured output
             tool_description: Description of the tool for Anthropic's structured output
             system_prompt: System prompt to set the model's behavior
+            use_cache: Whether to serve and store this call in the response cache
             
         Returns:
             Parsed JSON response from the model
         """
-        try:
-            if cls.SELECTED_MODEL == "gpt-4o-mini":
-                client = await cls._get_openai_client()
-                response = await client.chat.completions.create(
-                    model=cls.SELECTED_MODEL,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.7,
-                    response_format={"type": "json_object"}
-                )
-                return json.loads(response.choices[0].message.content)
-            else:  # claude-3-5-haiku-20241022
-                client = await cls._get_anthropic_client()
-                if not schema:
-                    raise ValueError("Schema is required for Anthropic model")
-
-                response = await client.messages.create(
-                    model=cls.SELECTED_MODEL,
-                    max_tokens=2048,
-                    system=system_prompt,
-                    tools=[
-                        {
-                            "name": tool_name,
-                            "description": tool_description,
-                            "input_schema": schema,
-                        }
-                    ],
-                    tool_choice={"type": "tool", "name": tool_name},
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ],
+        prompt = Prompt.of(prompt)
+        cache = cls._get_response_cache() if use_cache else None
+        if cache:
+            # Hedged calls take the first answer from any provider, so will a lookup
+            models = [provider.model for provider in cls.get_providers()]
+            cached = await cls._get_cached(cache, models, system_prompt, prompt, schema, tool_name)
+            if cached is not None:
+                return cached
+
+        model, result = await cls._request_completion(prompt, schema, tool_name, tool_description, system_prompt)
+        if cache and result:
+            await cache.set(LLMResponseCache.make_key(model, system_prompt, prompt.render(), schema, tool_name), result)
+        return result
+
+    @classmethod
+    async def _get_cached(
+        cls,
+        cache: LLMResponseCache,
+        models: List[str],
+        system_prompt: str,
+        prompt: Prompt,
+        schema: Optional[Dict[str, Any]],
+        tool_name: str
+    ) -> Optional[Any]:
+        """
+        The cached response of the first of models that has one. Responses
+        are stored under the model that gave them, which for a hedged call
+        may be a backup rather than the primary.
+        """
+        rendered = prompt.render()
+        keys = {model: LLMResponseCache.make_key(model, system_prompt, rendered, schema, tool_name) for model in models}
+        found = await cache.get_many(list(keys.values()))
+        cached = None
+        for model, key in keys.items():
+            if key in found:
+                cached = found[key]
+                logger.info(f"LLM cache hit for {tool_name} from {model}")
+                break
+        Metrics.CACHE_REQUESTS.inc(cache='llm', result='hit' if cached is not None else 'miss')
+        return cached
+
+    @classmethod
+    async def _request_completion(
+        cls,
+        prompt: Prompt,
+        schema: Optional[Dict[str, Any]],
+        tool_name: str,
+        tool_description: str,
+        system_prompt: str
+    ) -> Tuple[str, Union[Dict[str, Any], List[Any]]]:
+        """
+        Send the completion request, hedged across the configured providers.
+        Returns the model that answered and its response.
+        """
+        async def call(provider: LLMProvider):
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                text = cls._build_prompt(prompt, provider, schema, tool_name, system_prompt)
+                result = await provider.complete(text, schema, tool_name, tool_description, system_prompt)
+                result = cls._normalize_output(result, schema)
+                outcome = 'success'
+            except asyncio.CancelledError:
+                # Lost a hedged race
+                outcome = 'cancelled'
+                raise
+            finally:
+                Metrics.LLM_REQUEST_SECONDS.observe(
+                    time.perf_counter() - start, model=provider.model, tool=tool_name, outcome=outcome
                 )
-                return response.content[0].input
+            cls._latencies.record(provider.model, tool_name, time.perf_counter() - start)
+            return provider.model, result
+
+        try:
+            return await cls._hedged(call, tool_name)
         except Exception as e:
             logger.error(f"Error in LLM completion: {str(e)}")
             raise
 
+    @classmethod
+    def prompt_budget(cls, tool_name: str) -> Optional[int]:
+        """Token budget of the prompt for a tool: LLM_PROMPT_TOKEN_BUDGETS, else LLM_PROMPT_TOKEN_BUDGET."""
+        budgets = cls._setting('LLM_PROMPT_TOKEN_BUDGETS', {})
+        return budgets.get(tool_name, cls._setting('LLM_PROMPT_TOKEN_BUDGET', None))
+
+    @classmethod
+    def _build_prompt(
+        cls,
+        prompt: Union[str, Prompt],
+        provider: LLMProvider,
+        schema: Optional[Dict[str, Any]],
+        tool_name: str,
+        system_prompt: str
+    ) -> str:
+        """Render the prompt for a provider within its budget, and record its size."""
+        text, tokens = Prompt.of(prompt).build(
+            provider.model,
+            with_example=not (schema and provider.receives_schema),
+            budget=cls.prompt_budget(tool_name)
+        )
+        system_tokens = count_tokens(system_prompt, provider.model)
+        Metrics.LLM_PROMPT_TOKENS.observe(tokens + system_tokens, model=provider.model, tool=tool_name)
+        logger.info(f"Prompt for {tool_name} to {provider.model}: {tokens} tokens + {system_tokens} system")
+        return text
+
+    @classmethod
+    def hedge_delay(cls, provider: LLMProvider, tool_name: str) -> float:
+        """
+        How long to wait on the primary before racing the next provider: its
+        recent p90 latency for this tool, or LLM_HEDGE_DEFAULT_DELAY until
+        there are enough samples.
+        """
+        quantile = cls._latencies.quantile(
+            provider.model,
+            tool_name,
+            cls._setting('LLM_HEDGE_QUANTILE', 0.9),
+            min_samples=cls._setting('LLM_HEDGE_MIN_SAMPLES', 20)
+        )
+        if quantile is None:
+            return cls._setting('LLM_HEDGE_DEFAULT_DELAY', 10.0)
+        return max(cls._setting('LLM_HEDGE_MIN_DELAY', 1.0), quantile)
+
+    @classmethod
+    async def _hedged(cls, call: Callable[[LLMProvider], Awaitable[Any]], tool_name: str) -> Any:
+        """
+        Run call on the primary provider. If it hasn't answered within the
+        hedge delay, or fails, start it on the next provider too; the first
+        success wins and the other call is cancelled.
+        """
+        providers = cls.get_providers()
+        if not cls._setting('LLM_HEDGE_ENABLED', True) or len(providers) < 2:
+            return await call(providers[0])
+
+        tasks = {asyncio.create_task(call(providers[0])): providers[0]}
+        backups = list(providers[1:])
+        error = None
+        try:
+            delay = cls.hedge_delay(providers[0], tool_name)
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks,
+                    timeout=delay if backups else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is None:
+                        if provider is not providers[0]:
+                            logger.info(f"Hedged {tool_name} call won by {provider.model}")
+                        return task.result()
+                    error = task.exception()
+                    logger.warning(f"{provider.model} failed for {tool_name}: {str(error)}")
+                if backups and (not done or not tasks):
+                    # Primary is slow or every call so far failed, race the next provider
+                    backup = backups.pop(0)
+                    if not done:
+                        logger.info(f"Hedging {tool_name}: no answer after {delay:.2f}s, racing {backup.model}")
+                    tasks[asyncio.create_task(call(backup))] = backup
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    @classmethod
+    def _normalize_output(cls, result: Any, schema: Optional[Dict[str, Any]]) -> Any:
+        """
+        Bring provider output to the same shape before validating it. JSON-mode
+        models sometimes return the array alone when the schema wraps it in
+        an object with a single array property.
+        """
+        if not schema:
+            return result
+        properties = schema.get('properties', {})
+        if isinstance(result, list) and schema.get('type') == 'object' and len(properties) == 1:
+            key, subschema = next(iter(properties.items()))
+            if subschema.get('type') == 'array':
+                result = {key: result}
+        cls._validate_output(result, schema)
+        return result
+
+    @classmethod
+    async def get_completion_stream(
+        cls,
+        prompt: Union[str, Prompt],
+        schema: Optional[Dict[str, Any]] = None,
+        tool_name: str = "process_input",
+        tool_description: str = "Process the input and generate structured output.",
+        system_prompt: str = "You are a helpful assistant that always responds with a valid JSON object only.",
+        max_tokens: int = 8192,
+        use_cache: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Get a completion from the selected model as it is generated.
+
+        Yields {'type': 'partial', 'values': [(path, value), ...], 'output': ...}
+        for every chunk that completes values, where values are the newly
+        closed values with their path and output is the document so far
+        (filled in place, copy it to keep it). The last event is
+        {'type': 'final', 'output': ...} with the full response, checked
+        against the schema. A cache hit yields only the final event.
+        """
+        prompt = Prompt.of(prompt)
+        model = cls._streaming_provider().model
+        cache = cls._get_response_cache() if use_cache else None
+        if cache:
+            cached = await cls._get_cached(cache, [model], system_prompt, prompt, schema, tool_name)
+            if cached is not None:
+                yield {'type': 'final', 'output': cached}
+                return
+
+        parser = IncrementalJSONParser()
+        start = time.perf_counter()
+        first_token_at = None
+        async for chunk in cls._stream_completion(prompt, schema, tool_name, tool_description, system_prompt, max_tokens):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                Metrics.LLM_FIRST_TOKEN_SECONDS.observe(first_token_at - start, model=model, tool=tool_name)
+                logger.info(f"First token for {tool_name} from {model} after {(first_token_at - start) * 1000:.0f}ms")
+            values = parser.feed(chunk)
+            if values:
+                yield {'type': 'partial', 'values': values, 'output': parser.value}
+
+        if not parser.done:
+            raise ValueError(f"Truncated response from AI model for {tool_name}")
+        # Same shape as get_completion gives, partials keep the model's own
+        result = cls._normalize_output(json.loads(parser.text), schema)
+        Metrics.LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, model=model, tool=tool_name, outcome='success')
+        logger.info(
+            f"Streamed {tool_name} from {model} in {(time.perf_counter() - start) * 1000:.0f}ms "
+            f"({len(parser.text)} chars)"
+        )
+
+        if cache and result:
+            await cache.set(LLMResponseCache.make_key(model, system_prompt, prompt.render(), schema, tool_name), result)
+        yield {'type': 'final', 'output': result}
+
+    @classmethod
+    def _validate_output(cls, value: Any, schema: Dict[str, Any], path: str = '$'):
+        """Check a response against the subset of JSON schema our tool schemas use."""
+        expected = schema.get('type')
+        types = {
+            'object': dict,
+            'array': list,
+            'string': str,
+            'integer': int,
+            'number': (int, float),
+            'boolean': bool
+        }
+        if expected in types and (
+            not isinstance(value, types[expected])
+            or (expected in ('integer', 'number') and isinstance(value, bool))
+        ):
+            raise ValueError(f"Invalid response from AI model: {path} should be {expected}")
+        if expected == 'object':
+            for key in schema.get('required', []):
+                if key not in value:
+                    raise ValueError(f"Invalid response from AI model: {path}.{key} is missing")
+            for key, subschema in schema.get('properties', {}).items():
+                if key in value:
+                    cls._validate_output(value[key], subschema, f"{path}.{key}")
+        elif expected == 'array' and 'items' in schema:
+            for index, item in enumerate(value):
+                cls._validate_output(item, schema['items'], f"{path}[{index}]")
+
+    @classmethod
+    async def _stream_completion(
+        cls,
+        prompt: Prompt,
+        schema: Optional[Dict[str, Any]],
+        tool_name: str,
+        tool_description: str,
+        system_prompt: str,
+        max_tokens: int
+    ) -> AsyncIterator[str]:
+        """
+        Stream the raw JSON text of a completion from the first provider that
+        can stream. Streams aren't hedged, a stream can't be swapped mid-way.
+        """
+        provider = cls._streaming_provider()
+        text = cls._build_prompt(prompt, provider, schema, tool_name, system_prompt)
+        try:
+            async for chunk in provider.stream(text, schema, tool_name, tool_description, system_prompt, max_tokens):
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error in LLM completion stream: {str(e)}")
+            raise
+
     @classmethod
     async def cleanup(cls):
         """Cleanup any resources when shutting down."""
-        # Currently no cleanup needed, but method provided for future use
-        pass 
\ No newline at end of file
+        for provider in cls._providers or []:
+            provider.cleanup()
@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+import sqlite3
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id() -> str:
+    # Looked up on every flush, a forked worker must not overwrite its parent
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+CPU_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+class Metric:
+    """A named metric with labelled series, kept in memory per worker."""
+
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'type': self.type,
+                'help': self.documentation,
+                'labels': list(self.labels),
+                'series': [[list(key), self._copy(value)] for key, value in self._series.items()],
+                **self._extra(),
+            }
+
+    def _copy(self, value):
+        return value
+
+    def _extra(self) -> Dict[str, object]:
+        return {}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then sum and count
+                series = self._series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['counts'][bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def _copy(self, value):
+        return {'counts': list(value['counts']), 'sum': value['sum'], 'count': value['count']}
+
+    def _extra(self) -> Dict[str, object]:
+        return {'buckets': list(self.buckets)}
+
+
+class MetricsStore:
+    """Latest metrics snapshot of every worker, in a SQLite file shared on the host."""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS metrics_snapshots (
+                    worker TEXT PRIMARY KEY,
+                    snapshot TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not thread-safe, keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, worker: str, snapshot: Dict[str, object]):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO metrics_snapshots (worker, snapshot, updated_at) VALUES (?, ?, ?)",
+            (worker, json.dumps(snapshot), time.time())
+        )
+
+    def load_all(self, max_age: float) -> List[Dict[str, object]]:
+        """
+        Snapshots written in the last max_age seconds. Older ones belong to
+        workers that exited or were replaced, and are deleted.
+        """
+        conn = self._connect()
+        cutoff = time.time() - max_age
+        conn.execute("DELETE FROM metrics_snapshots WHERE updated_at < ?", (cutoff,))
+        rows = conn.execute("SELECT snapshot FROM metrics_snapshots WHERE updated_at >= ?", (cutoff,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metrics:
+    """
+    Application metrics. Each worker records into its own registry and
+    periodically writes a snapshot to a shared SQLite file; /metrics sums
+    the snapshots of every worker into the Prometheus text format.
+    """
+
+    LLM_REQUEST_SECONDS = Histogram(
+        'grokery_llm_request_duration_seconds',
+        'Provider call latency for structured completions.',
+        ('model', 'tool', 'outcome')
+    )
+    LLM_TOKENS = Counter(
+        'grokery_llm_tokens_total',
+        'Tokens sent to and generated by LLM providers.',
+        ('model', 'tool', 'direction')
+    )
+    LLM_PROMPT_TOKENS = Histogram(
+        'grokery_llm_prompt_tokens',
+        'Tokens of the prompt and system prompt of each call, counted locally.',
+        ('model', 'tool'),
+        buckets=TOKEN_BUCKETS
+    )
+    LLM_FIRST_TOKEN_SECONDS = Histogram(
+        'grokery_llm_first_token_seconds',
+        'Time to the first streamed token.',
+        ('model', 'tool')
+    )
+    CACHE_REQUESTS = Counter(
+        'grokery_cache_requests_total',
+        'Lookups in the LLM response cache, recipe catalog and image cache.',
+        ('cache', 'result')
+    )
+    IMAGE_REQUEST_SECONDS = Histogram(
+        'grokery_image_generation_duration_seconds',
+        'GetImg request latency by HTTP status.',
+        ('status',)
+    )
+    IMAGE_CPU_SECONDS = Histogram(
+        'grokery_image_processing_cpu_seconds',
+        'CPU time spent decoding and encoding a generated image.',
+        (),
+        buckets=CPU_BUCKETS
+    )
+    EVENT_LOOP_LAG_SECONDS = Histogram(
+        'grokery_event_loop_lag_seconds',
+        'How late the event loop runs a timer, sampled every METRICS_LOOP_LAG_INTERVAL.',
+        (),
+        buckets=CPU_BUCKETS
+    )
+    SSE_FIRST_EVENT_SECONDS = Histogram(
+        'grokery_generation_stream_first_event_seconds',
+        'Time from opening the generation stream to its first event.',
+        ('resumed',)
+    )
+    SSE_COMPLETE_SECONDS = Histogram(
+        'grokery_generation_stream_complete_seconds',
+        'Time from opening the generation stream to the complete event.',
+        ('resumed',)
+    )
+
+    _store: Optional[MetricsStore] = None
+    _flush_task: Optional[asyncio.Task] = None
+    _lag_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def all(cls) -> List[Metric]:
+        return [value for value in vars(cls).values() if isinstance(value, Metric)]
+
+    @classmethod
+    def _get_store(cls) -> MetricsStore:
+        if cls._store is None:
+            cls._store = MetricsStore(getattr(settings, 'METRICS_PATH', 'metrics.sqlite3'))
+        return cls._store
+
+    @classmethod
+    def flush(cls):
+        """Write this worker's metrics to the shared store."""
+        cls._get_store().save(worker_id(), {metric.name: metric.snapshot() for metric in cls.all()})
+
+    @classmethod
+    def render(cls) -> str:
+        """Metrics of every worker on the host, in the Prometheus text format."""
+        cls.flush()
+        merged: Dict[str, Dict[str, object]] = {}
+        # Live workers flush every METRICS_FLUSH_INTERVAL, so an older snapshot
+        # is from a worker that is gone. Dropping it looks like a counter reset,
+        # which rate() and increase() handle.
+        max_age = getattr(settings, 'METRICS_STALE_AFTER', 6 * getattr(settings, 'METRICS_FLUSH_INTERVAL', 5))
+        for snapshot in cls._get_store().load_all(max_age):
+            for name, metric in snapshot.items():
+                target = merged.setdefault(name, {**metric, 'series': {}})
+                for key, value in metric['series']:
+                    key = tuple(key)
+                    current = target['series'].get(key)
+                    if current is None:
+                        target['series'][key] = value
+                    elif metric['type'] == 'counter':
+                        target['series'][key] = current + value
+                    elif metric.get('buckets') == target.get('buckets'):
+                        current['counts'] = [a + b for a, b in zip(current['counts'], value['counts'])]
+                        current['sum'] += value['sum']
+                        current['count'] += value['count']
+
+        lines = []
+        for name, metric in sorted(merged.items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for key, value in sorted(metric['series'].items()):
+                if metric['type'] == 'counter':
+                    lines.append(f"{name}{_format_labels(metric['labels'], key)} {_format_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(metric['buckets']) + [float('inf')], value['counts']):
+                    cumulative += count
+                    le = ('le', _format_number(bound))
+                    lines.append(f"{name}_bucket{_format_labels(metric['labels'], key, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(metric['labels'], key)} {_format_number(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(metric['labels'], key)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    async def _flush_periodically(cls, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(cls.flush)
+            except Exception as e:
+                logger.error(f"Error flushing metrics: {str(e)}")
+
+    @classmethod
+    async def _sample_loop_lag(cls, interval: float):
+        # Anything blocking the loop delays the wakeup by as long as it blocks
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + interval
+            await asyncio.sleep(interval)
+            cls.EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - scheduled))
+
+    @classmethod
+    async def startup(cls):
+        """Start flushing this worker's metrics so other workers can serve them."""
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        cls._flush_task = asyncio.create_task(cls._flush_periodically(interval))
+        cls._lag_task = asyncio.create_task(cls._sample_loop_lag(getattr(settings, 'METRICS_LOOP_LAG_INTERVAL', 0.25)))
+
+    @classmethod
+    async def shutdown(cls):
+        for task in (cls._flush_task, cls._lag_task):
+            if task is not None:
+                task.cancel()
+        cls._flush_task = None
+        cls._lag_task = None
+        await asyncio.to_thread(cls.flush)
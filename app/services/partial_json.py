@@ -0,0 +1,122 @@
+import json
+from typing import Any, List, Optional, Tuple, Union
+
+Path = Tuple[Union[str, int], ...]
+
+WHITESPACE = ' \t\r\n'
+
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON document that arrives in chunks, e.g. a streamed
+    structured-output response.
+
+    feed() returns every value that was completed by the new chunk together
+    with its path from the root, so a caller can act on ('recipes', 0,
+    'title') or a whole ('recipes', 0) object as soon as it closes rather
+    than waiting for the end of the document. value holds the document
+    parsed so far, with every completed value and open container in place.
+    """
+
+    def __init__(self):
+        self._text = ''
+        self._pos = 0
+        # Open containers: [kind, container, current key or index, expecting a key]
+        self._stack: List[list] = []
+        self._root: Any = None
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._scalar_start: Optional[int] = None
+        self.done = False
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return self._text
+
+    @property
+    def value(self) -> Any:
+        """
+        The partial document. Containers are filled in place as parsing goes
+        on, so copy it if it needs to stay as it is now.
+        """
+        return self._root
+
+    def _path(self) -> Path:
+        return tuple(frame[2] for frame in self._stack)
+
+    def _insert(self, value: Any):
+        if not self._stack:
+            self._root = value
+            return
+        top = self._stack[-1]
+        if top[0] == '[':
+            top[1].append(value)
+            top[2] = len(top[1]) - 1
+        else:
+            top[1][top[2]] = value
+
+    def _complete(self, value: Any, completed: List[Tuple[Path, Any]]):
+        self._insert(value)
+        completed.append((self._path(), value))
+        if not self._stack:
+            self.done = True
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        """Add a chunk of text and return the (path, value) pairs it completed."""
+        completed = []
+        self._text += chunk
+        text = self._text
+        i = self._pos
+        while i < len(text):
+            c = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    value = json.loads(text[self._string_start:i + 1])
+                    if self._string_is_key:
+                        self._stack[-1][2] = value
+                    else:
+                        self._complete(value, completed)
+                i += 1
+                continue
+
+            if self._scalar_start is not None:
+                if c not in WHITESPACE and c not in ',]}':
+                    i += 1
+                    continue
+                self._complete(json.loads(text[self._scalar_start:i]), completed)
+                self._scalar_start = None
+
+            if c == '"':
+                top = self._stack[-1] if self._stack else None
+                self._string_is_key = bool(top and top[0] == '{' and top[3])
+                self._in_string = True
+                self._string_start = i
+            elif c in '{[':
+                container = {} if c == '{' else []
+                self._insert(container)
+                self._stack.append([c, container, None if c == '{' else -1, c == '{'])
+            elif c in '}]':
+                frame = self._stack.pop()
+                completed.append((self._path(), frame[1]))
+                if not self._stack:
+                    self.done = True
+            elif c == ':':
+                self._stack[-1][3] = False
+            elif c == ',':
+                if self._stack[-1][0] == '{':
+                    self._stack[-1][3] = True
+            elif c not in WHITESPACE:
+                self._scalar_start = i
+            i += 1
+
+        self._pos = i
+        return completed
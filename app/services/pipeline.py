@@ -0,0 +1,148 @@
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimeoutError(Exception):
+    """Raised when a stage runs past its timeout."""
+
+
+class Stage:
+    """A unit of work in a pipeline, started once all of its dependencies have finished."""
+
+    def __init__(
+        self,
+        name: Hashable,
+        func: Callable[[], Any],
+        depends_on: Iterable[Hashable] = (),
+        timeout: Optional[float] = None
+    ):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.timeout = timeout
+
+
+class PipelineScheduler:
+    """
+    Runs a DAG of async stages with per-stage timeouts.
+
+    Stages may be added while the pipeline is running, e.g. per-recipe stages
+    once the templates are known, and start right away if their
+    dependencies are done. A stage starts when all of its dependencies
+    have finished, whether they succeeded or not; it can check the shared
+    state its dependencies wrote to decide what to do.
+    """
+
+    def __init__(self):
+        self._stages: Dict[Hashable, Stage] = {}
+        self._tasks: Dict[asyncio.Task, Hashable] = {}
+        self._finished: Set[Hashable] = set()
+        self._waiting_on: Dict[Hashable, int] = {}
+        self._dependents: Dict[Hashable, List[Hashable]] = {}
+        self._ready: List[Hashable] = []
+        self._running = False
+        # Resolved to wake run() when a stage starts while it is waiting
+        self._wakeup: Optional[asyncio.Future] = None
+
+    def add(
+        self,
+        name: Hashable,
+        func: Callable[[], Any],
+        depends_on: Iterable[Hashable] = (),
+        timeout: Optional[float] = None
+    ) -> Stage:
+        """Register a stage. func is called with no arguments and must return an awaitable."""
+        if name in self._stages:
+            raise ValueError(f"Duplicate pipeline stage: {name!r}")
+        stage = Stage(name, func, depends_on, timeout)
+        self._stages[name] = stage
+
+        pending = [dep for dep in stage.depends_on if dep not in self._finished]
+        self._waiting_on[name] = len(pending)
+        for dep in pending:
+            self._dependents.setdefault(dep, []).append(name)
+        if not pending:
+            self._ready.append(name)
+            if self._running:
+                self._start_ready()
+        return stage
+
+    async def _run_stage(self, stage: Stage) -> Any:
+        start = time.perf_counter()
+        try:
+            if stage.timeout is None:
+                return await stage.func()
+            try:
+                return await asyncio.wait_for(stage.func(), stage.timeout)
+            except asyncio.TimeoutError:
+                raise StageTimeoutError(f"Stage {stage.name!r} timed out after {stage.timeout}s")
+        finally:
+            logger.debug(f"Stage {stage.name!r} finished in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def _start_ready(self):
+        while self._ready:
+            name = self._ready.pop()
+            task = asyncio.create_task(self._run_stage(self._stages[name]))
+            self._tasks[task] = name
+            if self._wakeup is not None and not self._wakeup.done():
+                self._wakeup.set_result(None)
+
+    def _mark_finished(self, name: Hashable):
+        self._finished.add(name)
+        for dependent in self._dependents.pop(name, ()):
+            self._waiting_on[dependent] -= 1
+            if self._waiting_on[dependent] == 0:
+                self._ready.append(dependent)
+
+    async def run(self) -> AsyncIterator[List[Tuple[Hashable, Any, Optional[BaseException]]]]:
+        """
+        Run the pipeline, yielding batches of (stage name, result, error) as
+        stages finish. Outstanding stages are cancelled if the consumer stops
+        iterating early.
+        """
+        loop = asyncio.get_running_loop()
+        self._running = True
+        try:
+            self._start_ready()
+            while self._tasks:
+                self._wakeup = loop.create_future()
+                done, _ = await asyncio.wait([*self._tasks, self._wakeup], return_when=asyncio.FIRST_COMPLETED)
+                done.discard(self._wakeup)
+                if not done:
+                    # A stage was added mid-run, wait on it too
+                    continue
+                completed = []
+                for task in done:
+                    name = self._tasks.pop(task)
+                    error = asyncio.CancelledError() if task.cancelled() else task.exception()
+                    result = None if error else task.result()
+                    if error:
+                        logger.error(f"Pipeline stage {name!r} failed: {str(error)}")
+                    completed.append((name, result, error))
+                # Hand results to the consumer before starting dependents, so
+                # they see the state the consumer derives from these results
+                yield completed
+                for name, _, _ in completed:
+                    self._mark_finished(name)
+                self._start_ready()
+        finally:
+            self._running = False
+            if self._wakeup is not None:
+                self._wakeup.cancel()
+            await self.cancel()
+
+    async def cancel(self) -> int:
+        """Cancel every outstanding stage and wait for them to unwind."""
+        tasks = list(self._tasks)
+        self._tasks.clear()
+        self._ready.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"Cancelled {len(tasks)} outstanding pipeline stages")
+        return len(tasks)
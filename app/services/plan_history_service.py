@@ -0,0 +1,133 @@
+import json
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from asgiref.sync import async_to_sync
+from django.db import transaction
+from app.models import RecipePlan, RecipePlanEntry, RecipeSnapshot, UserCurrentRecipes
+from .grocery_consolidator import GroceryConsolidator
+from .db_writer import DBWriter
+from .grocery_service import GroceryService
+from .fragment_cache import FragmentCache
+
+logger = logging.getLogger(__name__)
+
+class PlanHistoryService:
+    """
+    Service for users' past recipe plans. A plan is a list of references to
+    recipe snapshots keyed by a hash of their content, so a recipe that
+    shows up in many plans, or for many users, is stored once.
+    """
+
+    @staticmethod
+    def content_hash(recipe: Dict[str, Any]) -> str:
+        """SHA-256 of a recipe's content. The id is its position in a plan, not content."""
+        content = {key: value for key, value in recipe.items() if key != 'id'}
+        return hashlib.sha256(
+            json.dumps(content, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        ).hexdigest()
+
+    @classmethod
+    def _snapshot_ids(cls, recipes: List[Dict[str, Any]]) -> List[int]:
+        """Snapshot ids for recipes, storing the ones not seen before."""
+        hashes = [cls.content_hash(recipe) for recipe in recipes]
+        existing = dict(
+            RecipeSnapshot.objects.filter(content_hash__in=hashes).values_list('content_hash', 'id')
+        )
+        missing = {
+            content_hash: {key: value for key, value in recipe.items() if key != 'id'}
+            for content_hash, recipe in zip(hashes, recipes)
+            if content_hash not in existing
+        }
+        if missing:
+            # Another worker may store the same recipe first, keep whichever row won
+            RecipeSnapshot.objects.bulk_create(
+                [RecipeSnapshot(content_hash=content_hash, data=data) for content_hash, data in missing.items()],
+                ignore_conflicts=True
+            )
+            existing.update(
+                RecipeSnapshot.objects.filter(content_hash__in=missing).values_list('content_hash', 'id')
+            )
+        return [existing[content_hash] for content_hash in hashes]
+
+    @classmethod
+    def record_plan(cls, user, recipes: List[Dict[str, Any]]) -> Optional[RecipePlan]:
+        """
+        Add a saved plan to the user's history. A plan identical to their
+        latest one is not stored again. Call inside a transaction.
+        """
+        if not recipes:
+            return None
+        snapshot_ids = cls._snapshot_ids(recipes)
+
+        latest = RecipePlan.objects.filter(user=user).first()
+        if latest is not None and list(latest.entries.values_list('snapshot_id', flat=True)) == snapshot_ids:
+            return latest
+
+        plan = RecipePlan.objects.create(user=user)
+        RecipePlanEntry.objects.bulk_create([
+            RecipePlanEntry(plan=plan, snapshot_id=snapshot_id, position=position)
+            for position, snapshot_id in enumerate(snapshot_ids)
+        ])
+        cls.prune(user)
+        logger.info(f"Recorded recipe plan {plan.id} for user {user.id}")
+        return plan
+
+    @classmethod
+    def prune(cls, user) -> int:
+        """
+        Keep the user's newest PLAN_HISTORY_LIMIT plans, and drop snapshots
+        no plan refers to anymore.
+        """
+        limit = getattr(settings, 'PLAN_HISTORY_LIMIT', 20)
+        stale = list(
+            RecipePlan.objects.filter(user=user).values_list('id', flat=True)[limit:]
+        )
+        if not stale:
+            return 0
+        RecipePlan.objects.filter(id__in=stale).delete()
+        RecipeSnapshot.objects.filter(plan_entries__isnull=True).delete()
+        return len(stale)
+
+    @staticmethod
+    def list_plans(user) -> List[Dict[str, Any]]:
+        """The user's past plans, newest first, with the titles of their recipes."""
+        plans = RecipePlan.objects.filter(user=user).prefetch_related('entries__snapshot')
+        return [{
+            'id': plan.id,
+            'created_at': plan.created_at,
+            'titles': [entry.snapshot.data.get('title', '') for entry in plan.entries.all()],
+        } for plan in plans]
+
+    @staticmethod
+    def plan_recipes(plan: RecipePlan) -> List[Dict[str, Any]]:
+        return [
+            {'id': entry.position + 1, **entry.snapshot.data}
+            for entry in plan.entries.select_related('snapshot')
+        ]
+
+    @classmethod
+    def restore_plan(cls, user, plan_id) -> Optional[List[Dict[str, Any]]]:
+        """
+        Make one of the user's past plans current again, with its grocery
+        list rebuilt from the recipes. No provider calls are made. Returns
+        the plan's recipes, or None if the user has no such plan. Written
+        through DBWriter, so call it from sync code.
+        """
+        plan = RecipePlan.objects.filter(id=plan_id, user=user).first()
+        if plan is None:
+            return None
+
+        recipes = cls.plan_recipes(plan)
+        grocery_list = GroceryConsolidator.consolidate(recipes)
+
+        def write():
+            with transaction.atomic():
+                UserCurrentRecipes.objects.update_or_create(user=user, defaults={'recipes': recipes})
+                GroceryService.replace_items(user, grocery_list)
+
+        async_to_sync(DBWriter.run)(write)
+        FragmentCache.invalidate(user.id)
+        logger.info(f"Restored recipe plan {plan.id} for user {user.id}")
+        return recipes
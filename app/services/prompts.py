@@ -0,0 +1,108 @@
+import json
+import math
+import logging
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token of English prose and JSON, used without tiktoken
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """The tiktoken encoding for a model, or None if tiktoken isn't installed."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Claude and Gemini tokenizers aren't public, cl100k is a close stand-in
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = '') -> int:
+    """Count the tokens of text for a model, estimated from its length without tiktoken."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def compact_json(value: Any) -> str:
+    """JSON without the whitespace json.dumps puts between items."""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def _clean(text: str) -> str:
+    # Drop the indentation of triple-quoted prompts, it costs tokens and means nothing
+    return '\n'.join(line.strip() for line in text.strip().splitlines())
+
+
+class Prompt:
+    """
+    A prompt built from sections, rendered for the provider it is sent to.
+
+    The example shows the model the JSON to answer with. It is left out for
+    providers that are already given the schema (tool input schemas, schema
+    in the prompt), where it only repeats it. Optional sections are dropped,
+    last first, when the prompt doesn't fit in its token budget; for other
+    providers the example is all they know of the answer's shape, so it
+    goes only once every optional section has.
+    """
+
+    def __init__(self, task: str, example: Any = None, closing: str = ''):
+        self.task = _clean(task)
+        self.example = example
+        self.closing = _clean(closing)
+        # (text, optional)
+        self._sections: List[Tuple[str, bool]] = []
+
+    @classmethod
+    def of(cls, prompt) -> 'Prompt':
+        return prompt if isinstance(prompt, Prompt) else cls(prompt)
+
+    def add(self, text: str, optional: bool = False) -> 'Prompt':
+        """Add a section after the task, e.g. the data the task is about."""
+        self._sections.append((_clean(text), optional))
+        return self
+
+    def render(self, with_example: bool = True, drop: int = 0) -> str:
+        """The prompt text, without the last drop optional sections."""
+        optional = [i for i, (_, is_optional) in enumerate(self._sections) if is_optional]
+        dropped = set(optional[len(optional) - drop:]) if drop else set()
+        parts = [self.task]
+        parts.extend(text for i, (text, _) in enumerate(self._sections) if i not in dropped)
+        if with_example and self.example is not None:
+            parts.append(f"Respond with a JSON object shaped like: {compact_json(self.example)}")
+        if self.closing:
+            parts.append(self.closing)
+        return '\n'.join(part for part in parts if part)
+
+    def build(self, model: str, with_example: bool = True, budget: Optional[int] = None) -> Tuple[str, int]:
+        """
+        Render the prompt for a model and count its tokens. Over budget,
+        optional sections and then the example are dropped until it fits; a
+        prompt that still doesn't fit raises ValueError.
+        """
+        text = self.render(with_example)
+        tokens = count_tokens(text, model)
+        if budget is None or tokens <= budget:
+            return text, tokens
+
+        optional_count = sum(1 for _, is_optional in self._sections if is_optional)
+        attempts = [(with_example, drop) for drop in range(1, optional_count + 1)]
+        if with_example and self.example is not None:
+            attempts.append((False, optional_count))
+        for example, drop in attempts:
+            text = self.render(example, drop)
+            tokens = count_tokens(text, model)
+            if tokens <= budget:
+                if with_example and not example:
+                    logger.warning(f"Dropped the example from a prompt to fit its budget of {budget}")
+                logger.info(f"Compacted prompt to {tokens} tokens to fit its budget of {budget}")
+                return text, tokens
+        raise ValueError(f"Prompt of {tokens} tokens is over its budget of {budget} tokens")
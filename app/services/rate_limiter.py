@@ -0,0 +1,360 @@
+import re
+import time
+import random
+import asyncio
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Mapping, Optional, Tuple, TypeVar
+from weakref import WeakKeyDictionary
+import aiohttp
+import anthropic
+import openai
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Statuses worth retrying: timeouts, conflicts, rate limits, server errors and overload
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    anthropic.APIConnectionError,
+    aiohttp.ClientConnectionError,
+    asyncio.TimeoutError,
+)
+
+PROVIDER_HOSTS = {
+    'api.openai.com': 'openai',
+    'api.anthropic.com': 'anthropic',
+    'api.getimg.ai': 'getimg',
+}
+
+# Remaining-request and reset headers, in order of preference
+REMAINING_HEADERS = (
+    'x-ratelimit-remaining-requests',
+    'anthropic-ratelimit-requests-remaining',
+    'x-ratelimit-remaining',
+)
+RESET_HEADERS = (
+    'x-ratelimit-reset-requests',
+    'anthropic-ratelimit-requests-reset',
+    'x-ratelimit-reset',
+)
+
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value: str, now: Optional[float] = None) -> Optional[float]:
+    """
+    Seconds until a rate limit resets. Accepts plain seconds ("20"), Go-style
+    durations ("6m0s", "150ms"), RFC 3339 timestamps and HTTP dates.
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    now = time.time() if now is None else now
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if parts and ''.join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+    try:
+        return max(0.0, datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp() - now)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_rate_limit_headers(headers: Mapping[str, str], now: Optional[float] = None) -> Tuple[Optional[int], Optional[float]]:
+    """Read (remaining requests, seconds until reset) from provider response headers."""
+    remaining = None
+    for name in REMAINING_HEADERS:
+        if headers.get(name) is not None:
+            try:
+                remaining = int(float(headers[name]))
+            except ValueError:
+                pass
+            break
+
+    reset_after = None
+    if headers.get('retry-after-ms') is not None:
+        try:
+            reset_after = float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    if reset_after is None and headers.get('retry-after') is not None:
+        reset_after = parse_duration(headers['retry-after'], now)
+    if reset_after is None:
+        for name in RESET_HEADERS:
+            if headers.get(name) is not None:
+                reset_after = parse_duration(headers[name], now)
+                break
+    return remaining, reset_after
+
+
+class TokenBucketStore:
+    """
+    Token buckets in a SQLite file, so every worker process on the host
+    draws from the same budget. Each update runs in an IMMEDIATE transaction,
+    which SQLite serializes across processes with its file lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                    provider TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    blocked_until REAL NOT NULL DEFAULT 0
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not thread-safe, keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, provider: str, capacity: float, rate: float, change: Callable[[float, float, float], Tuple[float, float, T]]) -> T:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at, blocked_until FROM rate_limit_buckets WHERE provider = ?",
+                (provider,)
+            ).fetchone()
+            tokens, updated_at, blocked_until = row if row else (capacity, now, 0.0)
+            tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+            tokens, blocked_until, result = change(now, tokens, blocked_until)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (provider, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)",
+                (provider, tokens, now, blocked_until)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def take(self, provider: str, capacity: float, rate: float) -> float:
+        """Take a token. Returns 0 on success, otherwise the seconds to wait before trying again."""
+        def change(now, tokens, blocked_until):
+            if blocked_until > now:
+                return tokens, blocked_until, blocked_until - now
+            if tokens >= 1:
+                return tokens - 1, blocked_until, 0.0
+            return tokens, blocked_until, (1 - tokens) / rate
+
+        return self._update(provider, capacity, rate, change)
+
+    def observe(
+        self,
+        provider: str,
+        capacity: float,
+        rate: float,
+        remaining: Optional[int],
+        reset_after: Optional[float],
+        limited: bool = False
+    ):
+        """
+        Align the bucket with what the provider reports. Its remaining count
+        covers every client on the account, so it caps ours, and nobody sends
+        until the reset once it hits zero or the provider rate limited us.
+        """
+        def change(now, tokens, blocked_until):
+            if remaining is not None:
+                tokens = min(tokens, remaining)
+            if reset_after and (limited or (remaining is not None and remaining <= 0)):
+                blocked_until = max(blocked_until, now + reset_after)
+            return tokens, blocked_until, None
+
+        self._update(provider, capacity, rate, change)
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of first attempts, so retries can't multiply
+    load while a provider is struggling. Every request deposits ratio tokens
+    and every retry spends one; reserve allows a few retries up front.
+    """
+
+    def __init__(self, ratio: float, reserve: float = 10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._balance = reserve
+
+    def record_request(self):
+        self._balance = min(self.reserve, self._balance + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._balance >= 1:
+            self._balance -= 1
+            return True
+        return False
+
+
+class ProviderRateLimiter:
+    """
+    Per-provider request limiting and retries for outbound API calls.
+
+    Requests draw from a token bucket shared by all workers on the host, run
+    under a per-worker concurrency limit, and are retried with jittered
+    exponential backoff when the provider rate limits or fails transiently.
+    """
+
+    _store: Optional[TokenBucketStore] = None
+    _semaphores: 'WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]' = WeakKeyDictionary()
+    _budgets: Dict[str, RetryBudget] = {}
+
+    @staticmethod
+    def _setting(name: str, default):
+        return getattr(settings, name, default)
+
+    @classmethod
+    def _limits(cls, provider: str) -> Dict[str, float]:
+        limits = cls._setting('RATE_LIMITS', {}).get(provider, {})
+        return {
+            'rate': limits.get('requests_per_minute', 60) / 60,
+            'capacity': limits.get('burst', 10),
+            'concurrency': limits.get('max_concurrency', 10),
+        }
+
+    @classmethod
+    def _get_store(cls) -> TokenBucketStore:
+        if cls._store is None:
+            cls._store = TokenBucketStore(cls._setting('RATE_LIMIT_PATH', 'rate_limits.sqlite3'))
+        return cls._store
+
+    @classmethod
+    def _get_semaphore(cls, provider: str) -> asyncio.Semaphore:
+        # Semaphores are bound to the loop they are first used on
+        semaphores = cls._semaphores.setdefault(asyncio.get_running_loop(), {})
+        semaphore = semaphores.get(provider)
+        if semaphore is None:
+            semaphore = semaphores[provider] = asyncio.Semaphore(int(cls._limits(provider)['concurrency']))
+        return semaphore
+
+    @classmethod
+    def _get_budget(cls, provider: str) -> RetryBudget:
+        budget = cls._budgets.get(provider)
+        if budget is None:
+            budget = cls._budgets[provider] = RetryBudget(cls._setting('RATE_LIMIT_RETRY_BUDGET', 0.2))
+        return budget
+
+    @staticmethod
+    def provider_for_host(host: str) -> Optional[str]:
+        return PROVIDER_HOSTS.get(host)
+
+    @classmethod
+    async def acquire(cls, provider: str):
+        """Wait for a token from the provider's shared bucket."""
+        limits = cls._limits(provider)
+        while True:
+            wait = await asyncio.to_thread(cls._get_store().take, provider, limits['capacity'], limits['rate'])
+            if wait <= 0:
+                return
+            # Jitter so workers woken at the same time don't stampede the bucket
+            await asyncio.sleep(wait + random.uniform(0, min(wait, 1.0)))
+
+    @classmethod
+    async def observe(cls, provider: str, headers: Mapping[str, str], status: Optional[int] = None):
+        """Update the provider's bucket from rate limit response headers."""
+        remaining, reset_after = parse_rate_limit_headers(headers)
+        if remaining is None and reset_after is None:
+            return
+        limits = cls._limits(provider)
+        try:
+            await asyncio.to_thread(
+                cls._get_store().observe,
+                provider, limits['capacity'], limits['rate'], remaining, reset_after, status == 429
+            )
+        except Exception as e:
+            logger.error(f"Error updating rate limit for {provider}: {str(e)}")
+
+    @classmethod
+    async def observe_httpx_response(cls, response):
+        """httpx response hook for the clients the provider SDKs share."""
+        provider = cls.provider_for_host(response.request.url.host)
+        if provider:
+            await cls.observe(provider, response.headers, response.status_code)
+
+    @staticmethod
+    def _error_status(error: BaseException) -> Optional[int]:
+        # SDK errors carry status_code, aiohttp's ClientResponseError carries status
+        return getattr(error, 'status_code', None) or getattr(error, 'status', None)
+
+    @classmethod
+    def _is_retryable(cls, error: BaseException) -> bool:
+        status = cls._error_status(error)
+        if isinstance(status, int):
+            return status in RETRYABLE_STATUSES
+        return isinstance(error, RETRYABLE_ERRORS)
+
+    @staticmethod
+    def _retry_after(error: BaseException) -> Optional[float]:
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None) or getattr(error, 'headers', None)
+        if not headers:
+            return None
+        return parse_rate_limit_headers(headers)[1]
+
+    @classmethod
+    async def run(cls, provider: str, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Call func under the provider's rate limit, retrying transient failures.
+        func is called again for every attempt and must return a new awaitable.
+        """
+        max_retries = cls._setting('RATE_LIMIT_MAX_RETRIES', 4)
+        base = cls._setting('RATE_LIMIT_BACKOFF_BASE', 0.5)
+        cap = cls._setting('RATE_LIMIT_BACKOFF_MAX', 30)
+        budget = cls._get_budget(provider)
+        budget.record_request()
+
+        attempt = 0
+        while True:
+            await cls.acquire(provider)
+            try:
+                async with cls._get_semaphore(provider):
+                    return await func()
+            except Exception as e:
+                if not cls._is_retryable(e) or attempt >= max_retries:
+                    raise
+                if not budget.try_spend():
+                    logger.warning(f"Retry budget for {provider} exhausted, not retrying: {str(e)}")
+                    raise
+                # Full jitter, but never earlier than the provider asked for
+                delay = random.uniform(0, min(cap, base * 2 ** attempt))
+                retry_after = cls._retry_after(e)
+                if retry_after:
+                    delay = max(delay, retry_after)
+                attempt += 1
+                logger.warning(
+                    f"{provider} request failed ({cls._error_status(e) or type(e).__name__}), "
+                    f"retry {attempt}/{max_retries} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+
+    @classmethod
+    def reset(cls):
+        """Drop per-worker state, e.g. on shutdown."""
+        cls._semaphores.clear()
+        cls._budgets.clear()
@@ -1,13 +1,22 @@
 import os
 import json
+import time
 import asyncio
 import logging
-import aiohttp
-import base64
-from io import BytesIO
-from PIL import Image
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from .llm_service import LLMService
+from .http_pool import HTTPPool
+from .metrics import Metrics
+from .prompts import Prompt
+from .rate_limiter import ProviderRateLimiter, RETRYABLE_STATUSES
+from .catalog_service import CatalogService
+from .image_store import ImageStore
+from .image_pipeline import ImagePipeline
+from .image_cache_service import ImageCacheService
+from .db_writer import DBWriter
+from .grocery_consolidator import GroceryConsolidator
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +67,30 @@ class RecipeService:
         "required": ["recipes"]
     }
 
+    # Single-call plan: templates with their details. visual_description comes
+    # before the ingredients so image generation can start early.
+    RECIPE_PLAN_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "recipes": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer"},
+                        "title": {"type": "string"},
+                        "description": {"type": "string"},
+                        "visual_description": {"type": "string"},
+                        "ingredients": RECIPE_DETAILS_SCHEMA["properties"]["ingredients"],
+                        "instructions": RECIPE_DETAILS_SCHEMA["properties"]["instructions"]
+                    },
+                    "required": ["id", "title", "description", "visual_description", "ingredients", "instructions"]
+                }
+            }
+        },
+        "required": ["recipes"]
+    }
+
     GROCERY_LIST_SCHEMA = {
         "type": "object",
         "properties": {
@@ -77,58 +110,60 @@ class RecipeService:
         "required": ["grocery_list"]
     }
 
-    _http_client = None
-
-    @classmethod
-    async def _get_http_client(cls) -> aiohttp.ClientSession:
-        """Get or create an HTTP client instance."""
-        if cls._http_client is None:
-            cls._http_client = aiohttp.ClientSession()
-        return cls._http_client
+    # Shape of the answer for providers that aren't given the schema. Spelled
+    # out once here, and left out of the prompt when the schema is enforced.
+    TEMPLATE_EXAMPLE = {
+        "id": 1,
+        "title": "Recipe title",
+        "description": "One sentence description",
+        "visual_description": "How the completed dish looks"
+    }
+    DETAILS_EXAMPLE = {
+        "ingredients": [{"name": "ingredient name", "quantity": "amount", "unit": "measurement unit"}],
+        "instructions": ["Step 1 instruction"]
+    }
+    GROCERY_LIST_EXAMPLE = {
+        "grocery_list": [{"name": "item name", "quantity": "amount", "unit": "measurement unit"}]
+    }
 
     @classmethod
     async def cleanup(cls):
         """Cleanup resources when shutting down."""
-        if cls._http_client:
-            await cls._http_client.close()
-            cls._http_client = None
+        ImagePipeline.shutdown()
         await LLMService.cleanup()
+        await HTTPPool.shutdown()
 
-    @staticmethod
-    def _decode_and_optimize_image(base64_string: str) -> str:
-        """Decode base64 image, optimize it, and return as base64."""
+    @classmethod
+    async def store_recipe_image(cls, base64_string: str) -> Dict[str, Any]:
+        """
+        Encode a generated image into its variants in the image pipeline and
+        write each one to the image store.
+
+        Returns:
+            {'image_hash': JPEG fallback hash, 'image_variants': {variant: hash}}
+        """
+        empty = {'image_hash': '', 'image_variants': {}}
         if not base64_string:
-            return ''
-        
+            return empty
         try:
-            # Decode base64 to bytes
-            image_data = base64.b64decode(base64_string)
-            
-            # Open image with PIL
-            with Image.open(BytesIO(image_data)) as img:
-                # Convert to RGB if necessary
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
-                
-                # Create a BytesIO object to store the optimized image
-                optimized = BytesIO()
-                
-                # Save as JPEG with optimization
-                img.save(optimized, format='JPEG', quality=85, optimize=True)
-                
-                # Get the optimized image data and encode to base64
-                optimized_data = base64.b64encode(optimized.getvalue()).decode('utf-8')
-                
-                return optimized_data
+            result = await ImagePipeline.process(base64_string)
         except Exception as e:
             logger.error(f"Error processing image: {str(e)}")
-            return ''
+            return empty
+
+        variants = {}
+        for variant, data in result['variants'].items():
+            variants[variant] = await asyncio.to_thread(ImageStore.save, data)
+        return {
+            'image_hash': variants.pop('jpeg', ''),
+            'image_variants': variants
+        }
 
     @classmethod
     async def _generate_recipe_image(cls, recipe_text: str, visual_description: str) -> str:
         """Generate an image for a recipe using GetImg API."""
-        url = "https://api.getimg.ai/v1/flux-schnell/text-to-image"
-        
+        url = getattr(settings, 'GETIMG_API_URL', "https://api.getimg.ai/v1/flux-schnell/text-to-image")
+
         api_key = os.getenv('GETIMG_API_KEY')
         if not api_key:
             logger.error("GETIMG_API_KEY environment variable is not set")
@@ -149,9 +184,17 @@ class RecipeService:
             "authorization": f"Bearer {api_key}"
         }
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, headers=headers, timeout=30) as response:
+        async def request():
+            session = HTTPPool.get_session()
+            start = time.perf_counter()
+            status = 'error'
+            try:
+                async with session.post(url, json=payload, headers=headers) as response:
+                    status = response.status
+                    await ProviderRateLimiter.observe('getimg', response.headers, response.status)
+                    if response.status in RETRYABLE_STATUSES:
+                        # Raise so the rate limiter retries it
+                        response.raise_for_status()
                     if response.status == 200:
                         result = await response.json()
                         image_data = result.get('image', '')
@@ -161,39 +204,73 @@ class RecipeService:
                         error_text = await response.text()
                         logger.error(f"Error generating image. Status: {response.status}, Response: {error_text}")
                         return ''
+            finally:
+                Metrics.IMAGE_REQUEST_SECONDS.observe(time.perf_counter() - start, status=status)
+
+        try:
+            return await ProviderRateLimiter.run('getimg', request)
         except Exception as e:
             logger.error(f"Exception in image generation: {str(e)}", exc_info=True)
             return ''
 
+    @classmethod
+    async def get_recipe_image(cls, recipe_template, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Get stored image hashes for a recipe, reusing a cached image of the
+        same dish when there is one and generating a new image otherwise.
+        """
+        title = recipe_template['title']
+        visual_description = recipe_template.get('visual_description', '')
+
+        if use_cache:
+            try:
+                cached = await sync_to_async(ImageCacheService.lookup)(title, visual_description)
+            except Exception as e:
+                logger.error(f"Error reading image cache: {str(e)}")
+                cached = None
+            Metrics.CACHE_REQUESTS.inc(cache='image', result='hit' if cached else 'miss')
+            if cached:
+                logger.info(f"Image cache hit for recipe: {title}")
+                try:
+                    await DBWriter.run(ImageCacheService.record_hit, title, visual_description)
+                except Exception as e:
+                    logger.error(f"Error recording image cache hit: {str(e)}")
+                return cached
+
+        recipe_text = f"{title} - {recipe_template.get('description', '')}"
+        image = await cls.store_recipe_image(
+            await cls._generate_recipe_image(recipe_text, visual_description)
+        )
+
+        if use_cache and image['image_hash']:
+            try:
+                await DBWriter.run(ImageCacheService.store, title, visual_description, image)
+            except Exception as e:
+                logger.error(f"Error storing image in cache: {str(e)}")
+
+        return image
+
     @classmethod
     async def get_recipe_templates(cls):
         """Get basic recipe templates for the week."""
-        template_prompt = """Generate 7 easy-to-make, nutritious, and cost-effective meals for the week. 
-        For each recipe, provide:
-        1. Title: The name of the dish
-        2. Description: A very brief 1-sentence description of the dish
-        3. Visual Description: A detailed description of how the completed dish should look, focusing on colors, textures, and presentation
-        
-        Return your response as a JSON object with this exact structure (no markdown formatting):
-        {
-            "recipes": [
-                {
-                    "id": 1,
-                    "title": "Recipe Title",
-                    "description": "One sentence description",
-                    "visual_description": "Detailed visual description of the completed dish"
-                },
-                ...
-            ]
-        }
-        
-        Make sure to include exactly 7 recipes and return only the JSON object, no other text."""
+        template_prompt = Prompt(
+            """Generate 7 easy-to-make, nutritious, and cost-effective meals for the week.
+            For each recipe, provide:
+            1. Title: The name of the dish
+            2. Description: A very brief 1-sentence description of the dish
+            3. Visual Description: A detailed description of how the completed dish should look, focusing on colors, textures, and presentation""",
+            example={"recipes": [cls.TEMPLATE_EXAMPLE]},
+            closing="Include exactly 7 recipes, numbered from 1."
+        )
 
         templates_data = await LLMService.get_completion(
             prompt=template_prompt,
             schema=cls.RECIPE_TEMPLATES_SCHEMA,
             tool_name="generate_recipes",
-            tool_description="Generate a list of recipe templates for the week."
+            tool_description="Generate a list of recipe templates for the week.",
+            # The prompt is the same for everyone and a rebuild is asked for to get
+            # a new plan, so the plan is never served from the response cache
+            use_cache=False
         )
         
         if not templates_data:
@@ -202,29 +279,31 @@ class RecipeService:
         return templates_data.get('recipes', [])
 
     @classmethod
-    async def get_recipe_details(cls, recipe_template):
-        """Get detailed ingredients and instructions for a specific recipe."""
-        detail_prompt = f"""For this recipe: {recipe_template['title']} - {recipe_template['description']}
-        Generate detailed ingredients and instructions.
-        
-        Return your response as a JSON object with this exact structure (no markdown formatting):
-        {{
-            "ingredients": [
-                {{
-                    "name": "ingredient name",
-                    "quantity": "amount",
-                    "unit": "measurement unit"
-                }},
-                ...
-            ],
-            "instructions": [
-                "Step 1 instruction",
-                "Step 2 instruction",
-                ...
-            ]
-        }}
-
-        Return only the JSON object, no other text."""
+    async def get_recipe_details(cls, recipe_template, use_catalog: bool = True):
+        """
+        Get detailed ingredients and instructions for a specific recipe.
+        The shared catalog is checked first; the LLM is only called on a miss.
+        """
+        if use_catalog:
+            try:
+                details = await sync_to_async(CatalogService.get_recipe_details)(recipe_template['title'])
+            except Exception as e:
+                logger.error(f"Error reading recipe catalog: {str(e)}")
+                details = None
+            Metrics.CACHE_REQUESTS.inc(cache='catalog', result='hit' if details else 'miss')
+            if details:
+                logger.info(f"Catalog hit for recipe: {recipe_template['title']}")
+                try:
+                    await DBWriter.run(CatalogService.mark_served, recipe_template['title'])
+                except Exception as e:
+                    logger.error(f"Error counting catalog hit: {str(e)}")
+                return {**recipe_template, **details}
+
+        detail_prompt = Prompt(
+            f"Generate detailed ingredients and instructions for this recipe: {recipe_template['title']}",
+            example=cls.DETAILS_EXAMPLE
+        )
+        detail_prompt.add(recipe_template['description'], optional=True)
 
         details = await LLMService.get_completion(
             prompt=detail_prompt,
@@ -236,37 +315,159 @@ class RecipeService:
         if not details:
             raise ValueError("No response content from AI model")
         
-        return {
+        recipe = {
             **recipe_template,
             'ingredients': details.get('ingredients', []),
             'instructions': details.get('instructions', [])
         }
 
+        if use_catalog:
+            try:
+                await DBWriter.run(CatalogService.store_recipe, recipe)
+            except Exception as e:
+                logger.error(f"Error storing recipe in catalog: {str(e)}")
+
+        return recipe
+
     @classmethod
-    async def generate_grocery_list(cls, recipes):
-        """Generate consolidated grocery list from all recipes."""
-        recipe_data = [{
-            'title': recipe['title'],
-            'description': recipe['description'],
-            'ingredients': recipe['ingredients']
-        } for recipe in recipes]
-
-        grocery_prompt = f"""Based on these recipes and their ingredients: {recipe_data}
-        Generate a consolidated grocery list with exact quantities needed for all 7 meals.
-        
-        Return your response as a JSON object with this exact structure (no markdown formatting):
-        {{
-            "grocery_list": [
-                {{
-                    "name": "item name",
-                    "quantity": "amount",
-                    "unit": "measurement unit"
-                }},
-                ...
-            ]
-        }}
-        
-        Combine similar ingredients, adjust quantities accordingly, and return only the JSON object, no other text."""
+    async def stream_recipe_plan(cls) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Generate the week's recipes, with ingredients and instructions, in a
+        single streamed call instead of a template call plus one call per recipe.
+
+        Yields ('template', template) as soon as a recipe's visual description
+        has been parsed, then ('recipe', recipe) once its object is complete.
+        """
+        plan_prompt = Prompt(
+            """Generate 7 easy-to-make, nutritious, and cost-effective meals for the week.
+            For each recipe, provide:
+            1. Title: The name of the dish
+            2. Description: A very brief 1-sentence description of the dish
+            3. Visual Description: A detailed description of how the completed dish should look, focusing on colors, textures, and presentation
+            4. Ingredients: Every ingredient with its quantity and measurement unit
+            5. Instructions: The preparation steps""",
+            example={"recipes": [{**cls.TEMPLATE_EXAMPLE, **cls.DETAILS_EXAMPLE}]},
+            closing="Include exactly 7 recipes, numbered from 1, keeping the keys of each recipe in the order above."
+        )
+
+        announced = set()
+        finished = set()
+
+        def template_for(index, fields):
+            # Number recipes by position, the ids the model writes aren't guaranteed unique
+            return {
+                'id': index + 1,
+                'title': fields.get('title', ''),
+                'description': fields.get('description', ''),
+                'visual_description': fields.get('visual_description', '')
+            }
+
+        async def finish(index, fields):
+            recipe = {
+                **template_for(index, fields),
+                'ingredients': fields.get('ingredients', []),
+                'instructions': fields.get('instructions', [])
+            }
+            finished.add(index)
+            try:
+                await DBWriter.run(CatalogService.store_recipe, recipe)
+            except Exception as e:
+                logger.error(f"Error storing recipe in catalog: {str(e)}")
+            return recipe
+
+        async for event in LLMService.get_completion_stream(
+            prompt=plan_prompt,
+            schema=cls.RECIPE_PLAN_SCHEMA,
+            tool_name="generate_recipe_plan",
+            tool_description="Generate the week's recipes with their ingredients and instructions.",
+            # Like the templates, every rebuild should get a new plan
+            use_cache=False
+        ):
+            if event['type'] == 'final':
+                # Anything not streamed yet, e.g. recipes the parser couldn't follow
+                for index, fields in enumerate(event['output'].get('recipes', [])):
+                    if index not in announced:
+                        announced.add(index)
+                        yield 'template', template_for(index, fields)
+                    if index not in finished:
+                        yield 'recipe', await finish(index, fields)
+                continue
+
+            for path, value in event['values']:
+                if len(path) < 2 or path[0] != 'recipes':
+                    continue
+                index = path[1]
+                fields = event['output']['recipes'][index]
+                if not isinstance(fields, dict):
+                    continue
+
+                if path[2:] == ('visual_description',) and index not in announced:
+                    announced.add(index)
+                    yield 'template', template_for(index, fields)
+
+                elif len(path) == 2:
+                    if index not in announced:
+                        announced.add(index)
+                        yield 'template', template_for(index, fields)
+                    yield 'recipe', await finish(index, fields)
+
+        if not announced:
+            raise ValueError("No response content from AI model")
+
+    @classmethod
+    async def generate_grocery_list(
+        cls,
+        recipes,
+        use_llm: Optional[bool] = None,
+        consolidator: Optional[GroceryConsolidator] = None
+    ):
+        """
+        Generate consolidated grocery list from all recipes.
+        Consolidation runs locally unless GROCERY_LIST_ENGINE is "llm" or use_llm
+        is set; the LLM is also used as a fallback if local consolidation fails.
+        A consolidator that already holds every recipe's ingredients is just finalized.
+        """
+        if use_llm is None:
+            use_llm = getattr(settings, 'GROCERY_LIST_ENGINE', 'local') == 'llm'
+
+        if not use_llm:
+            try:
+                if consolidator is not None:
+                    return consolidator.items()
+                return GroceryConsolidator.consolidate(recipes)
+            except Exception as e:
+                logger.error(f"Error consolidating grocery list locally: {str(e)}", exc_info=True)
+                if not getattr(settings, 'GROCERY_LIST_LLM_FALLBACK', True):
+                    raise
+
+        return await cls._generate_grocery_list_llm(recipes)
+
+    @staticmethod
+    def _compact_ingredients(recipes) -> str:
+        """
+        One line per recipe: its title, then its ingredients. Much smaller
+        than the recipes as JSON, and descriptions don't matter for shopping.
+        """
+        lines = []
+        for recipe in recipes:
+            ingredients = '; '.join(
+                ' '.join(str(part).strip() for part in (
+                    ingredient.get('quantity', ''), ingredient.get('unit', ''), ingredient.get('name', '')
+                ) if str(part).strip())
+                for ingredient in recipe.get('ingredients', [])
+            )
+            lines.append(f"{recipe['title']}: {ingredients}")
+        return '\n'.join(lines)
+
+    @classmethod
+    async def _generate_grocery_list_llm(cls, recipes):
+        """Ask the LLM to consolidate the grocery list from all recipes."""
+        grocery_prompt = Prompt(
+            f"Generate a consolidated grocery list with exact quantities needed for all {len(recipes)} meals.",
+            example=cls.GROCERY_LIST_EXAMPLE,
+            closing="Combine similar ingredients and adjust quantities accordingly."
+        )
+        grocery_prompt.add(f"Ingredients of each recipe, as quantity unit name:\n{cls._compact_ingredients(recipes)}")
 
         grocery_data = await LLMService.get_completion(
             prompt=grocery_prompt,
@@ -0,0 +1,53 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+# Bumped whenever events change in a way older pages can't follow; a page
+# built for another version reloads itself (see recipes.js)
+PROTOCOL_VERSION = 2
+
+_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+def encode_event(payload: Dict[str, Any], event_id: Optional[str] = None) -> bytes:
+    """One SSE frame, built as bytes with compact JSON."""
+    data = _encoder.encode(payload).encode()
+    if event_id is None:
+        return b'data: ' + data + b'\n\n'
+    return b'id: ' + event_id.encode() + b'\ndata: ' + data + b'\n\n'
+
+
+def hello_event() -> bytes:
+    # No id, so it doesn't move the client's Last-Event-ID
+    return encode_event({'type': 'protocol', 'v': PROTOCOL_VERSION})
+
+
+class RecipePatcher:
+    """
+    Remembers which value of each recipe field the client has been sent,
+    and turns a recipe into a patch of only the fields that changed since:
+    {'id': 3, 'set': {'image_hash': ..., 'image_loading': False}}.
+    A recipe the client hasn't seen is sent in full.
+    """
+
+    def __init__(self):
+        self._sent: Dict[Any, Dict[str, Any]] = {}
+
+    def mark_sent(self, recipes: Iterable[Dict[str, Any]]):
+        """Record recipes the client received in full, e.g. in a templates event."""
+        for recipe in recipes:
+            self._sent[recipe['id']] = dict(recipe)
+
+    def patch(self, recipe: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The patch bringing the client's copy up to date, or None if it already is."""
+        sent = self._sent.setdefault(recipe['id'], {})
+        changed = {
+            key: value for key, value in recipe.items()
+            if key != 'id' and (key not in sent or sent[key] != value)
+        }
+        if not changed:
+            return None
+        sent.update(changed)
+        return {'id': recipe['id'], 'set': changed}
+
+    def patches(self, recipes: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [patch for patch in map(self.patch, recipes) if patch is not None]
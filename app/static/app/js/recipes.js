@@ -1,13 +1,38 @@
+// Version of the generation event protocol this page understands, see app/services/sse_protocol.py
+const STREAM_PROTOCOL_VERSION = 2;
+
 // Helper functions to create HTML
+function recipeImageSrc(recipe) {
+    if (recipe.image_hash) return `/images/${recipe.image_hash}/`;
+    // Recipes saved before the image store still carry inline base64
+    if (recipe.image) return `data:image/jpeg;base64,${recipe.image}`;
+    return null;
+}
+
+// The thumbnail stands in, scaled up, until the lazy-loaded photo covers it
+function recipeImageStyle(recipe) {
+    const thumbnail = (recipe.image_variants || {}).thumbnail;
+    return thumbnail ? ` style="background-image: url('/images/${thumbnail}/')"` : '';
+}
+
+function createRecipeImageHTML(recipe) {
+    const variants = recipe.image_variants || {};
+    const sources = ['avif', 'webp']
+        .filter(format => variants[format])
+        .map(format => `<source srcset="/images/${variants[format]}/" type="image/${format}">`)
+        .join('');
+    return `<picture>${sources}<img src="${recipeImageSrc(recipe)}" alt="${recipe.title}" loading="lazy"></picture>`;
+}
+
 function createRecipeTemplateHTML(recipe) {
     console.log('Creating recipe template HTML for recipe:', recipe);
     return `
         <div class="recipe-item" data-recipe-id="${recipe.id}">
-            <div class="recipe-image">
+            <div class="recipe-image"${recipe.image_loading ? '' : recipeImageStyle(recipe)}>
                 ${recipe.image_loading ? 
                     `<div class="loading-spinner"></div>` :
-                    recipe.image ? 
-                        `<img src="data:image/jpeg;base64,${recipe.image}" alt="${recipe.title}" loading="lazy">` :
+                    recipeImageSrc(recipe) ? 
+                        createRecipeImageHTML(recipe) :
                         `<div class="placeholder-image">
                             <svg width="48" height="48" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.5">
                                 <rect x="3" y="3" width="18" height="18" rx="2" ry="2"/>
@@ -63,6 +88,11 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Pick up a generation that is still running, e.g. after a page refresh
+    if (window.activeGenerationJob) {
+        setupRecipeStream(window.activeGenerationJob);
+    }
+
     // Close modal on escape key
     document.addEventListener('keydown', function(e) {
         if (e.key === 'Escape') {
@@ -71,9 +101,11 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
-function setupRecipeStream() {
+// With a job id, only follow that job; without, start a generation (or join the running one)
+function setupRecipeStream(jobId) {
     console.log('Setting up recipe generation stream');
-    const eventSource = new EventSource('/api/recipes/generate/');
+    const query = jobId ? `?job=${encodeURIComponent(jobId)}` : '';
+    const eventSource = new EventSource(`/api/recipes/generate/${query}`);
     
     // Store recipes globally for click handling
     window.recipes = [];
@@ -94,23 +126,55 @@ function setupRecipeStream() {
     if (groceryListLoading) groceryListLoading.style.display = 'block';
     if (groceryListEmpty) groceryListEmpty.style.display = 'none';
     
+    // The first grocery delta replaces any list left over from a previous plan
+    let groceryDeltaReceived = false;
+    
     eventSource.onmessage = function(event) {
         try {
             const data = JSON.parse(event.data);
             console.log('Received stream update:', data);
 
             switch (data.type) {
+                case 'protocol':
+                    if (data.v !== STREAM_PROTOCOL_VERSION) {
+                        // Deployed while this page was open; reload to get matching code
+                        eventSource.close();
+                        location.reload();
+                    }
+                    break;
+
                 case 'templates':
                     handleTemplatesUpdate(data, recipesContent, recipesLoading);
                     break;
                     
+                case 'patch':
+                    handleRecipePatches(data);
+                    break;
+
                 case 'updates':
                     handleRecipeUpdates(data);
                     break;
                     
+                case 'grocery_delta':
+                    if (!groceryDeltaReceived && groceryListContent) {
+                        groceryListContent.innerHTML = '';
+                        groceryDeltaReceived = true;
+                    }
+                    handleGroceryDelta(data, groceryListContent, groceryListLoading, groceryListEmpty);
+                    break;
+                    
                 case 'grocery_list':
                     handleGroceryListUpdate(data, groceryListContent, groceryListLoading, groceryListEmpty);
+                    break;
+                    
+                case 'complete':
+                    // Images can still arrive after the grocery list, so only close once the server is done
+                    eventSource.close();
+                    break;
+                    
+                case 'error':
                     eventSource.close();
+                    handleStreamError(data.error);
                     break;
             }
         } catch (error) {
@@ -120,9 +184,14 @@ function setupRecipeStream() {
     };
     
     eventSource.onerror = function(error) {
-        console.error('EventSource error:', error);
-        handleStreamError(error);
-        eventSource.close();
+        // The browser reconnects with Last-Event-ID and the server resumes the
+        // job from there, so only give up once the connection is closed for good
+        if (eventSource.readyState === EventSource.CLOSED) {
+            console.error('EventSource error:', error);
+            handleStreamError(error);
+        } else {
+            console.warn('EventSource connection lost, reconnecting');
+        }
     };
 }
 
@@ -144,6 +213,67 @@ function handleRecipeUpdates(data) {
         if (index !== -1) {
             window.recipes[index] = recipe;
             updateRecipe(recipe);
+        } else {
+            // Streamed plans announce each recipe as it arrives instead of sending templates
+            addRecipe(recipe);
+        }
+    });
+}
+
+// Fields that show on the recipe card; other fields only feed the modal
+const RECIPE_CARD_FIELDS = ['title', 'description', 'image_hash', 'image_variants', 'image_loading'];
+
+function handleRecipePatches(data) {
+    // Each patch carries only the fields that changed: {id, set: {field: value}}
+    data.recipes.forEach(patch => {
+        const recipe = window.recipes.find(r => r.id === patch.id);
+        if (!recipe) {
+            addRecipe({id: patch.id, ...patch.set});
+            return;
+        }
+        Object.assign(recipe, patch.set);
+        if (RECIPE_CARD_FIELDS.some(field => field in patch.set)) {
+            updateRecipe(recipe);
+        }
+    });
+}
+
+function addRecipe(recipe) {
+    console.log(`Adding recipe ${recipe.id}`);
+    const recipesContent = document.getElementById('recipesContent');
+    const recipesLoading = document.getElementById('recipesLoading');
+    if (window.recipes.length === 0 && recipesContent) recipesContent.innerHTML = '';
+    window.recipes.push(recipe);
+    if (recipesContent) {
+        recipesContent.style.display = 'block';
+        recipesContent.insertAdjacentHTML('beforeend', createRecipeTemplateHTML(recipe));
+    }
+    if (recipesLoading) recipesLoading.style.display = 'none';
+}
+
+function handleGroceryDelta(data, groceryListContent, groceryListLoading, groceryListEmpty) {
+    console.log('Received grocery delta:', data);
+    if (!groceryListContent) return;
+    groceryListContent.style.display = 'block';
+    if (groceryListLoading) groceryListLoading.style.display = 'none';
+    if (groceryListEmpty) groceryListEmpty.style.display = 'none';
+
+    const findItem = key => groceryListContent.querySelector(`[data-grocery-key="${CSS.escape(key)}"]`);
+
+    (data.removed || []).forEach(key => {
+        const element = findItem(key);
+        if (element) element.remove();
+    });
+    data.items.forEach(item => {
+        const template = document.createElement('template');
+        template.innerHTML = window.createGroceryItemHTML(item).trim();
+        const element = template.content.firstElementChild;
+        element.dataset.groceryKey = item.key;
+        const existing = findItem(item.key);
+        if (existing) {
+            existing.replaceWith(element);
+        } else {
+            groceryListContent.appendChild(element);
         }
     });
 }
@@ -203,8 +333,9 @@ function showRecipeModal(recipe) {
     const closeBtn = modal.querySelector('.close-modal-btn');
 
     // Set image and title
-    if (recipe.image) {
-        modalImage.src = `data:image/jpeg;base64,${recipe.image}`;
+    const imageSrc = recipeImageSrc(recipe);
+    if (imageSrc) {
+        modalImage.src = imageSrc;
         modalImage.alt = recipe.title;
         modalImage.style.display = 'block';
     } else {
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from app.models import GenerationEvent, GenerationJob, User
+from app.services.generation_job_service import GenerationJobService
+
+
+async def no_run(job, user):
+    pass
+
+
+# DBWriter writes from its own thread, so the jobs must be committed for it to see them
+@override_settings(GENERATION_JOB_STALE_AFTER=30, GENERATION_EVENT_POLL_INTERVAL=0.01)
+@mock.patch.object(GenerationJobService, '_run', no_run)
+class StartOrResumeTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='cook')
+        self.other = User.objects.create(username='other')
+
+    def tearDown(self):
+        GenerationJobService._runners.clear()
+        GenerationJobService._signals.clear()
+
+    def make_job(self, user=None, status=GenerationJob.STATUS_RUNNING, heartbeat_age=0, events=0):
+        job = GenerationJob.objects.create(
+            user=user or self.user,
+            status=status,
+            heartbeat_at=timezone.now() - timedelta(seconds=heartbeat_age)
+        )
+        for seq in range(1, events + 1):
+            GenerationEvent.objects.create(job=job, seq=seq, payload={'type': 'status'})
+        return job
+
+    def events(self, job):
+        return list(GenerationEvent.objects.filter(job=job).order_by('seq').values_list('payload', flat=True))
+
+    async def test_generate_starts_a_job(self):
+        job, after_seq = await GenerationJobService.start_or_resume(self.user)
+
+        self.assertEqual(after_seq, 0)
+        self.assertEqual(await GenerationJob.objects.filter(user=self.user).acount(), 1)
+        self.assertIn(str(job.id), GenerationJobService._runners)
+
+    async def test_generate_reuses_the_active_job(self):
+        active = await sync_to_async(self.make_job)(events=2)
+
+        job, after_seq = await GenerationJobService.start_or_resume(self.user)
+
+        self.assertEqual((job.id, after_seq), (active.id, 0))
+        self.assertEqual(await GenerationJob.objects.acount(), 1)
+
+    async def test_reconnect_replays_after_the_last_event(self):
+        finished = await sync_to_async(self.make_job)(status=GenerationJob.STATUS_COMPLETE, events=5)
+
+        job, after_seq = await GenerationJobService.start_or_resume(self.user, last_event_id=f"{finished.id}:3")
+
+        self.assertEqual((job.id, after_seq), (finished.id, 3))
+
+    async def test_resume_never_starts_a_job(self):
+        foreign = await sync_to_async(self.make_job)(user=self.other)
+
+        for kwargs in (
+            {'last_event_id': f"{foreign.id}:1"},
+            {'resume_job_id': str(foreign.id)},
+            {'resume_job_id': 'not-a-uuid'},
+            {'last_event_id': 'garbage'},
+        ):
+            self.assertEqual(await GenerationJobService.start_or_resume(self.user, **kwargs), (None, 0), kwargs)
+        self.assertEqual(await GenerationJob.objects.filter(user=self.user).acount(), 0)
+        self.assertEqual(GenerationJobService._runners, {})
+
+    async def test_stale_job_followed_by_id_ends_with_an_error(self):
+        stale = await sync_to_async(self.make_job)(heartbeat_age=60, events=2)
+
+        job, after_seq = await GenerationJobService.start_or_resume(self.user, resume_job_id=str(stale.id))
+
+        self.assertEqual((job.id, after_seq), (stale.id, 0))
+        await sync_to_async(stale.refresh_from_db)()
+        self.assertEqual(stale.status, GenerationJob.STATUS_FAILED)
+        events = await sync_to_async(self.events)(stale)
+        self.assertEqual(events[-1], {'type': 'error', 'error': "Generation was interrupted"})
+
+    async def test_stale_job_is_replaced_on_generate(self):
+        stale = await sync_to_async(self.make_job)(heartbeat_age=60)
+
+        job, _ = await GenerationJobService.start_or_resume(self.user)
+
+        self.assertNotEqual(job.id, stale.id)
+        await sync_to_async(stale.refresh_from_db)()
+        self.assertEqual(stale.status, GenerationJob.STATUS_FAILED)
+
+    async def test_subscriber_of_a_stale_job_gets_the_error(self):
+        stale = await sync_to_async(self.make_job)(heartbeat_age=60, events=1)
+
+        payloads = [event.payload async for event in GenerationJobService.subscribe(stale)]
+
+        self.assertEqual(payloads, [{'type': 'status'}, {'type': 'error', 'error': "Generation was interrupted"}])
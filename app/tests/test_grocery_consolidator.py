@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+from app.services.grocery_consolidator import (
+    GroceryConsolidator, canonical_name, normalize_unit, parse_quantity
+)
+
+
+class ParseQuantityTests(TestCase):
+    def test_mixed_numbers(self):
+        self.assertEqual(parse_quantity('1 1/2'), 1.5)
+        self.assertEqual(parse_quantity('1-1/2'), 1.5)
+        self.assertEqual(parse_quantity('2 - 1/4'), 2.25)
+        self.assertEqual(parse_quantity('1-½'), 1.5)
+
+    def test_ranges_resolve_to_upper_bound(self):
+        self.assertEqual(parse_quantity('2-3'), 3)
+        self.assertEqual(parse_quantity('2 to 3'), 3)
+        self.assertEqual(parse_quantity('1/2-3/4'), 0.75)
+
+    def test_free_text(self):
+        self.assertIsNone(parse_quantity('to taste'))
+
+
+class NormalizeUnitTests(TestCase):
+    def test_case_tells_teaspoons_from_tablespoons(self):
+        self.assertEqual(normalize_unit('t'), 'tsp')
+        self.assertEqual(normalize_unit('T'), 'tbsp')
+        self.assertEqual(normalize_unit('Tbsp.'), 'tbsp')
+        self.assertEqual(normalize_unit('TSP'), 'tsp')
+
+
+class CanonicalNameTests(TestCase):
+    def test_irregular_plurals(self):
+        self.assertEqual(canonical_name('bay leaves'), 'bay leaf')
+        self.assertEqual(canonical_name('red chilies'), 'red chili')
+        self.assertEqual(canonical_name('tomatoes'), 'tomato')
+        self.assertEqual(canonical_name('cherries'), 'cherry')
+
+    def test_plural_and_singular_merge(self):
+        items = GroceryConsolidator.consolidate([
+            {'ingredients': [{'name': 'bay leaf', 'quantity': '1', 'unit': ''}]},
+            {'ingredients': [{'name': 'bay leaves', 'quantity': '2', 'unit': ''}]},
+        ])
+        self.assertEqual(items, [{'name': 'Bay leaf', 'quantity': '3', 'unit': ''}])
+
+    def test_tablespoon_abbreviation_is_not_summed_as_teaspoons(self):
+        items = GroceryConsolidator.consolidate([
+            {'ingredients': [{'name': 'olive oil', 'quantity': '1', 'unit': 'T'}]},
+            {'ingredients': [{'name': 'olive oil', 'quantity': '1', 'unit': 'tbsp'}]},
+        ])
+        self.assertEqual(items, [{'name': 'Olive oil', 'quantity': '2', 'unit': 'tbsp'}])
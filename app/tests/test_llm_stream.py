@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from app.services.llm_cache import InMemoryCacheBackend, LLMResponseCache
+from app.services.llm_service import LLMService
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {'recipes': {'type': 'array', 'items': {'type': 'string'}}},
+}
+
+
+class CompletionStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LLMResponseCache(InMemoryCacheBackend())
+        self.chunks = []
+        self.streamed = 0
+        for name, value in (
+            ('_streaming_provider', lambda: SimpleNamespace(model='fake')),
+            ('_get_response_cache', lambda: self.cache),
+            ('_stream_completion', self.stream),
+        ):
+            patcher = mock.patch.object(LLMService, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def stream(self, *args):
+        self.streamed += 1
+        for chunk in self.chunks:
+            yield chunk
+
+    async def collect(self):
+        return [event async for event in LLMService.get_completion_stream('prompt', SCHEMA, tool_name='plan')]
+
+    async def test_partials_then_normalized_final(self):
+        # A JSON-mode model answering with the bare array
+        self.chunks = ['["so', 'up", "sal', 'ad"', ']']
+
+        events = await self.collect()
+
+        partials = [event['values'] for event in events if event['type'] == 'partial']
+        self.assertEqual(partials, [[((0,), 'soup')], [((1,), 'salad')], [((), ['soup', 'salad'])]])
+        self.assertEqual(events[-1], {'type': 'final', 'output': {'recipes': ['soup', 'salad']}})
+
+    async def test_cache_hit_yields_only_the_final(self):
+        self.chunks = ['{"recipes": ["soup"]}']
+        await self.collect()
+
+        events = await self.collect()
+
+        self.assertEqual(events, [{'type': 'final', 'output': {'recipes': ['soup']}}])
+        self.assertEqual(self.streamed, 1)
+
+    async def test_truncated_stream_fails_and_is_not_cached(self):
+        self.chunks = ['{"recipes": ["so']
+
+        with self.assertRaises(ValueError):
+            await self.collect()
+        self.chunks = ['{"recipes": ["soup"]}']
+        await self.collect()
+
+        self.assertEqual(self.streamed, 2)
@@ -0,0 +1,66 @@
+import json
+from unittest import TestCase
+
+from app.services.partial_json import IncrementalJSONParser
+
+DOCUMENT = json.dumps({
+    'templates': [
+        {'title': 'Café "Soup"', 'servings': 4, 'time': 12.5},
+        {'title': 'Back\\slash ☃', 'servings': -2, 'tags': [], 'vegan': True, 'note': None},
+    ],
+    'count': 1e3,
+})
+
+
+class IncrementalJSONParserTests(TestCase):
+    def feed_all(self, chunks):
+        parser = IncrementalJSONParser()
+        completed = []
+        for chunk in chunks:
+            completed.extend(parser.feed(chunk))
+        return parser, completed
+
+    def test_any_chunk_boundary_gives_the_same_document(self):
+        for size in (1, 2, 3, 7, len(DOCUMENT)):
+            chunks = [DOCUMENT[i:i + size] for i in range(0, len(DOCUMENT), size)]
+            parser, completed = self.feed_all(chunks)
+            self.assertTrue(parser.done, size)
+            self.assertEqual(parser.value, json.loads(DOCUMENT), size)
+            self.assertEqual(parser.text, DOCUMENT)
+            self.assertEqual(completed[-1], ((), json.loads(DOCUMENT)))
+
+    def test_values_complete_with_their_paths(self):
+        _, completed = self.feed_all([DOCUMENT])
+        paths = dict(completed)
+        self.assertEqual(paths[('templates', 0, 'title')], 'Café "Soup"')
+        self.assertEqual(paths[('templates', 1, 'servings')], -2)
+        self.assertEqual(paths[('templates', 1, 'tags')], [])
+        self.assertEqual(paths[('templates', 0)]['time'], 12.5)
+        self.assertEqual(paths[('count',)], 1000.0)
+
+    def test_strings_split_inside_escapes(self):
+        parser = IncrementalJSONParser()
+        self.assertEqual(parser.feed('["a\\'), [])
+        self.assertEqual(parser.feed('"b\\u26'), [])
+        self.assertEqual(parser.feed('03\\\\", "x'), [((0,), 'a"b☃\\')])
+        self.assertEqual(parser.feed('"]'), [((1,), 'x'), ((), ['a"b☃\\', 'x'])])
+
+    def test_keys_are_not_reported_as_values(self):
+        parser = IncrementalJSONParser()
+        self.assertEqual(parser.feed('{"title": "a", "ti'), [(('title',), 'a')])
+        self.assertEqual(parser.feed('me"'), [])
+        self.assertEqual(parser.value, {'title': 'a'})
+
+    def test_numbers_split_across_chunks(self):
+        parser = IncrementalJSONParser()
+        self.assertEqual(parser.feed('[1'), [])
+        self.assertEqual(parser.feed('2'), [])
+        self.assertEqual(parser.feed('.5e'), [])
+        self.assertEqual(parser.feed('1, tr'), [((0,), 125.0)])
+        self.assertEqual(parser.feed('ue]'), [((1,), True), ((), [125.0, True])])
+
+    def test_partial_value_fills_in_open_containers(self):
+        parser = IncrementalJSONParser()
+        parser.feed('{"templates": [{"title": "a"}, {"title": "b", "servings": 2')
+        self.assertFalse(parser.done)
+        self.assertEqual(parser.value, {'templates': [{'title': 'a'}, {'title': 'b'}]})
@@ -0,0 +1,131 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from app.services.pipeline import PipelineScheduler, StageTimeoutError
+
+
+class PipelineSchedulerTests(IsolatedAsyncioTestCase):
+    async def collect(self, scheduler):
+        return [completed async for batch in scheduler.run() for completed in batch]
+
+    async def test_stages_start_after_their_dependencies(self):
+        order = []
+        scheduler = PipelineScheduler()
+
+        def stage(name, delay=0):
+            async def run():
+                await asyncio.sleep(delay)
+                order.append(name)
+                return name.upper()
+            return run
+
+        scheduler.add('plan', stage('plan', 0.02))
+        scheduler.add('details', stage('details'), depends_on=['plan'])
+        scheduler.add('image', stage('image'), depends_on=['plan'])
+        scheduler.add('save', stage('save'), depends_on=['details', 'image'])
+
+        results = await self.collect(scheduler)
+
+        self.assertEqual(order[0], 'plan')
+        self.assertEqual(set(order[1:3]), {'details', 'image'})
+        self.assertEqual(order[3], 'save')
+        self.assertEqual({name: result for name, result, _ in results}['save'], 'SAVE')
+
+    async def test_dependents_run_after_a_failed_stage(self):
+        scheduler = PipelineScheduler()
+
+        async def fail():
+            raise ValueError('no plan')
+
+        async def fallback():
+            return 'fallback'
+
+        scheduler.add('plan', fail)
+        scheduler.add('save', fallback, depends_on=['plan'])
+
+        results = {name: (result, error) for name, result, error in await self.collect(scheduler)}
+
+        self.assertIsInstance(results['plan'][1], ValueError)
+        self.assertEqual(results['save'], ('fallback', None))
+
+    async def test_stage_timeout_only_fails_that_stage(self):
+        scheduler = PipelineScheduler()
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        async def fast():
+            return 'ok'
+
+        scheduler.add('slow', slow, timeout=0.01)
+        scheduler.add('fast', fast)
+
+        results = {name: (result, error) for name, result, error in await self.collect(scheduler)}
+
+        self.assertIsInstance(results['slow'][1], StageTimeoutError)
+        self.assertEqual(results['fast'], ('ok', None))
+
+    async def test_stages_added_mid_run_start_right_away(self):
+        scheduler = PipelineScheduler()
+        started = asyncio.Event()
+
+        async def templates():
+            return ['a', 'b']
+
+        async def waiting():
+            await started.wait()
+            return 'waited'
+
+        def recipe(title):
+            async def run():
+                started.set()
+                return title
+            return run
+
+        scheduler.add('templates', templates)
+        scheduler.add('waiting', waiting)
+        seen = []
+        async for batch in scheduler.run():
+            for name, result, _ in batch:
+                seen.append(name)
+                if name == 'templates':
+                    for title in result:
+                        scheduler.add(('recipe', title), recipe(title), depends_on=['templates'])
+                    # Not blocked on 'waiting', which only ends once a recipe has started
+                    scheduler.add('late', recipe('late'))
+
+        self.assertEqual(seen[0], 'templates')
+        self.assertEqual(set(seen[1:]), {('recipe', 'a'), ('recipe', 'b'), 'late', 'waiting'})
+
+    async def test_duplicate_stage_names_are_rejected(self):
+        scheduler = PipelineScheduler()
+        scheduler.add('plan', asyncio.sleep)
+        with self.assertRaises(ValueError):
+            scheduler.add('plan', asyncio.sleep)
+
+    async def test_stopping_early_cancels_outstanding_stages(self):
+        scheduler = PipelineScheduler()
+        cancelled = []
+
+        async def quick():
+            return 'done'
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append('slow')
+                raise
+
+        scheduler.add('quick', quick)
+        scheduler.add('slow', slow)
+        scheduler.add('after', quick, depends_on=['quick'])
+
+        run = scheduler.run()
+        async for batch in run:
+            self.assertEqual([name for name, _, _ in batch], ['quick'])
+            break
+        await run.aclose()
+
+        self.assertEqual(cancelled, ['slow'])
+        self.assertEqual(await scheduler.cancel(), 0)
@@ -7,6 +7,8 @@ urlpatterns = [
     # Redirect root to recipe page
     path('', RedirectView.as_view(url='/recipes/', permanent=False), name='index'),
     path('recipes/', views.recipe_page, name='recipe_page'),
+    path('images/<str:image_hash>/', views.recipe_image, name='recipe_image'),
+    path('metrics', views.metrics, name='metrics'),
     
     # Auth endpoints
     path('guest-login/', views.guest_login, name='guest_login'),
@@ -16,5 +18,7 @@ urlpatterns = [
     path('api/grocery-list/', api_views.get_grocery_list, name='get_grocery_list'),
     path('api/grocery-item/<int:item_id>/', api_views.get_grocery_item_details, name='get_grocery_item_details'),
     path('api/grocery-item/<int:item_id>/remove/', api_views.remove_grocery_item, name='remove_grocery_item'),
+    path('api/plans/', api_views.list_recipe_plans, name='list_recipe_plans'),
+    path('api/plans/<int:plan_id>/restore/', api_views.restore_recipe_plan, name='restore_recipe_plan'),
     path('preferences-modal/', views.preferences_modal, name='preferences_modal'),
 ]
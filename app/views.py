@@ -2,66 +2,114 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from app.services.auth_service import AuthService
 from django.template.loader import render_to_string
-from django.http import HttpResponse
-from app.models import UserCurrentRecipes, UserGroceryList
-import logging
+from django.http import HttpResponse, HttpResponseNotModified, FileResponse, Http404
+from django.views.decorators.http import require_safe
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db.models import F, Func, IntegerField, Max
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.safestring import mark_safe
+from app.models import UserCurrentRecipes, GenerationJob, GroceryItem
+from app.services.grocery_service import GroceryService
+from app.services.fragment_cache import FragmentCache
+from app.services.image_store import ImageStore
+from app.services.metrics import Metrics
+from app.log import Payload, log_fields
+from app.conditional import Validators, conditional, latest, make_etag
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 import json
+import logging
+import functools
 
 logger = logging.getLogger(__name__)
 
+# What django.utils.html.json_script escapes, so data can't close the <script>
+JSON_SCRIPT_ESCAPES = {ord('<'): '\\u003C', ord('>'): '\\u003E', ord('&'): '\\u0026'}
+
 def landing(request):
     if request.user.is_authenticated:
         return redirect('recipe_page')
     return render(request, "landing.html")
 
+def recipe_page_validators(request) -> Validators:
+    """
+    The page changes when the plan is saved (recipes or grocery list) or a
+    generation job changes, so it is validated from their timestamps
+    without loading the recipes. Static asset names change with a deploy.
+    """
+    plan_updated_at = UserCurrentRecipes.objects.filter(
+        user=request.user
+    ).values_list('updated_at', flat=True).first()
+    if plan_updated_at is None:
+        return None, None
+    job_updated_at = GenerationJob.objects.filter(
+        user=request.user
+    ).aggregate(latest=Max('updated_at'))['latest']
+    return (
+        make_etag(request.user.id, plan_updated_at, job_updated_at, getattr(staticfiles_storage, 'manifest_hash', '')),
+        latest(plan_updated_at, job_updated_at)
+    )
+
 @login_required(login_url='account_login')
+@conditional(recipe_page_validators)
 def recipe_page(request):
-    logger.info(f"Loading recipe page for user: {request.user.id} ({request.user.username})")
-    
-    # Get user's current recipes
-    recipes = UserCurrentRecipes.objects.filter(user=request.user).first()
-    logger.info(f"Found UserCurrentRecipes record: {recipes is not None}")
-    if recipes:
-        logger.info(f"Recipe count: {len(recipes.recipes) if recipes.recipes else 0}")
-        logger.info(f"Recipe data: {json.dumps(recipes.recipes, indent=2)}")
-        
-        # Log recipe details for debugging
-        if recipes.recipes:
-            for recipe in recipes.recipes:
-                logger.info(f"Recipe {recipe.get('id')}: {recipe.get('title')}")
-                logger.info(f"  - Ingredients: {len(recipe.get('ingredients', []))} items")
-                logger.info(f"  - Instructions: {len(recipe.get('instructions', []))} steps")
-                logger.info(f"  - Has image: {bool(recipe.get('image'))}")
-    else:
-        logger.warning("No recipes found for user")
-    
-    # Get user's grocery list
-    grocery_list = UserGroceryList.objects.filter(user=request.user).first()
-    logger.info(f"Found UserGroceryList record: {grocery_list is not None}")
-    if grocery_list:
-        logger.info(f"Grocery item count: {len(grocery_list.items) if grocery_list.items else 0}")
-        logger.info(f"Grocery list data: {json.dumps(grocery_list.items, indent=2)}")
-        
-        # Log grocery list details for debugging
-        if grocery_list.items:
-            for item in grocery_list.items:
-                logger.info(f"Grocery item: {item.get('name')} - {item.get('quantity')} {item.get('unit')}")
-    else:
-        logger.warning("No grocery list found for user")
-    
-    # Prepare context
+    # Read before the data the fragments are rendered from: if a save lands in
+    # between, what's rendered here is cached under the old version, not the new
+    fragment_version = FragmentCache.version(request.user.id)
+    plan = UserCurrentRecipes.objects.filter(user=request.user).annotate(
+        recipe_count=Func(F('recipes'), function='JSON_ARRAY_LENGTH', output_field=IntegerField())
+    ).values('updated_at', 'recipe_count').first()
+    recipe_count = (plan and plan['recipe_count']) or 0
+    grocery_count = GroceryItem.objects.filter(user=request.user).count()
+
+    # The fragments and the recipes JSON are cached, so their data is only
+    # loaded when one of them is rendered
+    @functools.cache
+    def load_recipes():
+        return UserCurrentRecipes.objects.filter(user=request.user).values_list('recipes', flat=True).first() or []
+
+    @functools.cache
+    def load_grocery_list():
+        return GroceryService.get_items(request.user)
+
+    def recipes_json():
+        return mark_safe(json.dumps(load_recipes(), cls=DjangoJSONEncoder).translate(JSON_SCRIPT_ESCAPES))
+
     context = {
-        'has_recipes': bool(recipes and recipes.recipes),
-        'has_grocery_list': bool(grocery_list and grocery_list.items),
-        'recipes': recipes.recipes if recipes else [],
-        'grocery_list': grocery_list.items if grocery_list else [],
+        # Followed by id, so a job that ends before the page connects is replayed, not restarted
+        'active_job_id': GenerationJob.objects.filter(
+            user=request.user,
+            status__in=GenerationJob.ACTIVE_STATUSES
+        ).order_by('-created_at').values_list('id', flat=True).first(),
+        'has_recipes': recipe_count > 0,
+        'has_grocery_list': grocery_count > 0,
+        # Called by the template only on a fragment cache miss
+        'recipes': load_recipes,
+        'grocery_list': load_grocery_list,
+        'recipes_json': recipes_json,
+        # Keys of the cached grocery list and recipe card fragments
+        'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'fragment_version': fragment_version,
+        'recipes_updated_at': plan['updated_at'] if plan else None,
     }
-    
-    logger.info(f"Context prepared: has_recipes={context['has_recipes']}, has_grocery_list={context['has_grocery_list']}")
-    logger.info(f"Sending recipes count: {len(context['recipes'])}")
-    logger.info(f"Sending grocery items count: {len(context['grocery_list'])}")
-    
-    return render(request, "recipe_page.html", context)
+
+    logger.info("Loaded recipe page", extra=log_fields(
+        user=request.user.id,
+        recipes=recipe_count,
+        grocery_items=grocery_count,
+        active_job=context['active_job_id'] is not None
+    ))
+    response = render(request, "recipe_page.html", context)
+
+    if load_recipes.cache_info().currsize or load_grocery_list.cache_info().currsize:
+        # Only when a fragment was rendered anyway; serialized by the log
+        # writer, and only for a sample of page loads
+        logger.debug("Recipe page data", extra=log_fields(
+            user=request.user.id,
+            recipes=Payload(load_recipes()),
+            grocery_list=Payload(load_grocery_list())
+        ))
+    return response
 
 def guest_login(request):
     guest_user, email, password = AuthService.create_guest_user()
@@ -73,6 +121,42 @@ def guest_login(request):
     guest_user.delete()
     return redirect('landing')
 
+@require_safe
+def recipe_image(request, image_hash):
+    """Serve a stored recipe image. Content never changes for a given hash."""
+    if not ImageStore.exists(image_hash):
+        raise Http404("Image not found")
+
+    etag = f'"{image_hash}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'public, max-age=31536000, immutable',
+    }
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        response = HttpResponseNotModified()
+    else:
+        image_file = open(ImageStore.path_for(image_hash), 'rb')
+        content_type = ImageStore.content_type(image_file.read(12))
+        image_file.seek(0)
+        response = FileResponse(image_file, content_type=content_type)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+@require_safe
+def metrics(request):
+    """
+    Prometheus text metrics for all workers on this host. Requires the
+    METRICS_TOKEN bearer token when set; without one, only served in DEBUG.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token and not settings.DEBUG:
+        raise Http404("Metrics are disabled without METRICS_TOKEN")
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    return HttpResponse(Metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def preferences_modal(request):
     html = render_to_string('preferences_modal.html')
     return HttpResponse(html)
@@ -0,0 +1 @@
+"""Micro-benchmark suite for worker CPU hot paths, see run.py."""
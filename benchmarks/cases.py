@@ -0,0 +1,212 @@
+"""
+Benchmark cases. Each case is a setup function registered with @benchmark
+that returns the zero-argument callable to time, so fixtures are built
+once and only the hot path is measured.
+"""
+import io
+import json
+import base64
+import random
+from typing import Callable, Dict, List
+from PIL import Image, ImageDraw, ImageFilter
+
+CASES: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def sample_image(size: int = 256, seed: int = 0) -> str:
+    """
+    A base64 JPEG shaped like a generated food photo: smooth shapes and
+    gradients with some grain, not noise (too slow) or a flat colour (too fast).
+    """
+    rng = random.Random(seed)
+    img = Image.new('RGB', (size, size))
+    draw = ImageDraw.Draw(img)
+    for y in range(size):
+        draw.line([(0, y), (size, y)], fill=(200 - y // 3, 150 - y // 4, 110 + y // 5))
+    for _ in range(40):
+        x, y, r = rng.randrange(size), rng.randrange(size), rng.randrange(8, size // 4)
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=tuple(rng.randrange(40, 240) for _ in range(3)))
+    img = img.filter(ImageFilter.GaussianBlur(2))
+    grain = Image.effect_noise((size, size), 12).convert('RGB')
+    img = Image.blend(img, grain, 0.08)
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=90)
+    return base64.b64encode(output.getvalue()).decode()
+
+
+def sample_recipes(count: int = 7, inline_images: bool = False) -> List[dict]:
+    """A full week of recipes as UserCurrentRecipes stores them."""
+    rng = random.Random(1)
+    words = "roasted garlic lemon chicken thyme tomato basil salmon ginger rice bean stew herb".split()
+    image = sample_image() if inline_images else None
+    recipes = []
+    for i in range(count):
+        recipe = {
+            'id': i + 1,
+            'title': ' '.join(rng.choice(words) for _ in range(4)).title(),
+            'description': ' '.join(rng.choice(words) for _ in range(14)).capitalize() + '.',
+            'visual_description': ' '.join(rng.choice(words) for _ in range(30)).capitalize() + '.',
+            'ingredients': [
+                {'name': ' '.join(rng.choice(words) for _ in range(2)), 'quantity': str(rng.randint(1, 4)),
+                 'unit': rng.choice(['cup', 'tbsp', 'tsp', 'g', 'piece'])}
+                for _ in range(12)
+            ],
+            'instructions': [' '.join(rng.choice(words) for _ in range(18)).capitalize() + '.' for _ in range(8)],
+        }
+        if inline_images:
+            recipe['image'] = image
+        else:
+            recipe['image_hash'] = f"{rng.getrandbits(256):064x}"
+            recipe['image_variants'] = {'webp': f"{rng.getrandbits(256):064x}",
+                                        'thumbnail': f"{rng.getrandbits(256):064x}"}
+        recipes.append(recipe)
+    return recipes
+
+
+def sample_grocery_list(count: int = 45) -> List[dict]:
+    rng = random.Random(2)
+    categories = ['Produce', 'Meat & Seafood', 'Dairy', 'Pantry', 'Spices']
+    return [
+        {'id': i + 1, 'name': f"item {i}", 'quantity': str(rng.randint(1, 5)),
+         'unit': rng.choice(['cup', 'g', 'piece']), 'category': rng.choice(categories)}
+        for i in range(count)
+    ]
+
+
+@benchmark('image.process_variants')
+def image_process_variants():
+    from app.services.image_pipeline import process_image
+    image = sample_image()
+    return lambda: process_image(image)
+
+
+def _generation_frames():
+    """
+    The patch payloads of a staged generation, built by RecipePatcher from
+    the same updates the job makes: every recipe's details, then one image.
+    """
+    from app.services.sse_protocol import RecipePatcher
+    recipes = sample_recipes()
+    sent = [
+        {**{key: recipe[key] for key in ('id', 'title', 'description', 'visual_description')},
+         'image_hash': None, 'image_variants': {}, 'image_loading': True, 'ingredients': [], 'instructions': []}
+        for recipe in recipes
+    ]
+    patcher = RecipePatcher()
+    patcher.mark_sent(sent)
+    details = patcher.patches([
+        {**current, 'ingredients': recipe['ingredients'], 'instructions': recipe['instructions']}
+        for current, recipe in zip(sent, recipes)
+    ])
+    image = patcher.patches([{
+        **sent[0], 'ingredients': recipes[0]['ingredients'], 'instructions': recipes[0]['instructions'],
+        'image_hash': recipes[0]['image_hash'], 'image_variants': recipes[0]['image_variants'], 'image_loading': False
+    }])
+    return sent, details, image
+
+
+@benchmark('sse.templates_frame')
+def sse_templates_frame():
+    from app.services.sse_protocol import encode_event
+    sent, _, _ = _generation_frames()
+    payload = {'type': 'templates', 'recipes': sent}
+    return lambda: encode_event(payload, 'job:1')
+
+
+@benchmark('sse.patch_frame_details')
+def sse_patch_frame_details():
+    # A batch carrying every recipe's ingredients and instructions
+    from app.services.sse_protocol import encode_event
+    _, details, _ = _generation_frames()
+    payload = {'type': 'patch', 'recipes': details}
+    return lambda: encode_event(payload, 'job:2')
+
+
+@benchmark('sse.patch_frame_image')
+def sse_patch_frame_image():
+    # The most common frame: one recipe's image hashes
+    from app.services.sse_protocol import encode_event
+    _, _, image = _generation_frames()
+    payload = {'type': 'patch', 'recipes': image}
+    return lambda: encode_event(payload, 'job:3')
+
+
+@benchmark('sse.recipe_patches')
+def sse_recipe_patches():
+    # Diffing a batch against what the client was sent, then encoding it
+    from app.services.sse_protocol import RecipePatcher, encode_event
+    sent, _, _ = _generation_frames()
+    updated = [{**recipe, 'image_loading': False, 'image_hash': f"{recipe['id']:064x}"} for recipe in sent]
+
+    def run():
+        patcher = RecipePatcher()
+        patcher.mark_sent(sent)
+        return encode_event({'type': 'patch', 'recipes': patcher.patches(updated)}, 'job:4')
+    return run
+
+
+def _scratch_user(username: str):
+    from app.models import User
+    user, _ = User.objects.get_or_create(username=username, defaults={'email': f"{username}@bench.local"})
+    return user
+
+
+@benchmark('db.current_recipes_load')
+def current_recipes_load():
+    from app.models import UserCurrentRecipes
+    user = _scratch_user('bench-load')
+    UserCurrentRecipes.objects.update_or_create(user=user, defaults={'recipes': sample_recipes()})
+    return lambda: UserCurrentRecipes.objects.get(user=user).recipes
+
+
+@benchmark('db.current_recipes_save')
+def current_recipes_save():
+    from app.models import UserCurrentRecipes
+    user = _scratch_user('bench-save')
+    current, _ = UserCurrentRecipes.objects.update_or_create(user=user, defaults={'recipes': []})
+    recipes = sample_recipes()
+
+    def save():
+        current.recipes = recipes
+        current.save()
+    return save
+
+
+def _request(path: str, username: str):
+    from django.test import RequestFactory
+    request = RequestFactory().get(path)
+    request.user = _scratch_user(username)
+    return request
+
+
+@benchmark('render.recipe_page')
+def render_recipe_page():
+    from django.template.loader import render_to_string
+    request = _request('/recipes/', 'bench-render')
+    recipes = sample_recipes()
+    context = {
+        'active_job_id': None,
+        'has_recipes': True,
+        'has_grocery_list': True,
+        'recipes': recipes,
+        'grocery_list': sample_grocery_list(),
+        'recipes_json': json.dumps(recipes),
+        'fragment_cache_timeout': 60,
+        'fragment_version': 1,
+        'recipes_updated_at': None,
+    }
+    return lambda: render_to_string('recipe_page.html', context, request=request)
+
+
+@benchmark('render.grocery_list_expanded')
+def render_grocery_list_expanded():
+    from django.template.loader import render_to_string
+    context = {'grocery_items': sorted(sample_grocery_list(), key=lambda item: item['category'])}
+    return lambda: render_to_string('grocery_list_expanded.html', context)
@@ -0,0 +1,163 @@
+"""
+Micro-benchmarks of the CPU hot paths in a worker: image decode/encode,
+SSE frame serialization, UserCurrentRecipes load/save and page rendering.
+
+    python -m benchmarks.run                       # all cases
+    python -m benchmarks.run -k image -k render    # cases whose name contains a filter
+    python -m benchmarks.run --compare benchmarks/results/<earlier>.json
+
+Every run writes its results to benchmarks/results/ (or --output) as JSON,
+with the commit and machine it ran on, so runs can be compared over time.
+Database cases run against a scratch SQLite file.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def _setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'groc.settings')
+    scratch = tempfile.mkdtemp(prefix='grokery-bench-')
+    os.environ['DATABASE_PATH'] = os.path.join(scratch, 'db.sqlite3')
+    os.environ['CACHE_DIR'] = os.path.join(scratch, 'cache')
+    # Render cases time rendering, not fragment cache hits
+    os.environ['FRAGMENT_CACHE_BACKEND'] = 'django.core.cache.backends.dummy.DummyCache'
+    sys.path.insert(0, ROOT)
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0, interactive=False)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment() -> Dict[str, Any]:
+    import django
+    import PIL
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'django': django.get_version(),
+        'pillow': PIL.__version__,
+    }
+
+
+def measure(func: Callable[[], object], rounds: int, min_time: float) -> Dict[str, Any]:
+    """
+    Time func like timeit: pick a loop count that takes at least min_time,
+    then run that many loops per round and report per-call seconds.
+    """
+    func()  # warm up caches, template loaders, lazy imports
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        times.append((time.perf_counter() - start) / loops)
+    return {
+        'loops': loops,
+        'rounds': rounds,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def _format_time(seconds: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def print_results(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None):
+    print(f"{'benchmark':<36} {'median':>10} {'min':>10} {'stdev':>10}" + (f" {'vs base':>9}" if baseline else ''))
+    for name, result in results.items():
+        line = (f"{name:<36} {_format_time(result['median']):>10} {_format_time(result['min']):>10} "
+                f"{_format_time(result['stdev']):>10}")
+        if baseline:
+            base = baseline.get(name)
+            line += f" {result['median'] / base['median']:>8.2f}x" if base else f" {'new':>9}"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run the micro-benchmark suite.")
+    parser.add_argument('-k', dest='filters', action='append', default=[], help="only cases containing this")
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds per round, sets the loop count")
+    parser.add_argument('--output', help="results file, by default benchmarks/results/<time>-<commit>.json")
+    parser.add_argument('--compare', help="earlier results file to compare medians with")
+    parser.add_argument('--list', action='store_true', help="list the cases and exit")
+    args = parser.parse_args(argv)
+
+    _setup_django()
+    from .cases import CASES
+
+    names = [name for name in CASES if not args.filters or any(f in name for f in args.filters)]
+    if args.list:
+        print('\n'.join(names))
+        return
+
+    results = {}
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        results[name] = measure(CASES[name](), args.rounds, args.min_time)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    environment = _environment()
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{environment['commit'] or 'unknown'}.json")
+    with open(output, 'w') as f:
+        json.dump({
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'environment': environment,
+            'settings': {'rounds': args.rounds, 'min_time': args.min_time},
+            'results': results,
+        }, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,5 +18,8 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "groc.settings")
 # is populated before importing code that may import ORM models.
 django_asgi_app = get_asgi_application()
 
-# Wrap the Django application with the static files handler
-application = ASGIStaticFilesHandler(django_asgi_app)
+from app.lifespan import LifespanMiddleware
+
+# Wrap the Django application with the static files handler, and handle
+# lifespan events to open and close per-worker resources
+application = LifespanMiddleware(ASGIStaticFilesHandler(django_asgi_app))
@@ -13,4 +13,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "grokery.settings")
 
-application = get_asgi_application()
+django_asgi_app = get_asgi_application()
+
+from app.lifespan import LifespanMiddleware
+
+application = LifespanMiddleware(django_asgi_app)
@@ -85,12 +85,63 @@ WSGI_APPLICATION = "grokery.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite set up for several workers sharing one file: WAL lets reads run alongside
+# the writer, and writers wait up to SQLITE_BUSY_TIMEOUT for the lock instead of
+# failing with "database is locked". IMMEDIATE transactions take the write lock
+# up front, so a transaction can't fail halfway when upgrading a read lock.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "20"))  # seconds
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))  # bytes
+
+# Kept out of the tracked db.sqlite3, which the PRAGMAs below would switch to WAL
+DATABASE_PATH = os.getenv("DATABASE_PATH", str(BASE_DIR / "data" / "db.sqlite3"))
+os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": DATABASE_PATH,
+        # ASGI requests each run in their own thread, so connections can't outlive
+        # a request there (Django's advice is 0); the write queue thread
+        # (app.services.db_writer) keeps its own connection for the worker's lifetime
+        "CONN_MAX_AGE": int(os.getenv("DATABASE_CONN_MAX_AGE", "0")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": SQLITE_BUSY_TIMEOUT,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": (
+                f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE};"
+                "PRAGMA synchronous=NORMAL;"
+                f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)};"
+                "PRAGMA temp_store=MEMORY;"
+                f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB};"
+                f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}"
+            ),
+        },
     }
 }
+# Writes committed together by the write queue when they pile up
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "50"))
+
+# Caches shared by all workers on this host, as files, so no cache server is needed.
+# Rendered page fragments get their own directory so they can't crowd out the rest.
+CACHE_DIR = os.getenv("CACHE_DIR", str(BASE_DIR / "cache"))
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv("FRAGMENT_CACHE_TIMEOUT", str(24 * 60 * 60)))  # seconds
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(CACHE_DIR, "default"),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "10000"))},
+    },
+    # Used by {% cache %} and FragmentCache; FRAGMENT_CACHE_BACKEND=django.core.cache.backends.dummy.DummyCache turns it off
+    "template_fragments": {
+        "BACKEND": os.getenv("FRAGMENT_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.path.join(CACHE_DIR, "fragments"),
+        "TIMEOUT": FRAGMENT_CACHE_TIMEOUT,
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("FRAGMENT_CACHE_MAX_ENTRIES", "10000"))},
+    },
+}
 
 
 # Password validation
@@ -197,30 +248,169 @@ ACCOUNT_USERNAME_MIN_LENGTH = 3
 SOCIALACCOUNT_AUTO_SIGNUP = True
 SOCIALACCOUNT_LOGIN_ON_GET = True
 
+# Content-addressed recipe image store
+IMAGE_STORE_ROOT = os.getenv("IMAGE_STORE_ROOT", str(BASE_DIR / "media" / "images"))
+
+# Image optimization process pool
+IMAGE_PIPELINE_WORKERS = int(os.getenv("IMAGE_PIPELINE_WORKERS", "2"))
+IMAGE_PIPELINE_MAX_CONCURRENCY = int(os.getenv("IMAGE_PIPELINE_MAX_CONCURRENCY", "4"))
+IMAGE_PIPELINE_AVIF = os.getenv("IMAGE_PIPELINE_AVIF", "False") == "True"  # only used if Pillow supports AVIF
+
+# Generated image cache, shared across users
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Past recipe plans kept per user; recipes are stored once however many plans share them
+PLAN_HISTORY_LIMIT = int(os.getenv("PLAN_HISTORY_LIMIT", "20"))
+
+# Outbound HTTP connection pool (per worker)
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_POOL_MAX_PER_HOST = int(os.getenv("HTTP_POOL_MAX_PER_HOST", "20"))
+HTTP_POOL_KEEPALIVE = int(os.getenv("HTTP_POOL_KEEPALIVE", "30"))  # seconds
+HTTP_POOL_DNS_TTL = int(os.getenv("HTTP_POOL_DNS_TTL", "300"))  # seconds
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))  # seconds
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))  # seconds
+
+# Grocery list consolidation: "local" merges ingredients in-process, "llm" asks the model
+GROCERY_LIST_ENGINE = os.getenv("GROCERY_LIST_ENGINE", "local")
+GROCERY_LIST_LLM_FALLBACK = os.getenv("GROCERY_LIST_LLM_FALLBACK", "True") == "True"
+
+# Per-stage timeouts for the recipe generation pipeline, in seconds
+GENERATION_STAGE_TIMEOUTS = {
+    "templates": float(os.getenv("GENERATION_TEMPLATES_TIMEOUT", "60")),
+    "details": float(os.getenv("GENERATION_DETAILS_TIMEOUT", "60")),
+    "image": float(os.getenv("GENERATION_IMAGE_TIMEOUT", "60")),
+    "grocery_list": float(os.getenv("GENERATION_GROCERY_LIST_TIMEOUT", "60")),
+    "persist": float(os.getenv("GENERATION_PERSIST_TIMEOUT", "30")),
+    "plan": float(os.getenv("GENERATION_PLAN_TIMEOUT", "180")),  # single-call mode
+}
+
+# "staged": templates, then one details call per recipe. "single_call": one streamed call for the whole plan
+GENERATION_MODE = os.getenv("GENERATION_MODE", "staged")
+
+# Background generation jobs, in seconds
+GENERATION_JOB_HEARTBEAT = float(os.getenv("GENERATION_JOB_HEARTBEAT", "5"))
+GENERATION_JOB_STALE_AFTER = float(os.getenv("GENERATION_JOB_STALE_AFTER", "30"))  # job is dead without a heartbeat
+GENERATION_JOB_ORPHAN_TIMEOUT = float(os.getenv("GENERATION_JOB_ORPHAN_TIMEOUT", "60"))  # cancel when nobody listens
+GENERATION_EVENT_POLL_INTERVAL = float(os.getenv("GENERATION_EVENT_POLL_INTERVAL", "0.5"))
+GENERATION_JOB_RETENTION = float(os.getenv("GENERATION_JOB_RETENTION", str(24 * 3600)))  # finished jobs and their events are deleted after this
+
+# LLM models in preference order; models without an API key (or SDK) are skipped
+LLM_MODELS = [m.strip() for m in os.getenv("LLM_MODELS", "claude-3-5-haiku-20241022,gpt-4o-mini,gemini-1.5-flash").split(",") if m.strip()]
+# Race the next model when the primary is slower than its recent p90
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "True") == "True"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.9"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))  # seconds
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "10"))  # until there are enough samples
+# Prompt token budgets, counted locally; over budget the prompt is compacted or the call refused
+LLM_PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "4000"))
+LLM_PROMPT_TOKEN_BUDGETS = {
+    "generate_grocery_list": int(os.getenv("LLM_GROCERY_LIST_PROMPT_TOKEN_BUDGET", "3000")),
+}
+
+# LLM response cache
+# Backend is "memory" (per worker), "sqlite" (shared by all workers on the host) or "off"
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", str(BASE_DIR / "llm_cache.sqlite3"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))  # seconds
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+
+# Provider rate limits, shared by all workers on the host through a SQLite file
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", str(BASE_DIR / "rate_limits.sqlite3"))
+RATE_LIMITS = {
+    "openai": {
+        "requests_per_minute": float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500")),
+        "burst": float(os.getenv("OPENAI_BURST", "20")),
+        "max_concurrency": int(os.getenv("OPENAI_MAX_CONCURRENCY", "10")),  # per worker
+    },
+    "anthropic": {
+        "requests_per_minute": float(os.getenv("ANTHROPIC_REQUESTS_PER_MINUTE", "50")),
+        "burst": float(os.getenv("ANTHROPIC_BURST", "10")),
+        "max_concurrency": int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", "10")),
+    },
+    "getimg": {
+        "requests_per_minute": float(os.getenv("GETIMG_REQUESTS_PER_MINUTE", "60")),
+        "burst": float(os.getenv("GETIMG_BURST", "10")),
+        "max_concurrency": int(os.getenv("GETIMG_MAX_CONCURRENCY", "5")),
+    },
+    "google": {
+        "requests_per_minute": float(os.getenv("GOOGLE_REQUESTS_PER_MINUTE", "60")),
+        "burst": float(os.getenv("GOOGLE_BURST", "10")),
+        "max_concurrency": int(os.getenv("GOOGLE_MAX_CONCURRENCY", "10")),
+    },
+}
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "4"))
+RATE_LIMIT_BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "0.5"))  # seconds, doubled per retry
+RATE_LIMIT_BACKOFF_MAX = float(os.getenv("RATE_LIMIT_BACKOFF_MAX", "30"))
+RATE_LIMIT_RETRY_BUDGET = float(os.getenv("RATE_LIMIT_RETRY_BUDGET", "0.2"))  # retries per request
+
+# Provider endpoints, e.g. to point at the local stand-ins in loadtest/; None is the SDK default
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL") or None
+GETIMG_API_URL = os.getenv("GETIMG_API_URL", "https://api.getimg.ai/v1/flux-schnell/text-to-image")
+
+# Metrics, each worker writes a snapshot to a SQLite file that /metrics sums up
+METRICS_PATH = os.getenv("METRICS_PATH", str(BASE_DIR / "metrics.sqlite3"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))  # seconds
+METRICS_LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.25"))  # event loop lag sampling
+METRICS_STALE_AFTER = float(os.getenv("METRICS_STALE_AFTER", str(6 * METRICS_FLUSH_INTERVAL)))  # drop snapshots of exited workers
+# /metrics requires "Authorization: Bearer <token>" when set; without a token it is
+# only served while DEBUG is on, so production must set one to scrape
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Records are written by a background thread (app.log.BackgroundHandler); structured
+# fields are truncated to LOG_MAX_FIELD_LENGTH and records carrying a payload sampled
+# Logs go to stderr, for the process manager to collect and rotate. Set LOG_FILE to
+# also have every worker append to a file; nothing here limits its size, so rotate
+# it externally (e.g. logrotate), it is reopened once moved
+LOG_FILE = os.getenv("LOG_FILE", "")
+LOG_MAX_FIELD_LENGTH = int(os.getenv("LOG_MAX_FIELD_LENGTH", "1000"))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.1"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records dropped beyond this
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
+    'formatters': {
+        'key_value': {
+            '()': 'app.log.KeyValueFormatter',
+            'max_field_length': LOG_MAX_FIELD_LENGTH,
         },
-        'file': {
-            'class': 'logging.FileHandler',
-            'filename': 'debug.log',
+    },
+    'filters': {
+        'sample_payloads': {
+            '()': 'app.log.PayloadSampler',
+            'default_rate': LOG_PAYLOAD_SAMPLE_RATE,
+        },
+    },
+    'handlers': {
+        'background': {
+            '()': 'app.log.BackgroundHandler',
+            'handlers': [
+                {'class': 'logging.StreamHandler'},
+                *([{
+                    'class': 'logging.handlers.WatchedFileHandler',
+                    'filename': LOG_FILE,
+                    'encoding': 'utf-8',
+                }] if LOG_FILE else []),
+            ],
+            'queue_size': LOG_QUEUE_SIZE,
+            'formatter': 'key_value',
+            'filters': ['sample_payloads'],
         },
     },
     'root': {
-        'handlers': ['console', 'file'],
+        'handlers': ['background'],
         'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['background'],
             'level': 'INFO',
             'propagate': False,
         },
         'app': {
-            'handlers': ['console', 'file'],
+            'handlers': ['background'],
             'level': 'DEBUG',
             'propagate': False,
         },
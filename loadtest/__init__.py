@@ -0,0 +1 @@
+"""Fake provider APIs and a load-test harness for plan generation, see harness.py."""
@@ -0,0 +1,299 @@
+"""
+Local stand-ins for the OpenAI, Anthropic and GetImg APIs, for load tests
+and offline runs.
+
+    python -m loadtest.fake_providers --port 8900 --llm-latency 1.5 --error-rate 0.02
+
+then point the app at them:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8900
+    GETIMG_API_URL=http://127.0.0.1:8900/v1/flux-schnell/text-to-image
+
+Answers are generated from the request: the tool input schema for
+Anthropic, the example JSON in the prompt for OpenAI (which isn't sent a
+schema). Latencies are lognormal around the given medians, and a share of
+requests fails with 429 or 500 so retries and hedging get exercised.
+"""
+import io
+import json
+import time
+import base64
+import random
+import asyncio
+import argparse
+import logging
+from typing import Any, Dict, Optional
+from aiohttp import web
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    "roasted garlic lemon chicken thyme crispy golden tender fresh basil tomato creamy "
+    "parmesan spinach rice bowl glazed salmon sesame ginger honey smoky paprika bean "
+    "hearty stew herb butter charred pepper onion sweet potato quinoa salad citrus"
+).split()
+
+# "Respond with a JSON object shaped like: {...}" as rendered by app.services.prompts.Prompt
+EXAMPLE_MARKER = "shaped like: "
+
+
+class FakeProviders:
+    """The fake APIs and the knobs that shape their answers."""
+
+    def __init__(
+        self,
+        llm_latency: float = 1.0,
+        image_latency: float = 2.0,
+        jitter: float = 0.5,
+        token_rate: float = 400,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        recipes: int = 7,
+        items: int = 8,
+        words: int = 10,
+        image_size: int = 256,
+        seed: Optional[int] = None
+    ):
+        self.llm_latency = llm_latency
+        self.image_latency = image_latency
+        self.jitter = jitter
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.recipes = recipes
+        self.items = items
+        self.words = words
+        self.random = random.Random(seed)
+        self.image = self._make_image(image_size)
+        self.requests = 0
+
+    @staticmethod
+    def _make_image(size: int) -> str:
+        # Noise compresses badly, so the app gets a realistically large payload
+        image = Image.effect_noise((size, size), 64).convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return base64.b64encode(buffer.getvalue()).decode()
+
+    def latency(self, median: float) -> float:
+        return median * self.random.lognormvariate(0, self.jitter) if median > 0 else 0.0
+
+    def failure(self) -> Optional[web.Response]:
+        """A 429 or 500 for the configured share of requests, else None."""
+        roll = self.random.random()
+        if roll < self.throttle_rate:
+            return web.json_response(
+                {"error": {"type": "rate_limit_error", "message": "Fake rate limit"}},
+                status=429,
+                headers={"retry-after": "1"}
+            )
+        if roll < self.throttle_rate + self.error_rate:
+            return web.json_response({"error": {"type": "api_error", "message": "Fake failure"}}, status=500)
+        return None
+
+    def text(self) -> str:
+        return ' '.join(self.random.choice(WORDS) for _ in range(self.words)).capitalize()
+
+    def from_schema(self, schema: Dict[str, Any], key: str = '', index: int = 0) -> Any:
+        kind = schema.get('type')
+        if kind == 'object':
+            return {name: self.from_schema(sub, name, index) for name, sub in schema.get('properties', {}).items()}
+        if kind == 'array':
+            count = self.recipes if key == 'recipes' else self.random.randint(max(1, self.items // 2), self.items)
+            return [self.from_schema(schema.get('items', {}), key, i) for i in range(count)]
+        if kind in ('integer', 'number'):
+            return index + 1 if key == 'id' else self.random.randint(1, 5)
+        if kind == 'boolean':
+            return True
+        if key == 'quantity':
+            return str(self.random.randint(1, 4))
+        if key == 'unit':
+            return self.random.choice(['cup', 'tbsp', 'tsp', 'g', 'piece'])
+        return self.text()
+
+    def from_example(self, example: Any, key: str = '', index: int = 0) -> Any:
+        if isinstance(example, dict):
+            return {name: self.from_example(value, name, index) for name, value in example.items()}
+        if isinstance(example, list):
+            count = self.recipes if key == 'recipes' else self.random.randint(max(1, self.items // 2), self.items)
+            return [self.from_example(example[0] if example else '', key, i) for i in range(count)]
+        kind = {bool: 'boolean', int: 'integer', float: 'number'}.get(type(example), 'string')
+        return self.from_schema({'type': kind}, key, index)
+
+    def openai_answer(self, messages) -> Dict[str, Any]:
+        prompt = messages[-1].get('content', '') if messages else ''
+        for line in reversed(prompt.splitlines()):
+            if EXAMPLE_MARKER in line:
+                try:
+                    return self.from_example(json.loads(line.split(EXAMPLE_MARKER, 1)[1]))
+                except ValueError:
+                    break
+        return {"recipes": self.from_example([{"id": 1, "title": "", "description": "", "visual_description": ""}])}
+
+    def chunks(self, text: str):
+        """Split text into pieces of about 4 tokens, with the delay before each."""
+        size = 16
+        delay = 4 / self.token_rate if self.token_rate > 0 else 0
+        for start in range(0, len(text), size):
+            yield text[start:start + size], delay
+
+
+async def _sse(request: web.Request) -> web.StreamResponse:
+    response = web.StreamResponse(headers={"content-type": "text/event-stream", "cache-control": "no-cache"})
+    await response.prepare(request)
+    return response
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+async def openai_chat(request: web.Request) -> web.StreamResponse:
+    fakes: FakeProviders = request.app['fakes']
+    fakes.requests += 1
+    body = await request.json()
+    await asyncio.sleep(fakes.latency(fakes.llm_latency))
+    failure = fakes.failure()
+    if failure is not None:
+        return failure
+
+    content = json.dumps(fakes.openai_answer(body.get('messages', [])))
+    prompt_tokens = _tokens(json.dumps(body.get('messages', [])))
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": _tokens(content),
+             "total_tokens": prompt_tokens + _tokens(content)}
+    base = {"id": f"chatcmpl-fake{fakes.requests}", "created": int(time.time()), "model": body.get('model', '')}
+
+    if not body.get('stream'):
+        return web.json_response({
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    response = await _sse(request)
+    for piece, delay in fakes.chunks(content):
+        await asyncio.sleep(delay)
+        chunk = {**base, "object": "chat.completion.chunk",
+                 "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+        await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+    done = {**base, "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+    await response.write(f"data: {json.dumps(done)}\n\n".encode())
+    if body.get('stream_options', {}).get('include_usage'):
+        await response.write(f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n".encode())
+    await response.write(b"data: [DONE]\n\n")
+    return response
+
+
+async def anthropic_messages(request: web.Request) -> web.StreamResponse:
+    fakes: FakeProviders = request.app['fakes']
+    fakes.requests += 1
+    body = await request.json()
+    await asyncio.sleep(fakes.latency(fakes.llm_latency))
+    failure = fakes.failure()
+    if failure is not None:
+        return failure
+
+    tool = (body.get('tools') or [{}])[0]
+    answer = fakes.from_schema(tool.get('input_schema', {'type': 'object'}))
+    content = json.dumps(answer)
+    input_tokens = _tokens(json.dumps(body.get('messages', [])) + body.get('system', ''))
+    message = {
+        "id": f"msg_fake{fakes.requests}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get('model', ''),
+        "stop_reason": "tool_use",
+        "stop_sequence": None,
+    }
+    block = {"type": "tool_use", "id": f"toolu_fake{fakes.requests}", "name": tool.get('name', '')}
+
+    if not body.get('stream'):
+        return web.json_response({
+            **message,
+            "content": [{**block, "input": answer}],
+            "usage": {"input_tokens": input_tokens, "output_tokens": _tokens(content)}
+        })
+
+    response = await _sse(request)
+
+    async def send(event_type, data):
+        await response.write(f"event: {event_type}\ndata: {json.dumps({'type': event_type, **data})}\n\n".encode())
+
+    await send("message_start", {"message": {
+        **message, "content": [], "stop_reason": None, "usage": {"input_tokens": input_tokens, "output_tokens": 1}
+    }})
+    await send("content_block_start", {"index": 0, "content_block": {**block, "input": {}}})
+    for piece, delay in fakes.chunks(content):
+        await asyncio.sleep(delay)
+        await send("content_block_delta", {"index": 0, "delta": {"type": "input_json_delta", "partial_json": piece}})
+    await send("content_block_stop", {"index": 0})
+    await send("message_delta", {"delta": {"stop_reason": "tool_use", "stop_sequence": None},
+                                 "usage": {"output_tokens": _tokens(content)}})
+    await send("message_stop", {})
+    return response
+
+
+async def getimg_generate(request: web.Request) -> web.Response:
+    fakes: FakeProviders = request.app['fakes']
+    fakes.requests += 1
+    await request.read()
+    await asyncio.sleep(fakes.latency(fakes.image_latency))
+    failure = fakes.failure()
+    if failure is not None:
+        return failure
+    return web.json_response({"image": fakes.image, "seed": fakes.random.randint(1, 10 ** 6), "cost": 0})
+
+
+def create_app(fakes: FakeProviders) -> web.Application:
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app['fakes'] = fakes
+    app.router.add_post('/v1/chat/completions', openai_chat)
+    app.router.add_post('/v1/messages', anthropic_messages)
+    app.router.add_post('/v1/{model}/text-to-image', getimg_generate)
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--llm-latency', type=float, default=1.0, help="median seconds before an LLM answer starts")
+    parser.add_argument('--image-latency', type=float, default=2.0, help="median seconds per image")
+    parser.add_argument('--jitter', type=float, default=0.5, help="sigma of the lognormal latency distribution")
+    parser.add_argument('--token-rate', type=float, default=400, help="streamed tokens per second")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument('--items', type=int, default=8, help="most ingredients, steps and list items per array")
+    parser.add_argument('--words', type=int, default=10, help="words per generated string")
+    parser.add_argument('--image-size', type=int, default=256, help="side of the returned image in pixels")
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def fakes_from_arguments(args) -> FakeProviders:
+    return FakeProviders(
+        llm_latency=args.llm_latency,
+        image_latency=args.image_latency,
+        jitter=args.jitter,
+        token_rate=args.token_rate,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        items=args.items,
+        words=args.words,
+        image_size=args.image_size,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake OpenAI, Anthropic and GetImg APIs.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(create_app(fakes_from_arguments(args)), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
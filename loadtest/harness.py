@@ -0,0 +1,282 @@
+"""
+End-to-end load test of plan generation against the local fake providers.
+
+    python -m loadtest.harness --clients 20 --workers 1,2,4 --json results.json
+
+For every worker count the harness starts uvicorn the way the Dockerfile
+does, signs in one guest user per client, and has every client follow
+/api/recipes/generate/ over SSE at the same time. It reports
+time-to-first-event, time-to-complete, plans per minute and the event loop
+lag of the workers (from /metrics). Everything runs against a scratch
+database and scratch cache files, never the ones in the checkout.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import secrets
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Any, Dict, List, Optional
+import aiohttp
+from .fake_providers import add_arguments
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+            try:
+                async with session.get(url) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} didn't come up within {timeout}s")
+
+
+def _stop(process: subprocess.Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _session_cookies(count: int) -> List[str]:
+    """Sign in count new guest users and return their session cookies."""
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.test import Client
+    from app.services.auth_service import AuthService
+
+    cookies = []
+    for _ in range(count):
+        user, _, _ = AuthService.create_guest_user()
+        client = Client()
+        client.force_login(user)
+        cookies.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+    return cookies
+
+
+async def _follow_generation(base_url: str, cookie: str, timeout: float) -> Dict[str, Any]:
+    """Open the generation stream as one client and time its events."""
+    result = {'first_event': None, 'complete': None, 'events': 0, 'error': None}
+    start = time.perf_counter()
+    try:
+        async with aiohttp.ClientSession(
+            cookies={'sessionid': cookie},
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as session:
+            async with session.get(
+                f"{base_url}/api/recipes/generate/",
+                headers={'Accept': 'text/event-stream'},
+                allow_redirects=False
+            ) as response:
+                if response.status != 200:
+                    result['error'] = f"HTTP {response.status}"
+                    return result
+                async for line in response.content:
+                    if not line.startswith(b'data:'):
+                        continue
+                    now = time.perf_counter() - start
+                    result['events'] += 1
+                    if result['first_event'] is None:
+                        result['first_event'] = now
+                    event = json.loads(line[5:])
+                    if event.get('type') == 'complete':
+                        result['complete'] = now
+                        break
+                    if event.get('type') == 'error':
+                        result['error'] = event.get('error') or 'error event'
+                        break
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        result['error'] = f"{type(e).__name__}: {str(e)}"
+    if result['complete'] is None and result['error'] is None:
+        result['error'] = 'stream ended before complete'
+    return result
+
+
+def _parse_loop_lag(metrics_text: str) -> Dict[str, Optional[float]]:
+    """Mean and approximate p99 event loop lag from the Prometheus histogram."""
+    name = 'grokery_event_loop_lag_seconds'
+    buckets, total, count = [], 0.0, 0
+    for line in metrics_text.splitlines():
+        if line.startswith(f'{name}_bucket'):
+            bound = line.split('le="', 1)[1].split('"', 1)[0]
+            buckets.append((float('inf') if bound == '+Inf' else float(bound), int(line.rsplit(' ', 1)[1])))
+        elif line.startswith(f'{name}_sum'):
+            total = float(line.rsplit(' ', 1)[1])
+        elif line.startswith(f'{name}_count'):
+            count = int(line.rsplit(' ', 1)[1])
+    if not count:
+        return {'mean': None, 'p99': None}
+    p99 = next((bound for bound, cumulative in buckets if cumulative >= 0.99 * count), None)
+    return {'mean': total / count, 'p99': p99}
+
+
+async def run_load(base_url: str, cookies: List[str], timeout: float, flush_interval: float) -> Dict[str, Any]:
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_follow_generation(base_url, cookie, timeout) for cookie in cookies))
+    elapsed = time.perf_counter() - start
+
+    # Let every worker flush its metrics before reading them
+    await asyncio.sleep(flush_interval + 0.5)
+    async with aiohttp.ClientSession() as session:
+        headers = {'Authorization': f"Bearer {os.environ['METRICS_TOKEN']}"}
+        async with session.get(f"{base_url}/metrics", headers=headers) as response:
+            loop_lag = _parse_loop_lag(await response.text())
+
+    first_events = [r['first_event'] for r in results if r['first_event'] is not None]
+    completes = [r['complete'] for r in results if r['complete'] is not None]
+    errors = [r['error'] for r in results if r['error']]
+    return {
+        'clients': len(cookies),
+        'completed': len(completes),
+        'errors': len(errors),
+        'error_samples': sorted(set(errors))[:5],
+        'seconds': elapsed,
+        'plans_per_minute': len(completes) / elapsed * 60 if elapsed else 0.0,
+        'first_event_p50': _percentile(first_events, 0.5),
+        'first_event_p95': _percentile(first_events, 0.95),
+        'complete_p50': _percentile(completes, 0.5),
+        'complete_p95': _percentile(completes, 0.95),
+        'complete_mean': statistics.mean(completes) if completes else None,
+        'loop_lag_mean': loop_lag['mean'],
+        'loop_lag_p99': loop_lag['p99'],
+    }
+
+
+def _format(value: Optional[float], unit: str = 's') -> str:
+    return '-' if value is None else f"{value:.3f}{unit}"
+
+
+def print_report(rows: List[Dict[str, Any]]):
+    header = f"{'workers':>7} {'clients':>7} {'done':>5} {'errors':>6} {'first p50':>10} {'first p95':>10} " \
+             f"{'done p50':>10} {'done p95':>10} {'lag mean':>10} {'lag p99':>10} {'plans/min':>9}"
+    print(header)
+    for row in rows:
+        print(
+            f"{row['workers']:>7} {row['clients']:>7} {row['completed']:>5} {row['errors']:>6} "
+            f"{_format(row['first_event_p50']):>10} {_format(row['first_event_p95']):>10} "
+            f"{_format(row['complete_p50']):>10} {_format(row['complete_p95']):>10} "
+            f"{_format(row['loop_lag_mean']):>10} {_format(row['loop_lag_p99']):>10} "
+            f"{row['plans_per_minute']:>9.1f}"
+        )
+        for error in row['error_samples']:
+            print(f"{'':>7} error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test plan generation against fake providers.")
+    parser.add_argument('--clients', type=int, default=10, help="concurrent SSE clients")
+    parser.add_argument('--workers', default='1,2,4', help="comma-separated uvicorn worker counts to try")
+    parser.add_argument('--timeout', type=float, default=300, help="seconds a client waits for its plan")
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help="extra setting for the app, e.g. GENERATION_MODE=single_call")
+    parser.add_argument('--json', dest='json_path', help="also write the results to this file")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='grokery-loadtest-')
+    fake_port = _free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    flush_interval = 1.0
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'groc.settings',
+        'DEBUG': 'False',
+        'DATABASE_PATH': os.path.join(scratch, 'db.sqlite3'),
+        'IMAGE_STORE_ROOT': os.path.join(scratch, 'images'),
+        'LLM_CACHE_BACKEND': 'off',
+        'RATE_LIMIT_PATH': os.path.join(scratch, 'rate_limits.sqlite3'),
+        'METRICS_FLUSH_INTERVAL': str(flush_interval),
+        'METRICS_TOKEN': secrets.token_hex(16),
+        'OPENAI_API_KEY': 'fake',
+        'ANTHROPIC_API_KEY': 'fake',
+        'GETIMG_API_KEY': 'fake',
+        'GOOGLE_API_KEY': '',
+        'OPENAI_BASE_URL': f"{fake_url}/v1",
+        'ANTHROPIC_BASE_URL': fake_url,
+        'GETIMG_API_URL': f"{fake_url}/v1/flux-schnell/text-to-image",
+    }
+    for item in args.env:
+        name, _, value = item.partition('=')
+        env[name] = value
+    # The harness itself signs users in against the same scratch database
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+
+    fake_args = [
+        '--llm-latency', str(args.llm_latency), '--image-latency', str(args.image_latency),
+        '--jitter', str(args.jitter), '--token-rate', str(args.token_rate),
+        '--error-rate', str(args.error_rate), '--throttle-rate', str(args.throttle_rate),
+        '--items', str(args.items), '--words', str(args.words), '--image-size', str(args.image_size),
+    ] + (['--seed', str(args.seed)] if args.seed is not None else [])
+
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput'], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    fakes = subprocess.Popen(
+        [sys.executable, '-m', 'loadtest.fake_providers', '--port', str(fake_port)] + fake_args,
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL
+    )
+    rows = []
+    try:
+        for workers in (int(w) for w in args.workers.split(',')):
+            port = _free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            # Fresh users and metrics per run, so no run sees another's plans or samples
+            run_env = {**env, 'METRICS_PATH': os.path.join(scratch, f'metrics-{workers}.sqlite3')}
+            os.environ.update(run_env)
+            cookies = _session_cookies(args.clients)
+            log = open(os.path.join(scratch, f'server-{workers}.log'), 'w')
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'uvicorn', 'groc.asgi:application', '--host', '127.0.0.1',
+                 '--port', str(port), '--workers', str(workers), '--lifespan', 'on', '--log-level', 'warning'],
+                cwd=ROOT, env=run_env, stdout=log, stderr=subprocess.STDOUT
+            )
+            try:
+                asyncio.run(_wait_until_up(f"{fake_url}/", fakes))
+                asyncio.run(_wait_until_up(f"{base_url}/metrics", server))
+                print(f"Running {args.clients} clients against {workers} worker(s)...", file=sys.stderr)
+                row = asyncio.run(run_load(base_url, cookies, args.timeout, flush_interval))
+                rows.append({'workers': workers, **row})
+            finally:
+                _stop(server)
+                log.close()
+    finally:
+        _stop(fakes)
+
+    print_report(rows)
+    print(f"Server logs and scratch files are in {scratch}", file=sys.stderr)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'arguments': vars(args), 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
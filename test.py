@@ -17,7 +17,9 @@ async def test_recipe_service():
     print("Recipe templates:", templates)
     
     # Get detailed recipes
-    detailed_recipes = await RecipeService.get_all_recipe_details(templates)
+    detailed_recipes = await asyncio.gather(*(
+        RecipeService.get_recipe_details(template) for template in templates
+    ))
     print("Detailed recipes:", detailed_recipes)
     
     # Generate grocery list
@@ -25,23 +27,25 @@ async def test_recipe_service():
     print("Grocery list:", grocery_list)
     return detailed_recipes, grocery_list
 
-def test_grocery_service():
+def test_grocery_service(user, grocery_list):
     print("\nTesting Grocery Service:")
-    item = GroceryService.get_item_details(1)
-    print(item)
+    GroceryService.replace_items(user, grocery_list)
+    items = GroceryService.get_items(user)
+    print(GroceryService.get_item_details(items[0]['id'], user) if items else None)
 
 def test_auth_service():
     print("\nTesting Auth Service:")
     user, email, password = AuthService.create_guest_user()
     print(f"Created user: {email} with password: {password}")
+    return user
 
 async def main():
     # Run recipe service tests
-    await test_recipe_service()
+    _, grocery_list = await test_recipe_service()
     
     # Run synchronous tests
-    test_grocery_service()
-    test_auth_service()
+    user = test_auth_service()
+    test_grocery_service(user, grocery_list)
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file